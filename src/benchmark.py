@@ -0,0 +1,622 @@
+##!/usr/bin/env python
+"""
+Financial Analysis project benchmarks.  Compares the optimized parts of the pipeline with the implementations they replaced, checking
+that the output is identical and timing both.
+
+    def benchmarkRiskFactors() -> Runs the risk factor extractor and the original two pass parser over a directory of saved filings
+    def legacyRiskFactor() -> The original risk factor parser from SECFilingDownload.getRiskFactor (reference implementation)
+    def benchmarkXBRL() -> Reads a directory of xbrl instances with the streaming engine and the BeautifulSoup formatter path
+    def soupValues() -> The BeautifulSoup path of SECFilingFormatter (reference implementation)
+    def benchmarkAggregate() -> Aggregates a synthetic universe of companies one company at a time and in one pass
+    def legacyAggregate() -> The original per company loop of SECFilingFormatter.buildAggregatedDataset (reference implementation)
+    def syntheticUniverse() -> Builds processed filing values for a number of companies
+    def benchmarkPrices() -> Downloads a universe of tickers from a local stub of the price history api one at a time and asynchronously
+    def stubPriceServer() -> Starts a local server that mimics the TD Ameritrade price history and token endpoints
+    def benchmarkStocksJob() -> Runs the whole stocks job over a replayed universe of tickers without a network
+
+    Usage: python benchmark.py risk_factors <directory of saved html filings>
+           python benchmark.py xbrl <directory of saved xbrl instances>
+           python benchmark.py aggregate <number of companies>
+           python benchmark.py prices <number of tickers> <requests in flight>
+           python benchmark.py stocks <number of tickers> <number of days>
+"""
+
+#Imports
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime
+from pathlib import Path
+import multiprocessing
+import tempfile
+import zlib
+import json
+import sys
+import gzip
+import time
+import io
+from bs4 import BeautifulSoup
+import numpy as np
+import pandas as pd
+from data.risk_factor_extractor import RiskFactorExtractor
+from data.sec_formatter import SECFilingFormatter
+from data.xbrl_stream import XBRLStream
+from data.quarterly_aggregator import QuarterlyAggregator
+from data.equity_download import TDClient, ReplayPriceProvider
+from data.price_store import PriceStore
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+def readCorpus(corpus_dir, suffixes):
+    """
+    Read every file in a directory (recursively) with one of the suffixes, gzipped files are decompressed
+    ...
+    Parameters
+    ----------
+    corpus_dir: The directory with the saved files
+    suffixes: The file suffixes to read (.htm, .xml)
+    """
+    files = {}
+    for file in sorted(Path(corpus_dir).glob('**/*')):
+        name = file.name[:-3] if file.name.endswith('.gz') else file.name
+        if not file.is_file() or not name.endswith(tuple(suffixes)):
+            continue
+        opener = gzip.open if file.name.endswith('.gz') else open
+        with opener(file, 'rb') as f:
+            files[str(file)] = f.read().decode('utf-8', 'ignore')
+    return files
+
+def timeCall(func, *args):
+    """
+    Run a function, returning its result (or the name of the exception it raised) and the time it took
+    """
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:
+        result = type(e).__name__
+    return result, time.perf_counter() - start
+
+def benchmarkRiskFactors(corpus_dir):
+    """
+    Extract the risk factors from every saved filing with both parsers.  The chunks are built once and shared so the timings only cover
+    the section search
+    ...
+    Parameters
+    ----------
+    corpus_dir: A directory of saved 10-K / 10-Q html documents (.htm, .html, optionally gzipped)
+    """
+    extractor = RiskFactorExtractor()
+    docs = readCorpus(corpus_dir, ['.htm', '.html'])
+    t_old, t_new, mismatch = 0.0, 0.0, []
+    for name, html in docs.items():
+        chunks = extractor.getChunks(html)
+        old, dt_old = timeCall(legacyRiskFactor, chunks)
+        new, dt_new = timeCall(extractor.findSection, chunks)
+        t_old, t_new = t_old + dt_old, t_new + dt_new
+        if old != new:
+            mismatch.append(name)
+
+    print("Filings: %i, mismatches: %i" % (len(docs), len(mismatch)))
+    for name in mismatch:
+        print("  mismatch: %s" % name)
+    print("Original parser: %.3fs, extractor: %.3fs, speedup: %.1fx" % (t_old, t_new, t_old / max(t_new, 1e-9)))
+    return len(mismatch) == 0
+
+def legacyRiskFactor(chunks):
+    """
+    The original two pass risk factor search, kept as the reference for the extractor
+    ...
+    Parameters
+    ----------
+    chunks: The text chunks of the document (RiskFactorExtractor.getChunks)
+    """
+    #setup constants to be used in text parsing
+    search_a, search_b, search_c, search_d, splt_txt_spec, out_txt = '', '', '', '', '', ''
+    ix_a, ix_b, ix_c, ix_d, ix_prev, t1, countA = 0, 0, 0, 0, 0, 0, 0
+    idx_found = -1
+    brk_found = False
+    len_file = len(chunks)
+
+    for idx, txt in enumerate(chunks):
+        if idx == len_file - 2:
+            break
+        splt_txt = "".join(txt.upper().replace('.','').split())
+        combo_txt = splt_txt + "".join(chunks[idx + 1].upper().replace('.','').split())
+        combo_txt_2 = combo_txt + "".join(chunks[idx + 2].upper().replace('.','').split())
+
+        if (search_a != '' and search_b != '') and idx not in [ix_a, ix_b] and countA > 1 and ((search_a in splt_txt and len(splt_txt) < 25 and 'BUSINESS' not in splt_txt)
+                or (search_b in splt_txt and len(splt_txt) < 25 and 'BUSINESS' not in splt_txt) or (search_a + search_b == splt_txt
+                or search_a.strip('ITEM') + search_b == splt_txt or 'ITEM' + search_a + search_b == splt_txt)):
+            break
+
+        if splt_txt in ['RISKFACTORS', 'ITEM1A', 'ITEM1ARISKFACTORS','RISKFACTOR','ARISKFACTORS'] and search_a == '':
+            if 'RISKFACTOR' in "".join(chunks[idx + 1].upper().replace('.','').split()):
+                search_a, ix_a = "".join(chunks[idx + 2].upper().replace('.','').split()), idx + 2
+                search_b, ix_b = "".join(chunks[idx + 3].upper().replace('.','').split()) , idx + 3
+                search_c, ix_c = "".join(chunks[idx + 4].upper().replace('.','').split()), idx + 4
+                search_d, ix_d = "".join(chunks[idx + 5].upper().replace('.','').split()) , idx + 5
+                idx_found = idx + 1
+            else:
+                search_a, ix_a = "".join(chunks[idx + 1].upper().replace('.','').split()), idx + 1
+                search_b, ix_b = "".join(chunks[idx + 2].upper().replace('.','').split()), idx + 2
+                search_c, ix_c = "".join(chunks[idx + 3].upper().replace('.','').split()), idx + 3
+                search_d, ix_d = "".join(chunks[idx + 4].upper().replace('.','').split()) , idx + 4
+                idx_found = idx
+
+            #for weird formatting with the break statement
+            if search_a == 'ITEM' and search_b in ['1B', '2','3','4','6']:
+                search_a = search_a + search_b
+                search_b = search_c
+
+        if (('ITEM1A' in splt_txt or '1A' in splt_txt) and 'RISKFACTOR' in splt_txt and len(splt_txt) < 19) \
+                or ('RISKFACTOR' in combo_txt and '1A' in combo_txt and len(combo_txt) < 19) \
+                or ('RISKFACTOR' in combo_txt_2 and '1A' in combo_txt_2 and len(combo_txt_2) < 19):
+            if idx != ix_prev + 1:
+                countA +=1
+            ix_prev = idx
+
+        if idx == idx_found and countA == 0:
+            splt_txt_spec = splt_txt
+            countA = 2
+    ######################################################################################
+    #Reformat for files that have weird formatting for values that have a header
+    if countA > 5:
+        countA = 2
+    #if the items are on the same line, break apart
+    if 'ITEM' in search_a and 'ITEM' in search_b and search_a != 'ITEM' and search_b != 'ITEM':
+        if 'ITEM1B' in search_a and search_a != 'ITEM1B' :
+            search_b = search_a[6:]
+            search_a = search_a[:6]
+        else:
+            search_b = search_a[5:]
+            search_a = search_a[:5]
+
+    #if the break is not found, bad txt
+    if not brk_found:
+        search_b = search_b[:20]
+
+    #if the table of contents has weird formatting, ensure break points are set
+    if countA == 1:
+        brk_found = False
+        search_a = 'ITEM2'
+        search_b = 'UNREGISTEREDSALESOF'
+        search_c = 'ITEM1B'
+        search_d = 'UNRESOLVEDSTAFF'
+    elif countA == 0:
+        return None
+    ######################################################################################
+    ix_prev = 0
+    for idx, txt in enumerate(chunks):
+        if idx == len_file - 2:
+            break
+        splt_txt = "".join(txt.upper().replace('.','').split())
+        combo_txt = splt_txt + "".join(chunks[idx + 1].upper().replace('.','').split())
+        combo_txt_2 = combo_txt + "".join(chunks[idx + 2].upper().replace('.','').split())
+
+        if t1 >= countA and ((search_a in splt_txt and len(splt_txt) < 30 and 'BUSINESS' not in splt_txt) or
+            (search_b in splt_txt and len(splt_txt) < 30 and 'BUSINESS' not in splt_txt) or (search_a + search_b == splt_txt or search_a.strip('ITEM') + search_b == splt_txt
+            or 'ITEM' + search_a + search_b == splt_txt) or search_a == splt_txt or search_b == splt_txt or (search_a + search_b in splt_txt )):
+            break
+
+        if not brk_found and t1 >= countA and ((search_c in splt_txt and len(splt_txt) < 30 and 'BUSINESS' not in splt_txt) or
+            (search_d in splt_txt and len(splt_txt) < 30 and 'BUSINESS' not in splt_txt) or (search_c + search_d == splt_txt)
+            or search_c == splt_txt or search_d == splt_txt or (search_c + search_d in splt_txt)):
+            break
+
+        if (('ITEM1A' in splt_txt or '1A' in splt_txt) and 'RISKFACTORS' in splt_txt and len(splt_txt) < 19) \
+                or ('RISKFACTORS' in combo_txt and '1A' in combo_txt and len(combo_txt) < 19) \
+                or ('RISKFACTOR' in combo_txt_2 and '1A' in combo_txt_2 and len(combo_txt_2) < 19) or (splt_txt_spec == splt_txt and splt_txt_spec != ''):
+            if idx != ix_prev + 1:
+                t1 +=1
+                ix_prev = idx
+            continue
+
+        if t1 >= countA:
+            out_txt = ' '.join([out_txt, txt])
+
+    if len(out_txt) == 0:
+        return None
+    return out_txt
+
+def benchmarkXBRL(corpus_dir):
+    """
+    Read the values of every saved xbrl instance with the streaming engine and with the BeautifulSoup path of the formatter, checking
+    that both return the same dataframe
+    ...
+    Parameters
+    ----------
+    corpus_dir: A directory of saved xbrl instances (.xml, optionally gzipped)
+    """
+    stream = XBRLStream()
+    docs = readCorpus(corpus_dir, ['.xml'])
+    t_old, t_new, mismatch = 0.0, 0.0, []
+    for name, xml in docs.items():
+        data = xml.encode('utf-8')
+        old, dt_old = timeCall(soupValues, xml)
+        new, dt_new = timeCall(stream.parse, io.BytesIO(data))
+        t_old, t_new = t_old + dt_old, t_new + dt_new
+        same = (old is None and new is None) or (hasattr(old, 'equals') and hasattr(new, 'equals') and old.equals(new)) or \
+               (isinstance(old, str) and old == new)
+        if not same:
+            mismatch.append(name)
+
+    print("Instances: %i, mismatches: %i" % (len(docs), len(mismatch)))
+    for name in mismatch:
+        print("  mismatch: %s" % name)
+    print("BeautifulSoup: %.3fs, stream: %.3fs, speedup: %.1fx" % (t_old, t_new, t_old / max(t_new, 1e-9)))
+    return len(mismatch) == 0
+
+def soupValues(xml):
+    """
+    The values of an instance as SECFilingFormatter reads them with BeautifulSoup (None when the dates cannot be found)
+    """
+    formatter = SECFilingFormatter.__new__(SECFilingFormatter)
+    formatter.concepts = None
+    soup = BeautifulSoup(xml, 'lxml')
+    tag_list = soup.find_all()
+    formatter.dates = formatter.getDatesAndPeriods(tag_list)
+    if not bool(formatter.dates):
+        return None
+    return formatter.getValuesFromFile(tag_list)
+
+def benchmarkAggregate(companies = 1000):
+    """
+    Aggregate a synthetic universe with the original per company loop and with QuarterlyAggregator, checking that every company's
+    output file would be identical
+    ...
+    Parameters
+    ----------
+    companies: The number of companies in the universe
+    """
+    df, tickers = syntheticUniverse(int(companies))
+    aggregator = QuarterlyAggregator(tickers)
+
+    start = time.perf_counter()
+    old = {}
+    for cik, df_cik in df.groupby('cik', sort = True):
+        df_out = legacyAggregate(int(cik), df_cik.reset_index(drop = True), tickers)
+        if df_out is not None:
+            old[int(cik)] = df_out.to_csv(sep = '\t', index = False)
+    t_old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = {int(cik): df_cik.to_csv(sep = '\t', index = False) for cik, df_cik in aggregator.aggregate(df).groupby('cik', sort = True)}
+    t_new = time.perf_counter() - start
+
+    mismatch = sorted(cik for cik in set(old) | set(new) if old.get(cik) != new.get(cik))
+    print("Companies: %i, rows: %i, written: %i, mismatches: %i" % (int(companies), len(df), len(new), len(mismatch)))
+    for cik in mismatch[:20]:
+        print("  mismatch: %i" % cik)
+    print("Per company: %.3fs, one pass: %.3fs, speedup: %.1fx" % (t_old, t_new, t_old / max(t_new, 1e-9)))
+    return len(mismatch) == 0
+
+def legacyAggregate(cik, df, tickers):
+    """
+    The original per company aggregation, kept as the reference for QuarterlyAggregator
+    ...
+    Parameters
+    ----------
+    cik: The company's cik
+    df: The company's processed filing values
+    tickers: A dictionary of cik: ticker for the listed companies
+    ...
+    Returns
+    ----------
+     > The dataframe that was written to the aggregated file, None if the company was skipped
+    """
+    # Drop all duplicates
+    df = df.drop_duplicates(keep = "first").reset_index(drop= True)
+
+    #get the minimum periods per acct_typ, attribute and date
+    df['pds'].fillna(0, inplace = True)
+    df = df.loc[df.groupby(['acct_typ', 'attr', 'date'])['pds'].idxmin(), :]
+
+    #if the company doesn't have a associated stock, skip (in order to reduce values)
+    if cik not in tickers:
+        return None
+
+    df['ticker'] = tickers[cik]
+    df = df[((df['acct_typ'] == 'dei') & (df['attr'] == 'entitycommonstocksharesoutstanding')) | (df['acct_typ'] != 'dei')]
+    df.sort_values(by = ['acct_typ', 'attr', 'date'], inplace = True)
+    df.reset_index(inplace = True, drop = True)
+
+    df_unique = df.groupby(['attr'])['pds'].min().reset_index(level=0)
+    attrs = list(df_unique[df_unique['pds'] == 4]['attr'])
+
+    df.loc[:,'nxt_attr'] = df['attr'].shift(1)
+    cond_match = (df['attr'] == df['nxt_attr'])
+    try:
+        df.loc[cond_match,'dt_diff'] = abs(round((((df['date'].apply(pd.to_datetime)).shift(1)) - df['date'].apply(pd.to_datetime)).dt.days * 4 / 365.25 )).fillna(0).astype(int)
+    except:
+        return None
+
+    #divide values where there is no way to subtract previous periods
+    df.loc[:,'prev_val'] = df['value'].shift(1)
+    cond_init = (df['pds'] > 1) & ((df['attr'] != df['nxt_attr']) | (df['dt_diff'] >= df['pds'])) & (~df['attr'].isin(attrs))
+    df.loc[cond_init, ['value', 'pds']] = df.loc[cond_init,'value'] / df.loc[cond_init,'pds'], 1
+
+    #For all values that have one quarter difference, subtract previous values
+    df.loc[cond_match,'prev_val'] = df['value'].shift(1)
+    df.loc[cond_match,'pd_diff_1'] = df['pds'].shift(1)
+    cond_sub = (df['pds'] - df['pd_diff_1'] == 1) & (df['dt_diff'] == 1) & cond_match
+    df.loc[cond_sub, ['value', 'pds']] = pd.DataFrame({"value": df.loc[cond_sub,'value'] - df.loc[cond_sub,'prev_val'],
+                                                    "pds": df.loc[cond_sub,'pds'] - df.loc[cond_sub,'pd_diff_1']})
+
+    #set 3 qtr values to their closest average
+    df.loc[:,'prev_val'] = df['value'].shift(1)
+    df.loc[:,'prev_val_1'] = df['prev_val'].shift(1)
+    df.loc[:,'dt_diff_1'] = df['dt_diff'].shift(1)
+    cond_3a = (df['pds'] == 3) & (df['dt_diff'] == 1) & (df['dt_diff_1'] == 1) & cond_match
+    df.loc[cond_3a, ['value', 'pds']] = df.loc[cond_3a,'value'] - df.loc[cond_3a,'prev_val'] - df.loc[cond_3a,'prev_val_1'], 1
+
+    cond_3b = (((df['pds'] == 4) & (df['dt_diff'] == 3)) |
+                ((df['pds'] == 3) & (df['dt_diff'].isin([1,2])))) & cond_match
+    df.loc[cond_3b, ['value', 'pds']] = (df.loc[cond_3b,'value'] - df.loc[cond_3b,'prev_val']) / (df.loc[cond_3b,'pds'] - 1), 1
+
+    #Pds == 4 value subtraction
+    df.loc[:,'prev_val_2'] = df['prev_val_1'].shift(1)
+    df.loc[:,'dt_diff_2'] = df['dt_diff_1'].shift(1)
+    cond_4a = (df['pds'] == 4) & (df['dt_diff'] == 1) & (df['dt_diff_1'] == 1) & (df['dt_diff_2'] == 1) & cond_match
+    df.loc[cond_4a, ['value', 'pds']] = df.loc[cond_4a,'value'] - df.loc[cond_4a,'prev_val'] - df.loc[cond_4a,'prev_val_1'] -  df.loc[cond_4a,'prev_val_2'], 1
+    cond_4b = (df['pds'] == 4) & (df['dt_diff'] + df['dt_diff_1'] <= 3) & cond_match
+    df.loc[cond_4b, ['value', 'pds']] = (df.loc[cond_4b,'value'] - df.loc[cond_4b,'prev_val'] - df.loc[cond_4b,'prev_val_1']) / 2 , 1
+
+    #qtd compare
+    cond_qtr = (df['pds'] == 1) & (df['dt_diff'] == 1) & cond_match
+    df.loc[cond_qtr, 'qtr_diff_pct'] = ((df.loc[cond_qtr,'value'] - df.loc[cond_qtr,'prev_val'] ) / abs(df.loc[cond_qtr,'prev_val'])) * 100
+
+    #ytd compare
+    df.loc[:,'prev_val'] = df['value'].shift(1)
+    df.loc[:,'prev_val_1'] = df['prev_val'].shift(1)
+    df.loc[:,'prev_val_2'] = df['prev_val_1'].shift(1)
+    df.loc[:,'prev_val_3'] = df['prev_val_2'].shift(1)
+    df.loc[:,'dt_diff_3'] = df['dt_diff_2'].shift(1)
+
+    c_yr1 = (df['dt_diff'] == 4) & cond_match
+    c_yr2 = (df['dt_diff'] + df['dt_diff_1'] == 4) & cond_match
+    c_yr3 = (df['dt_diff'] + df['dt_diff_1'] + df['dt_diff_2']== 4) & cond_match
+    c_yr4 = (df['dt_diff'] + df['dt_diff_1'] + df['dt_diff_2'] + df['dt_diff_3'] == 4) & cond_match
+    c_yr5 = (df['attr'].isin(attrs)) & (df['dt_diff'] == 4) & (df['attr'] == df['nxt_attr'])
+
+    for cond, val in [(c_yr1, 'prev_val'),(c_yr2, 'prev_val_1'),(c_yr3, 'prev_val_2'),(c_yr4, 'prev_val_3'),(c_yr5, 'prev_val')]:
+        df.loc[cond, 'yr_diff_pct'] = ((df.loc[cond, 'value'] - df.loc[cond, val]) / abs(df.loc[cond, val])) * 100
+
+    out_attr = ['cik','ticker','date','acct_typ','attr','value','qtr_diff_pct','yr_diff_pct']
+    return df[out_attr]
+
+def syntheticUniverse(companies, quarters = 16, seed = 0):
+    """
+    Processed filing values for a universe of companies.  Every company reports flow attributes year to date (1 to 4 quarters, some
+    only as quarters), balance attributes as instants, some attributes only yearly, a few dei values and gaps where a filing is missing.
+    One company in ten is not listed
+    ...
+    Returns
+    ----------
+     > A (dataframe of cik, acct_typ, attr, date, pds, value, dictionary of cik: ticker) tuple
+    """
+    rng = np.random.default_rng(seed)
+    ends = pd.date_range('2016-03-31', periods = quarters, freq = 'Q').strftime('%Y-%m-%d').to_numpy()
+    attrs = [('us-gaap', 'revenues', 'flow'), ('us-gaap', 'netincomeloss', 'flow'), ('us-gaap', 'operatingexpenses', 'flow'),
+             ('us-gaap', 'costofrevenue', 'quarter'), ('us-gaap', 'assets', 'instant'), ('us-gaap', 'liabilities', 'instant'),
+             ('us-gaap', 'incometaxespaid', 'year'), ('us-gaap', 'depreciation', 'flow'), ('dei', 'entitycommonstocksharesoutstanding', 'instant'),
+             ('dei', 'documentfiscalyearfocus', 'instant'), ('abc', 'revenues', 'flow'), ('abc', 'customcost', 'flow')]
+    frames = []
+    for cik in range(1000, 1000 + companies):
+        for acct_typ, attr, kind in attrs:
+            fiscal = (np.arange(quarters) + rng.integers(0, 4)) % 4 + 1
+            base = rng.lognormal(10, 2) * rng.choice([1, -1], p = [0.8, 0.2])
+            qtr_vals = base * (1 + rng.normal(0, 0.1, quarters))
+            if kind == 'flow':
+                pds = fiscal
+                values = np.array([qtr_vals[max(0, i - p + 1):i + 1].sum() for i, p in enumerate(pds)])
+            elif kind == 'year':
+                keep = fiscal == 4
+                pds, values = fiscal[keep], qtr_vals[keep] * 4
+            else:
+                pds, values = np.ones(quarters, dtype = int), qtr_vals
+            dates = ends if kind != 'year' else ends[fiscal == 4]
+            # some filings are missing and some values are also reported for the quarter alone
+            keep = rng.random(len(dates)) > 0.1
+            frame = pd.DataFrame({'cik': cik, 'acct_typ': acct_typ, 'attr': attr, 'date': dates[keep], 'pds': pds[keep],
+                                  'value': np.round(values[keep], 2)})
+            extra = frame[(frame['pds'] > 1) & (rng.random(len(frame)) > 0.7)].copy()
+            extra['pds'], extra['value'] = 1, np.round(extra['value'] / 3, 2)
+            frames += [frame, extra]
+    df = pd.concat(frames, ignore_index = True)
+    df.loc[rng.random(len(df)) < 0.01, 'value'] = 0
+    df = df.sample(frac = 1, random_state = seed).reset_index(drop = True)
+    tickers = {cik: 'T%i' % cik for cik in range(1000, 1000 + companies) if cik % 10 != 0}
+    return df, tickers
+
+def benchmarkPrices(tickers = 200, workers = 8):
+    """
+    Download the price history of a universe of tickers from a local stub of the api, one ticker at a time and with requests in flight,
+    checking that both runs store the same prices and that every expired token was refreshed once
+    ...
+    Parameters
+    ----------
+    tickers: The number of tickers in the universe
+    workers: The number of requests in flight in the asynchronous run
+    """
+    tickers, workers = int(tickers), int(workers)
+    server, port, stats = stubPriceServer(expire_every = max(tickers // 4, 1))
+    base = 'http://127.0.0.1:%i/v1/' % port
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ['sync', 'async']:
+                root = Path(tmp).joinpath(mode)
+                root.joinpath('master').mkdir(parents = True)
+                with open(root.joinpath('token.json'), 'w') as f:
+                    json.dump({'access_token': 'expired', 'refresh_token': 'r', 'redirect_uri': 'u', 'client_id': 'c'}, f)
+                pd.DataFrame({'ticker': ['S%04i' % i for i in range(tickers)], 'last_update': '2022-01-03', 'sector': 'Technology',
+                              'ipoyear': None}).to_csv(root.joinpath('master', 'company_info1.tsv.gz'), sep = '\t', index = False,
+                                                       compression = 'gzip')
+                client = TDClient(root.joinpath('token.json'), proc_path = root.joinpath('equities'), mstr_path = root.joinpath('master'),
+                                  base = base)
+                for name in ['requests', 'expired', 'refreshes']:
+                    stats[name].value = 0
+                start = time.perf_counter()
+                if mode == 'sync':
+                    client.updateStockHistory()
+                else:
+                    client.updateStockHistoryAsync(workers = workers)
+                elapsed = time.perf_counter() - start
+                results[mode] = (client.store.read(), elapsed, {name: value.value for name, value in stats.items()})
+    finally:
+        server.terminate()
+
+    (df_sync, t_sync, s_sync), (df_async, t_async, s_async) = results['sync'], results['async']
+    same = df_sync.equals(df_async)
+    print("Tickers: %i, rows: %i, identical: %s" % (tickers, len(df_async), same))
+    print("One at a time: %.3fs, %i in flight: %.3fs, speedup: %.1fx" % (t_sync, workers, t_async, t_sync / max(t_async, 1e-9)))
+    print("Tokens expired: %i, refreshes: %i (one at a time: %i, %i)" % (s_async['expired'], s_async['refreshes'], s_sync['expired'],
+                                                                          s_sync['refreshes']))
+    return same and len(df_async) > 0 and s_async['refreshes'] <= s_async['expired'] + 1
+
+def stubPriceServer(expire_every = 50, latency = 0.1):
+    """
+    Start a local http server that answers like the price history api, in its own process so it does not share the benchmark's
+    interpreter.  Daily candles are made up from the ticker and the date, every expire_every history requests the token expires (the
+    requests with the old token get a 401) and the token endpoint hands out the current token
+    ...
+    Parameters
+    ----------
+    expire_every: The number of history requests a token is valid for
+    latency: The number of seconds each history request takes
+    ...
+    Returns
+    ----------
+     > A (process, port, dictionary of the requests, expired and refreshes counters) tuple, the process runs until it is terminated
+    """
+    stats = {name: multiprocessing.Value('i', 0) for name in ['requests', 'expired', 'refreshes', 'version']}
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target = _serveStub, args = (ports, stats, expire_every, latency), daemon = True)
+    process.start()
+    return process, ports.get(timeout = 30), stats
+
+def _serveStub(ports, stats, expire_every, latency):
+    """
+    Run the stub price server (see stubPriceServer) until the process is terminated
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, data):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with stats['version'].get_lock():
+                stats['refreshes'].value += 1
+                token = 'token-%i' % stats['version'].value
+            self._send(200, json.dumps({'access_token': token}).encode('utf-8'))
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            with stats['version'].get_lock():
+                if self.headers.get('Authorization') != 'Bearer token-%i' % stats['version'].value:
+                    return self._send(401, b'{"error": "Not Authorized"}')
+                stats['requests'].value += 1
+                if stats['requests'].value % expire_every == 0:
+                    stats['version'].value += 1
+                    stats['expired'].value += 1
+            time.sleep(latency)
+            ticker = url.path.split('/')[-2]
+            query = parse_qs(url.query)
+            days = pd.bdate_range(datetime.utcfromtimestamp(int(query['startDate'][0]) / 1000).date(),
+                                  datetime.utcfromtimestamp(int(query['endDate'][0]) / 1000).date())
+            seed, i = zlib.crc32(ticker.encode('utf-8')), np.arange(len(days))
+            candles = pd.DataFrame({'open': ((seed + i) % 500 + 1).astype(float), 'high': ((seed + i) % 500 + 2).astype(float),
+                                    'low': ((seed + i) % 500).astype(float), 'close': ((seed + 2 * i) % 500 + 1).astype(float),
+                                    'volume': seed % 100000 + i, 'datetime': days.asi8 // 10**6})
+            self._send(200, ('{"candles": %s, "symbol": "%s", "empty": %s}' % (candles.to_json(orient = 'records'), ticker,
+                                                                                'true' if len(days) == 0 else 'false')).encode('utf-8'))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+def benchmarkStocksJob(tickers = 8000, days = 250):
+    """
+    Run the stocks job over a universe of tickers replayed from a saved price store, checking that the job stores every replayed candle.
+    Half the tickers already have the first half of their history stored, one ticker in a hundred fails
+    ...
+    Parameters
+    ----------
+    tickers: The number of tickers in the universe
+    days: The number of trading days of history of each ticker
+    """
+    tickers, days = int(tickers), int(days)
+    names = ['S%05i' % i for i in range(tickers)]
+    dates = pd.bdate_range(end = pd.Timestamp.today().normalize() - pd.Timedelta(days = 5), periods = days)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'ticker': np.repeat(names, days), 'date': np.tile(dates, tickers)})
+    df['close'] = np.round(rng.lognormal(3, 1, len(df)), 2)
+    df['open'], df['high'], df['low'] = df['close'] * 0.99, df['close'] * 1.01, df['close'] * 0.98
+    df['volume'] = rng.integers(0, 10**7, len(df))
+    half = dates[days // 2 - 1]
+    failed = names[::100]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        root.joinpath('master').mkdir()
+        start = time.perf_counter()
+        PriceStore(root.joinpath('replay')).append(df)
+        stored = PriceStore(root.joinpath('equities', 'prices'))
+        stored.append(df[(df['ticker'].isin(names[1::2])) & (df['date'] <= half)])
+        t_setup = time.perf_counter() - start
+
+        pd.DataFrame({'ticker': names, 'last_update': [half.strftime('%Y-%m-%d') if i % 2 else None for i in range(tickers)],
+                      'sector': 'Technology', 'ipoyear': None}).to_csv(root.joinpath('master', 'company_info1.tsv.gz'), sep = '\t',
+                                                                       index = False, compression = 'gzip')
+        start = time.perf_counter()
+        client = TDClient(None, proc_path = root.joinpath('equities'), mstr_path = root.joinpath('master'),
+                          provider = ReplayPriceProvider(root.joinpath('replay'), fail = failed))
+        client.updateStockHistory()
+        t_job = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client.store.compact()
+        t_compact = time.perf_counter() - start
+        df_out = client.store.read()
+
+    expected = PriceStore.toTable(df[~df['ticker'].isin(failed)]).to_pandas(date_as_object = False)
+    expected = expected.sort_values(['ticker', 'date']).reset_index(drop = True)
+    same = df_out.equals(expected)
+    print("Tickers: %i, rows: %i, stored: %i, identical: %s" % (tickers, len(df), len(df_out), same))
+    print("Setup: %.3fs, stocks job: %.3fs (%.0f tickers/s), compaction: %.3fs" % (t_setup, t_job, tickers / max(t_job, 1e-9), t_compact))
+    return same
+
+def main(bench_to_run = None, *args):
+    if bench_to_run == 'risk_factors':
+        ok = benchmarkRiskFactors(*args)
+    elif bench_to_run == 'xbrl':
+        ok = benchmarkXBRL(*args)
+    elif bench_to_run == 'aggregate':
+        ok = benchmarkAggregate(*args)
+    elif bench_to_run == 'prices':
+        ok = benchmarkPrices(*args)
+    elif bench_to_run == 'stocks':
+        ok = benchmarkStocksJob(*args)
+    else:
+        print(__doc__)
+        ok = False
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -1,8 +1,28 @@
 # -*- coding: utf-8 -*-
-__all__ = ['sec_download', 'equity_download','sec_formatter','external_download', 'api_call']
-from data.equity_download import TDClient
+__all__ = ['sec_download', 'equity_download','sec_formatter','external_download', 'api_call', 'http_client', 'rate_limit', 'response_cache', 'risk_factor_extractor', 'risk_factor_store', 'filing_archive', 'edgar_catalog', 'filing_resolver', 'sec_bulk_ingest', 'quarter_scheduler', 'xbrl_stream', 'context_index', 'processed_store', 'quarterly_aggregator', 'aggregate_manifest', 'concept_filter', 'code_dictionary', 'ticker_index', 'price_watermarks', 'price_store', 'master_table']
+from data.equity_download import TDClient, PriceProvider, TDPriceProvider, ReplayPriceProvider
 from data.external_download import GuardianClient, FredClient, NYTClient, WikipediaScraper
 from data.sec_download import SECFilingDownload
 from data.sec_formatter import SECFilingFormatter
 from data.update_master import UpdateMaster
 from data.api_call import api_call
+from data.http_client import HTTPClient, get_client
+from data.response_cache import ResponseCache, CacheMiss
+from data.risk_factor_extractor import RiskFactorExtractor
+from data.risk_factor_store import RiskFactorStore
+from data.filing_archive import QuarterArchive
+from data.edgar_catalog import EdgarCatalog
+from data.filing_resolver import FilingResolver
+from data.sec_bulk_ingest import SECBulkIngest
+from data.quarter_scheduler import QuarterScheduler
+from data.xbrl_stream import XBRLStream
+from data.context_index import ContextIndex
+from data.processed_store import ProcessedStore
+from data.quarterly_aggregator import QuarterlyAggregator
+from data.aggregate_manifest import AggregateManifest
+from data.concept_filter import ConceptFilter
+from data.code_dictionary import CodeDictionary
+from data.ticker_index import TickerIndex
+from data.price_watermarks import PriceWatermarks
+from data.price_store import PriceStore
+from data.master_table import MasterTable
@@ -0,0 +1,147 @@
+##!/usr/bin/env python
+"""
+Aggregate Manifest: Records, for every cik, a hash of the processed filing values its aggregated file was built from and the latest
+quarter (year_sub, qtr_sub) those values came from.  Writing filings marks their ciks dirty, so a delta run only aggregates the dirty
+ciks, and a full run skips every company whose values hash the same as when its file was written.  The manifest is an sqlite table
+that is opened for each call, so the formatter that holds it can still be sent to a worker process.
+
+object AggregateManifest:
+    def markDirty() -> None: Marks ciks whose processed values changed
+    def dirty() -> list: Returns the ciks that are marked dirty
+    def hashes() -> Dict: Returns the recorded content hash of every cik
+    def watermark() -> tuple: Returns the latest (year_sub, qtr_sub) aggregated for a cik
+    def record() -> None: Stores the hash and watermark of aggregated ciks and clears their dirty mark
+    def clear() -> None: Clears the dirty mark of ciks without aggregating them
+    def contentHashes() -> DataFrame: Hashes the processed values of every cik in a frame
+"""
+
+#Imports
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import numpy as np
+import hashlib
+import sqlite3
+import logging
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+HASH_COLS = ['cik', 'acct_typ', 'attr', 'date', 'pds', 'value']
+
+class AggregateManifest(object):
+
+    def __init__(self, db_path):
+        """
+        Opens (and creates if needed) the manifest database
+        ...
+        Parameters
+        ----------
+        db_path: The path of the sqlite database file
+        """
+        self.logger = logging.getLogger('sec.AggregateManifest')
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS manifest (cik INTEGER PRIMARY KEY, content_hash TEXT, year_sub INTEGER,
+                            qtr_sub INTEGER, dirty INTEGER NOT NULL DEFAULT 0, updated TEXT)""")
+
+    def markDirty(self, ciks):
+        """
+        Mark ciks whose processed filing values were written since they were last aggregated
+        ...
+        Parameters
+        ----------
+        ciks: A list of ciks
+        """
+        rows = [(int(cik),) for cik in ciks]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO manifest (cik) VALUES (?)", rows)
+            conn.executemany("UPDATE manifest SET dirty = 1 WHERE cik = ?", rows)
+
+    def dirty(self):
+        """
+        Returns the sorted list of dirty ciks
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT cik FROM manifest WHERE dirty = 1 ORDER BY cik")]
+
+    def hashes(self):
+        """
+        Returns a dictionary of cik: content hash for the ciks that have been aggregated
+        """
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT cik, content_hash FROM manifest WHERE content_hash IS NOT NULL"))
+
+    def watermark(self, cik):
+        """
+        Returns the latest (year_sub, qtr_sub) of the values the cik was aggregated from, None if it has not been aggregated
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT year_sub, qtr_sub FROM manifest WHERE cik = ? AND content_hash IS NOT NULL", (int(cik),)).fetchone()
+        return None if row is None else tuple(row)
+
+    def record(self, df_hash):
+        """
+        Store the content hash and watermark of aggregated ciks and clear their dirty mark
+        ...
+        Parameters
+        ----------
+        df_hash: A dataframe of cik, content_hash, year_sub and qtr_sub (contentHashes)
+        """
+        updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(int(cik), str(content_hash), int(year), int(qtr), updated)
+                for cik, content_hash, year, qtr in df_hash[['cik', 'content_hash', 'year_sub', 'qtr_sub']].itertuples(index = False)]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO manifest (cik, content_hash, year_sub, qtr_sub, dirty, updated) VALUES (?, ?, ?, ?, 0, ?)",
+                             rows)
+
+    def clear(self, ciks):
+        """
+        Clear the dirty mark of ciks that have no processed values left to aggregate
+        """
+        with self._connect() as conn:
+            conn.executemany("UPDATE manifest SET dirty = 0 WHERE cik = ?", [(int(cik),) for cik in ciks])
+
+    def contentHashes(self, df):
+        """
+        Hash the processed filing values of every cik in a frame.  The rows are sorted first, so the hash only depends on the values
+        ...
+        Parameters
+        ----------
+        df: Processed filing values (cik, year_sub, qtr_sub, acct_typ, attr, date, pds, value)
+        ...
+        Returns
+        ----------
+         > A dataframe of cik, content_hash, year_sub and qtr_sub (the latest quarter of the cik's values)
+        """
+        if len(df) == 0:
+            return pd.DataFrame(columns = ['cik', 'content_hash', 'year_sub', 'qtr_sub'])
+        df = df.sort_values(['cik', 'acct_typ', 'attr', 'date', 'pds'], kind = 'mergesort')
+        row_hash = pd.util.hash_pandas_object(df[HASH_COLS].astype({'acct_typ': str, 'attr': str}), index = False).to_numpy()
+        cik = df['cik'].to_numpy()
+        starts = [0] + (np.flatnonzero(cik[1:] != cik[:-1]) + 1).tolist() + [len(cik)]
+        hashes = [hashlib.sha1(row_hash[starts[i]:starts[i + 1]].tobytes()).hexdigest() for i in range(len(starts) - 1)]
+        qtr = (df['year_sub'].astype(int) * 10 + df['qtr_sub'].astype(int)).groupby(df['cik'].to_numpy(), sort = True).max()
+        return pd.DataFrame({'cik': qtr.index.astype(int), 'content_hash': hashes, 'year_sub': (qtr // 10).to_numpy(),
+                             'qtr_sub': (qtr % 10).to_numpy()})
+
+    @contextmanager
+    def _connect(self):
+        """
+        A connection that commits and closes when the with block exits
+        """
+        conn = sqlite3.connect(str(self.db_path), timeout = 60)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
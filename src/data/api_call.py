@@ -4,8 +4,8 @@ API Function that is used to call each API and handle the responses appropriatel
 """
 
 #Imports
-import requests
-import time
+import logging
+from .http_client import get_client
 
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
@@ -19,40 +19,32 @@ __status__ = "Development"
 
 def api_call(url, headers, return_typ):
     """ 
-    The function that calls the api for both the history and fundamental information
+    The function that calls the api for both the history and fundamental information.  Calls go through the shared HTTP client, which
+    keeps the connections to each host open and retries timeouts and rate limits with a backoff
     ...
     Parameters
     ----------
     url: The url to be called for the api
+    headers: The headers to send with the request
+    return_typ: The format to return (json, text, content or the full response)
     ...
     Returns
     -----------
       > The text from an api call
     """
-    while True:
-        try: #iterate through and if a timeout exception is reached, try again
-            api_call = requests.get(url, headers= headers, timeout=(10, 30))
-            break
-        except requests.exceptions.Timeout:
-            pass
-        except requests.exceptions.ConnectionError:
-            pass
+    api_call = get_client().get(url, headers = headers)
 
-    while api_call.status_code != 200:
+    if api_call.status_code != 200:
         if api_call.status_code == 400:
             return 'Bad Call'
-        if api_call.status_code == 404:
-            #print("Error webpage not found")
-            return None
-        elif api_call.status_code == 429:
-            print('RateLimit')
-            time.sleep(20)
-        #recall the api request
-        time.sleep(2)
-        api_call = requests.get(url, headers= headers, timeout=(10, 30))
+        if api_call.status_code != 404:
+            logging.getLogger('http.api_call').warning("%s: failed with status %i" % (url, api_call.status_code))
+        return None
     if return_typ == 'json':
         return api_call.json()
     elif return_typ== 'text':
         return api_call.text
+    elif return_typ == 'content':
+        return api_call.content
     else:
         return api_call
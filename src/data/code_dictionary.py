@@ -0,0 +1,165 @@
+##!/usr/bin/env python
+"""
+Code Dictionary: A persistent dictionary that gives every concept (acct_typ:attr) and every ticker a small integer code, shared by every
+part of the SEC pipeline.  The processed filing store keeps the codes instead of repeating the strings on every row, and the strings
+are only decoded where the data leaves the pipeline (aggregated files, reports), as categoricals so a decoded column still holds one
+copy of each name.  Codes are assigned in an sqlite table, so processes formatting quarters at the same time agree on them.
+
+object CodeDictionary:
+    def encodeConcepts() -> ndarray: Returns the codes of (acct_typ, attr) pairs, adding the pairs that are new
+    def decodeConcepts() -> tuple: Returns the acct_typ and attr of concept codes
+    def encodeTickers() -> ndarray: Returns the codes of tickers, adding the tickers that are new
+    def decodeTickers() -> Series: Returns the tickers of ticker codes
+"""
+
+#Imports
+from contextlib import contextmanager
+import pandas as pd
+import numpy as np
+import sqlite3
+import logging
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+CONCEPTS, TICKERS = 'concepts', 'tickers'
+
+class CodeDictionary(object):
+
+    def __init__(self, db_path):
+        """
+        Opens (and creates if needed) the dictionary database and loads the codes
+        ...
+        Parameters
+        ----------
+        db_path: The path of the sqlite database file
+        """
+        self.logger = logging.getLogger('sec.CodeDictionary')
+        self.db_path = db_path
+        with self._connect() as conn:
+            for table in [CONCEPTS, TICKERS]:
+                conn.execute("CREATE TABLE IF NOT EXISTS %s (code INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)" % table)
+        self.codes, self.names = {CONCEPTS: {}, TICKERS: {}}, {CONCEPTS: np.array([], dtype = object), TICKERS: np.array([], dtype = object)}
+        for table in [CONCEPTS, TICKERS]:
+            self._load(table)
+
+    def encodeConcepts(self, acct_typ, attr):
+        """
+        The codes of (acct_typ, attr) pairs
+        ...
+        Parameters
+        ----------
+        acct_typ: An array of account types (us-gaap, dei, or a company prefix)
+        attr: An array of attribute names
+        ...
+        Returns
+        ----------
+         > An int32 array of codes
+        """
+        acct_typ, attr = pd.Series(acct_typ).astype(str).to_numpy(), pd.Series(attr).astype(str).to_numpy()
+        return self._encode(CONCEPTS, acct_typ.astype(object) + ':' + attr.astype(object))
+
+    def decodeConcepts(self, codes, categorical = False):
+        """
+        The acct_typ and attr of concept codes
+        ...
+        Parameters
+        ----------
+        codes: An array of concept codes
+        categorical: A boolean, if true the names are returned as categoricals with sorted categories
+        ...
+        Returns
+        ----------
+         > A tuple of (acct_typ, attr) arrays
+        """
+        uniq_idx, uniq = pd.factorize(np.asarray(codes))
+        names = self._names(CONCEPTS, uniq)
+        split = [name.split(':', 1) for name in names]
+        acct_typ = np.array([pair[0] for pair in split], dtype = object)
+        attr = np.array([pair[1] for pair in split], dtype = object)
+        return self._expand(acct_typ, uniq_idx, categorical), self._expand(attr, uniq_idx, categorical)
+
+    def encodeTickers(self, tickers):
+        """
+        The codes of tickers
+        ...
+        Parameters
+        ----------
+        tickers: An array of tickers
+        ...
+        Returns
+        ----------
+         > An int32 array of codes
+        """
+        return self._encode(TICKERS, pd.Series(tickers).astype(str).to_numpy().astype(object))
+
+    def decodeTickers(self, codes, categorical = False):
+        """
+        The tickers of ticker codes, as strings or as a categorical with sorted categories
+        """
+        uniq_idx, uniq = pd.factorize(np.asarray(codes))
+        return self._expand(self._names(TICKERS, uniq), uniq_idx, categorical)
+
+    def _encode(self, table, keys):
+        """
+        Look up the code of every key, the distinct keys that do not have a code are added in one transaction
+        """
+        uniq_idx, uniq = pd.factorize(keys)
+        missing = [key for key in uniq if key not in self.codes[table]]
+        if missing:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO %s (name) VALUES (?)" % table, [(key,) for key in missing])
+            # another process may have added keys as well, reload every code
+            self._load(table)
+        codes = np.array([self.codes[table][key] for key in uniq], dtype = np.int32)
+        return codes[uniq_idx]
+
+    def _names(self, table, codes):
+        """
+        The names of distinct codes, reloading the table when a code was added by another process
+        """
+        codes = np.asarray(codes, dtype = np.int64)
+        if len(codes) and (codes.max() >= len(self.names[table]) or (self.names[table][codes] == None).any()):
+            self._load(table)
+        return self.names[table][codes]
+
+    def _expand(self, names, uniq_idx, categorical):
+        """
+        Expand the names of the distinct codes back to every row
+        """
+        if not categorical:
+            return names[uniq_idx]
+        categories = sorted(set(names))
+        position = {name: idx for idx, name in enumerate(categories)}
+        mapping = np.array([position[name] for name in names], dtype = np.int32)
+        return pd.Categorical.from_codes(mapping[uniq_idx], categories = categories)
+
+    def _load(self, table):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT code, name FROM %s" % table).fetchall()
+        self.codes[table] = {name: code for code, name in rows}
+        names = np.full(max([code for code, name in rows], default = 0) + 1, None, dtype = object)
+        for code, name in rows:
+            names[code] = name
+        self.names[table] = names
+
+    @contextmanager
+    def _connect(self):
+        """
+        A connection that commits and closes when the with block exits
+        """
+        conn = sqlite3.connect(str(self.db_path), timeout = 60)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,70 @@
+##!/usr/bin/env python
+"""
+Concept Filter: The allow-list of xbrl concepts the formatter keeps.  The featurizer only reads the attributes named in docs/features.json
+(an attribute name in lower case, whatever its prefix), so the filter is built from that file plus a list of extra attributes, and
+every other fact is dropped while the instance is parsed.
+
+object ConceptFilter:
+    def allows() -> bool: Whether an attribute is kept
+    def fromFeatures() -> ConceptFilter: Builds the filter from a features.json file and a list of extra attributes
+"""
+
+#Imports
+import json
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+# the aggregated dataset keeps the shares outstanding from the dei values
+REQUIRED = ['entitycommonstocksharesoutstanding']
+
+class ConceptFilter(object):
+
+    def __init__(self, attrs):
+        """
+        Allow-list of attributes
+        ...
+        Parameters
+        ----------
+        attrs: An iterable of attribute names (matched in lower case, without the prefix)
+        """
+        self.attrs = frozenset(attr.lower().split(':')[-1] for attr in list(attrs) + REQUIRED)
+
+    def __contains__(self, attr):
+        return attr in self.attrs
+
+    def __len__(self):
+        return len(self.attrs)
+
+    def allows(self, attr):
+        """
+        Whether the attribute (lower case, without the prefix) is kept
+        """
+        return attr in self.attrs
+
+    @classmethod
+    def fromFeatures(cls, features_path, extra = None):
+        """
+        Build the filter from the attributes of every feature in features.json (a feature is a list of attribute names or lists of
+        attribute names that are summed) and a list of extra attributes
+        ...
+        Parameters
+        ----------
+        features_path: The path of the features.json file
+        extra: A list of extra attribute names to keep
+        """
+        with open(features_path, 'r') as f:
+            features = json.load(f)
+        attrs = []
+        for value in features.values():
+            for attr in value:
+                attrs += attr if isinstance(attr, list) else [attr]
+        return cls(attrs + list(extra or []))
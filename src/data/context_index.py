@@ -0,0 +1,132 @@
+##!/usr/bin/env python
+"""
+Context Index: Resolves every context of an xbrl instance once into a small table of id, start date, end date (or instant) and quarter
+count.  The dates are parsed for the whole table at once, and the id length filter (contexts with long ids carry dimensions) is computed
+for each context type in the same step.  The kept contexts are held in a dictionary so a fact's context is found in constant time.
+
+object ContextIndex:
+    def get() -> tuple: Returns the (quarters, end date) of a context id, None if it was not kept
+    def fromTags() -> ContextIndex: Builds the index from a BeautifulSoup tag list
+"""
+
+#Imports
+import pandas as pd
+import numpy as np
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+NONE, INSTANT, PERIOD = 0, 1, 2
+NAT = 'NaT'
+MAX_ID_LEN = 100
+MIN_LIMIT = 12
+
+class ContextIndex(object):
+
+    def __init__(self, contexts):
+        """
+        Index of the contexts of one instance
+        ...
+        Parameters
+        ----------
+        contexts: An iterable of (id, start date text, end date text, instant text) tuples, None for a date that is missing
+        """
+        self._build([ctx for ctx in contexts if ctx[0] is not None])
+        # instants win over periods that share an id, and a later context wins over an earlier one
+        self.dates = {}
+        for typ in [PERIOD, INSTANT]:
+            for idx in np.flatnonzero(self.keep & (self.typ == typ)):
+                self.dates[self.ids[idx]] = (int(self.qtrs[idx]), self.date[idx])
+
+    def __contains__(self, ctx_id):
+        return ctx_id in self.dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    def get(self, ctx_id):
+        """
+        The (quarters, end date) of a context, None if the context was filtered out or does not exist
+        """
+        return self.dates.get(ctx_id)
+
+    @classmethod
+    def fromTags(cls, tag_list):
+        """
+        Build the index from the tags of a BeautifulSoup document, reading every context whatever its prefix (xbrli:context, context)
+        ...
+        Parameters
+        ----------
+        tag_list: a list of the the tags in the document
+        """
+        contexts = []
+        for tag in tag_list:
+            if tag.name != 'context' and not tag.name.endswith(':context'):
+                continue
+            prefix = tag.name[:-7]
+            found = {prefix + 'startdate': None, prefix + 'enddate': None, prefix + 'instant': None}
+            for child in tag.descendants:
+                if child.name in found and found[child.name] is None:
+                    found[child.name] = child.text
+            contexts.append((tag.get('id'), found[prefix + 'startdate'], found[prefix + 'enddate'], found[prefix + 'instant']))
+        return cls(contexts)
+
+    @property
+    def table(self):
+        """
+        The context table as a dataframe (id, typ, start, end, date, qtrs, keep)
+        """
+        return pd.DataFrame({'id': self.ids, 'typ': np.where(self.typ == INSTANT, 'instant', np.where(self.typ == PERIOD, 'period', None)),
+                             'start': self.start, 'end': self.end, 'date': self.date, 'qtrs': self.qtrs, 'keep': self.keep})
+
+    def _build(self, contexts):
+        """
+        Build the context table.  Periods count their quarters (the length in years times four, rounded) and instants count as one
+        quarter.  For each type the id limit is one and a half times the shortest id (at least 12 characters), and contexts that round
+        to zero quarters are dropped
+        """
+        self.ids = [ctx[0] for ctx in contexts]
+        end_txt = [None if ctx[2] is None else ctx[2].replace('\n', '') for ctx in contexts]
+        self.start = self._parseDates([ctx[1] for ctx in contexts])
+        self.end = self._parseDates(end_txt)
+
+        is_instant = np.array([ctx[3] is not None for ctx in contexts], dtype = bool)
+        is_period = ~is_instant & ~np.isnat(self.start) & ~np.isnat(self.end)
+        self.typ = np.where(is_instant, INSTANT, np.where(is_period, PERIOD, NONE))
+        self.date = [ctx[3] if ctx[3] is not None else end for ctx, end in zip(contexts, end_txt)]
+        diff = self.end - self.start
+        days = np.where(np.isnat(diff), np.nan, diff.astype(float))
+        self.qtrs = np.where(is_instant, 1, np.nan_to_num(np.round(days / 365.25 * 4))).astype(int)
+
+        id_len = np.array([len(ctx_id) for ctx_id in self.ids], dtype = int)
+        limit = np.zeros(len(self.ids))
+        for typ in [INSTANT, PERIOD]:
+            mask = self.typ == typ
+            if mask.any():
+                limit[mask] = max(MIN_LIMIT, min(MAX_ID_LEN, id_len[mask].min()) * 1.5)
+        self.keep = (self.typ != NONE) & (id_len < limit) & (self.qtrs != 0)
+
+    def _parseDates(self, dates):
+        """
+        Parse a list of date texts (YYYY-MM-DD, with or without a time) into a datetime64 array, dates that cannot be read become NaT
+        """
+        days = [NAT if txt is None else txt.replace('\n', '').split('T')[0] for txt in dates]
+        try:
+            return np.array(days, dtype = 'datetime64[D]')
+        except ValueError:
+            # a bad date in the document, parse one at a time so only that date is lost
+            return np.array([self._parseDate(day) for day in days], dtype = 'datetime64[D]')
+
+    def _parseDate(self, day):
+        try:
+            return np.datetime64(day, 'D') if len(day) == 10 else np.datetime64(NAT)
+        except ValueError:
+            return np.datetime64(NAT)
@@ -0,0 +1,268 @@
+##!/usr/bin/env python
+"""
+EDGAR Catalog: A columnar copy of every quarter's EDGAR full index (master.idx), stored as parquet partitioned by year and quarter.  The
+company name and form type columns are dictionary encoded and the submission date is a date column, so questions like "every 10-Q and
+10-K for these ciks since a date" are answered from the parquet files without re-reading the index text files.
+
+object EdgarCatalog:
+    def readMasterIndex() -> Table: Streams master.idx out of the quarter's master.zip into an arrow table
+    def writeQuarter() -> None: Saves (replaces) a quarter's partition of the catalog
+    def importLegacyIndex() -> int: Loads the old index/<year>-QTR<n>.tsv files into the catalog
+    def importLegacyQuarter() -> bool: Loads one old index file into the catalog
+    def query() -> DataFrame: Returns the filings that match the forms, ciks, dates and quarters
+    def select() -> DataFrame: Same filters as query() over a table that has not been saved yet
+    def quarters() -> list: Returns the (year, qtr) partitions in the catalog
+    def maxDate() -> str: Returns the latest submission date of a quarter
+"""
+
+#Imports
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import zipfile
+import logging
+import io
+import os
+import re
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+SCHEMA = pa.schema([('cik', pa.int64()),
+                    ('nm', pa.dictionary(pa.int32(), pa.string())),
+                    ('type', pa.dictionary(pa.int32(), pa.string())),
+                    ('dt_submitted', pa.date32()),
+                    ('text', pa.string())])
+COLUMNS = ['cik', 'nm', 'type', 'dt_submitted', 'text', 'url']
+BATCH_SIZE = 100000
+TSV_RE = re.compile(r'(\d{4})-QTR(\d)\.tsv$')
+
+class EdgarCatalog(object):
+
+    def __init__(self, catalog_dir):
+        """
+        The catalog of EDGAR filings
+        ...
+        Parameters
+        ----------
+        catalog_dir: The directory the parquet partitions are saved in (year=YYYY/qtr=N/index.parquet)
+        """
+        self.logger = logging.getLogger('sec.EdgarCatalog')
+        self.catalog_dir = catalog_dir
+        self.catalog_dir.mkdir(parents = True, exist_ok = True)
+
+    def readMasterIndex(self, master_zip):
+        """
+        Read master.idx out of a quarter's master.zip a batch of lines at a time into an arrow table
+        ...
+        Parameters
+        ----------
+        master_zip: The path or file object of master.zip
+        ...
+        Returns
+        ----------
+         > An arrow table with the catalog's schema
+        """
+        with zipfile.ZipFile(master_zip).open("master.idx") as z_in:
+            lines = io.TextIOWrapper(z_in, encoding = 'utf-8', errors = 'ignore')
+            # the header ends with a line of dashes
+            for line in lines:
+                if line.startswith('-----'):
+                    break
+            return self._buildTable(line.rstrip('\n').split('|') for line in lines)
+
+    def importLegacyIndex(self, ind_dir):
+        """
+        Load the index files the downloader used to write (index/<year>-QTR<n>.tsv, pipe separated with the index url appended)
+        ...
+        Parameters
+        ----------
+        ind_dir: The directory of the old index files
+        ...
+        Returns
+        ----------
+         > The number of quarters loaded
+        """
+        return sum(self.importLegacyQuarter(file) for file in sorted(ind_dir.glob('*.tsv')))
+
+    def importLegacyQuarter(self, file):
+        """
+        Load one of the old index files (index/<year>-QTR<n>.tsv) as its quarter's partition
+        ...
+        Returns
+        ----------
+         > True if the file was loaded, false if it is missing or not named like an index file
+        """
+        match = TSV_RE.search(file.name)
+        if match is None or not file.exists():
+            return False
+        with open(file, 'r', encoding = 'utf-8', errors = 'ignore') as f:
+            table = self._buildTable(line.rstrip('\n').split('|')[:5] for line in f)
+        self.writeQuarter(int(match.group(1)), int(match.group(2)), table)
+        return True
+
+    def writeQuarter(self, year, qtr, table):
+        """
+        Save a quarter's index, replacing the partition if it already exists
+        ...
+        Parameters
+        ----------
+        year: The year of the index
+        qtr: The quarter of the index (1-4)
+        table: The arrow table from readMasterIndex()
+        """
+        part_dir = self.catalog_dir.joinpath('year=%i' % year, 'qtr=%i' % qtr)
+        part_dir.mkdir(parents = True, exist_ok = True)
+        tmp = part_dir.joinpath('index.parquet.tmp')
+        pq.write_table(table, str(tmp))
+        os.replace(tmp, part_dir.joinpath('index.parquet'))
+        self.logger.info("Catalog updated for %i QTR %i: %i filings" % (year, qtr, table.num_rows))
+
+    def query(self, forms = None, ciks = None, since = None, until = None, quarters = None, columns = None):
+        """
+        Returns the filings in the catalog that match every filter that is given
+        ...
+        Parameters
+        ----------
+        forms: A list of form types (10-Q, 10-K)
+        ciks: A list of ciks
+        since: Only filings submitted after this date (YYYY-MM-DD, exclusive)
+        until: Only filings submitted on or before this date (YYYY-MM-DD)
+        quarters: A list of (year, qtr) tuples
+        columns: The catalog columns to read (url comes with text), None reads every column
+        ...
+        Returns
+        ----------
+         > A dataframe of cik, nm, type, dt_submitted (YYYY-MM-DD), text (filing path) and url (index page path)
+        """
+        columns = SCHEMA.names if columns is None else [col for col in SCHEMA.names if col in columns]
+        if not self.quarters():
+            return self._toFrame(SCHEMA.empty_table().select(columns))
+        dataset = ds.dataset(str(self.catalog_dir), format = 'parquet', partitioning = 'hive')
+        expr = self._filter(forms, ciks, since, until)
+        if quarters:
+            part_expr = None
+            for year, qtr in quarters:
+                q_expr = (ds.field('year') == year) & (ds.field('qtr') == qtr)
+                part_expr = q_expr if part_expr is None else part_expr | q_expr
+            expr = part_expr if expr is None else expr & part_expr
+        return self._toFrame(dataset.to_table(columns = columns, filter = expr))
+
+    def select(self, table, forms = None, ciks = None, since = None, until = None):
+        """
+        Apply the query() filters to a table that has not been written to the catalog.  The filters are applied to the dataframe, as an
+        in-memory table cannot be scanned as a dataset
+        """
+        df = self._toFrame(table)
+        keep = pd.Series(True, index = df.index)
+        if forms is not None:
+            keep &= df['type'].isin(list(forms))
+        if ciks is not None:
+            keep &= df['cik'].isin([int(cik) for cik in ciks])
+        # the dates are YYYY-MM-DD strings, so they compare in date order
+        if since is not None:
+            keep &= df['dt_submitted'] > since
+        if until is not None:
+            keep &= df['dt_submitted'] <= until
+        return df[keep].reset_index(drop = True)
+
+    def quarters(self):
+        """
+        Returns a sorted list of the (year, qtr) partitions in the catalog
+        """
+        found = []
+        for part in self.catalog_dir.glob('year=*/qtr=*/index.parquet'):
+            found.append((int(part.parent.parent.name.split('=')[1]), int(part.parent.name.split('=')[1])))
+        return sorted(found)
+
+    def maxDate(self, year, qtr):
+        """
+        Returns the latest submission date (YYYY-MM-DD) in a quarter's partition, None if the quarter is not in the catalog
+        """
+        part = self.catalog_dir.joinpath('year=%i' % year, 'qtr=%i' % qtr, 'index.parquet')
+        if not part.exists():
+            return None
+        dates = pq.read_table(str(part), columns = ['dt_submitted']).column('dt_submitted').to_pandas()
+        if len(dates) == 0:
+            return None
+        return str(dates.max())[:10]
+
+    def _buildTable(self, rows):
+        """
+        Build an arrow table from an iterator of split index lines (cik, company name, form type, date submitted, filing path), a batch
+        at a time so the whole index is never held as python objects
+        """
+        batches, cols = [], [[], [], [], [], []]
+        for row in rows:
+            if len(row) < 5:
+                continue
+            for col, val in zip(cols, row):
+                col.append(val)
+            if len(cols[0]) >= BATCH_SIZE:
+                batches.append(self._buildBatch(cols))
+                cols = [[], [], [], [], []]
+        if cols[0] or not batches:
+            batches.append(self._buildBatch(cols))
+        # the names and form types are encoded once for the whole table, so every batch shares one dictionary
+        arrays = []
+        for i, field in enumerate(SCHEMA):
+            column = pa.concat_arrays([batch.column(i) for batch in batches])
+            arrays.append(column.dictionary_encode() if pa.types.is_dictionary(field.type) else column)
+        return pa.Table.from_arrays(arrays, schema = SCHEMA)
+
+    def _buildBatch(self, cols):
+        """
+        Convert one batch of index columns to an arrow record batch (the dictionary columns are still plain strings)
+        """
+        cik, nm, typ, dt, text = cols
+        return pa.RecordBatch.from_arrays([pa.array(np.array(cik, dtype = np.int64)),
+                                           pa.array(nm, type = pa.string()),
+                                           pa.array(typ, type = pa.string()),
+                                           pa.array(np.array(dt, dtype = 'datetime64[D]')),
+                                           pa.array(text, type = pa.string())],
+                                          names = SCHEMA.names)
+
+    def _filter(self, forms, ciks, since, until):
+        """
+        Build the arrow filter expression for the query filters (None if there are no filters)
+        """
+        exprs = []
+        if forms is not None:
+            exprs.append(ds.field('type').isin(list(forms)))
+        if ciks is not None:
+            exprs.append(ds.field('cik').isin([int(cik) for cik in ciks]))
+        if since is not None:
+            exprs.append(ds.field('dt_submitted') > datetime.strptime(since, '%Y-%m-%d').date())
+        if until is not None:
+            exprs.append(ds.field('dt_submitted') <= datetime.strptime(until, '%Y-%m-%d').date())
+        if not exprs:
+            return None
+        expr = exprs[0]
+        for other in exprs[1:]:
+            expr = expr & other
+        return expr
+
+    def _toFrame(self, table):
+        """
+        Convert a catalog table into the dataframe the downloader works with
+        """
+        df = table.to_pandas()
+        for col in ['nm', 'type']:
+            if col in df.columns:
+                df[col] = df[col].astype(str)
+        if 'dt_submitted' in df.columns:
+            df['dt_submitted'] = df['dt_submitted'].astype(str).str[:10]
+        if 'text' in df.columns:
+            df['url'] = df['text'].str.replace('.txt', '-index.html', regex = False)
+        return df[[col for col in COLUMNS if col in df.columns]]
@@ -1,24 +1,42 @@
 ##!/usr/bin/env python
 """
-Stock API Download: Brings down data from the TDAmeritrade stock API into the tables.
+Stock API Download: Brings down daily prices from a price provider into the price store.  A provider answers one call,
+fetchHistory(tickers, start, end), with an arrow table of candles, so the stocks job does not depend on where the prices come from:
+TDPriceProvider downloads them from the TD Ameritrade api and ReplayPriceProvider reads them from a saved price store, which lets the
+whole job run (and be load tested) without a network.  The last date of each ticker is kept in a MasterTable that checkpoints the
+master data while the job runs.
 
-object TDClient:
+object PriceProvider:
+    def fetchHistory() -> Table: Returns the daily candles of a list of tickers between two dates
+    def setConcurrency() -> None: Sets the number of requests in flight and the request rate of the provider
+
+object TDPriceProvider(PriceProvider):
     def _headers() -> dict: function that returns the header necessary for the TD Ameritrade API
     def refreshAPIKey() -> None: If the API Key is outdated, get a new API key and update the parameters in the object
-    def updateStockHistory() -> date: Update the stock history and return the max date for the master table
     def api_call() -> Calls the api with the appropriate parameters and returns the function    
+
+object ReplayPriceProvider(PriceProvider):
+    def fetchHistory() -> Table: Returns the candles saved in a price store
+
+object TDClient:
+    def updateStockHistory() -> date: Update the stock history and return the max date for the master table
+    def updateStockHistoryAsync() -> None: Update the stock history with many requests in flight, writing the candles as they arrive
+    def rebuildWatermarks() -> int: Rebuilds the last stored date of every ticker in one pass over the price store
 """
 
 #Imports
+from abc import ABC, abstractmethod
 import json
-import requests
+import asyncio
 import pandas as pd
-import time
-from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from datetime import datetime, timedelta
 import logging
-from .api_call import api_call
-import math
+from .http_client import get_client
+from .price_watermarks import PriceWatermarks
+from .master_table import MasterTable, MASTER_FILE
+from .price_store import PriceStore, SCHEMA, COLUMNS
 
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
@@ -32,117 +50,94 @@ __status__ = "Development"
 
 #constants
 BASE = 'https://api.tdameritrade.com/v1/'
-AUTH = BASE + 'oauth2/token'
-HISTORY = BASE + 'marketdata/%s/pricehistory?periodType=month&frequencyType=daily&startDate=%s&endDate=%s'
+AUTH = 'oauth2/token'
+HISTORY = 'marketdata/%s/pricehistory?periodType=month&frequencyType=daily&startDate=%s&endDate=%s'
+WATERMARKS_DB = 'price-watermarks.db'
+PRICES_DIR = 'prices'
+WORKERS = 8
+BATCH = 200
 
-class TDClient(object):
-    def __init__(self, key, proc_path, mstr_path):
+class PriceProvider(ABC):
+    """
+    A source of daily prices.  Tickers the provider could not get are listed in self.failed after each call.  A provider must define
+    fetchHistory(), one without it cannot be created
+    """
+    workers = 1
+    failed = ()
+
+    @abstractmethod
+    def fetchHistory(self, tickers, start, end):
+        """
+        The daily candles of a list of tickers
+        ...
+        Parameters
+        ----------
+        tickers: A list of tickers
+        start: The first date to return (YYYY-MM-DD)
+        end: The last date to return (YYYY-MM-DD)
+        ...
+        Returns
+        ----------
+         > An arrow table of ticker, date, open, high, low, close and volume (the price store schema)
+        """
+
+    def setConcurrency(self, workers, rate = None):
+        """
+        Set the number of requests the provider keeps in flight and the number of requests per second (None keeps the current limit)
+        """
+        self.workers = workers
+
+class TDPriceProvider(PriceProvider):
+    def __init__(self, key, base = BASE, workers = 1):
         """ 
-        An object that allows access to the TD Ameritrade website and download new stock information
+        Daily prices from the TD Ameritrade price history api
         ... 
         Parameters
         ----------
         key: The path to the api token file with the current refresh token
-        proc_path: The directory with the processeed data
+        base: The base url of the api (a local stub server in tests)
+        workers: The number of requests in flight, 1 downloads one ticker at a time
         """
-        self.logger = logging.getLogger('stocks.TDClient')
+        self.logger = logging.getLogger('stocks.TDPriceProvider')
         self.get_new_key = False
         self.api_token = key
-        self.proc_path = proc_path
-        self.mstr_path = mstr_path
-        self.df_mstr = pd.read_csv(mstr_path.joinpath('company_info1.tsv.gz'),
-                                   compression='gzip',
-                                    sep = '\t',)
-        self.df_mstr['sector'] = self.df_mstr['sector'].fillna('no-sector')
+        self.base = base
+        self.workers = workers
+        self.failed = []
         self.refreshAPIKey()
 
-    def updateStockHistory(self):
+    def fetchHistory(self, tickers, start, end):
         """ 
-        This function downloads stock data into the analysis database. If the symbol returns an error, update the table with Bad Symbol
+        The daily candles of a list of tickers, one request per ticker.  With more than one worker the requests run on the shared http
+        client from a thread pool (so the host's rate limit and retries still apply) and an expired token is refreshed once however
+        many requests saw it expire
+        ...
+        Parameters
+        ----------
+        tickers: A list of tickers
+        start: The first date to return (YYYY-MM-DD)
+        end: The last date to return (YYYY-MM-DD)
+        ...
+        Returns
+        ----------
+         > An arrow table of ticker, date, open, high, low, close and volume
         """
-        stocks_DF = self.df_mstr[['ticker','last_update','sector']]
-        
-        # Iterate through the stocks 
-        for index, row in stocks_DF.iterrows():
-            # Replace the start date
-            if row['ticker'] in ['A','AA','AAC','AACG','AACI','AACIU','AACIW','AADI','AAIC']:
-                continue
-            print(row['ticker'])
-            startDate = row['last_update']
-            sector = row['sector'].lower().replace(' ','-')
-
-            # Get the start date
-            if startDate == (datetime.today() - timedelta(days = 3)).strftime('%Y-%m-%d') or \
-                startDate == (datetime.today() - timedelta(days = 1)).strftime('%Y-%m-%d') or \
-                startDate == datetime.today().strftime('%Y-%m-%d'):
-                self.logger.info("%s: Stock History Passed" % row['ticker'])
-                continue
-            elif math.isnan(startDate):
-                # Read the file
-                df = pd.read_csv(self.proc_path.joinpath('%s.tsv.gz' % sector),
-                            compression = 'gzip',
-                            sep = '\t',
-                            index_col = False,
-                            encoding = 'utf-8',
-                            lineterminator = '\n')
-                
-                # Get list of dates
-                dateFound = df[df['ticker'] == row['ticker']]['date'].tolist()
-
-                # if there are no dates, set a long term initial date
-                if len(dateFound) == 0:
-                    startDate = '2009-06-30'
-                else:
-                    startDate = max(dateFound)
-            
-            if startDate is None:
-                startDate = '2009-06-30'
-
-            time.sleep(0.1)
-            strt_dt = int((datetime.strptime(startDate, '%Y-%m-%d') + timedelta(days = 1)).timestamp() * 1000)
-            end_dt = int(datetime.today().timestamp() * 1000)
-            url = HISTORY % (row['ticker'], strt_dt, end_dt)
-
-            # Get the stock data from the process
-            try:
-                x = self.api_call(url)
-                df = pd.DataFrame(x['candles'])
-                df['datetime'] = pd.to_datetime(df['datetime'], unit= 'ms')
-                df['datetime'] = df['datetime'].dt.date
-            except:
-                self.df_mstr.loc[self.df_mstr['ticker'] == row['ticker'],'ipoyear'] = row['ticker']
-                self.logger.info("%s: Stock History Failed" % row['ticker'])
-                continue
-            
-            # Reformat the dataframe
-            df.insert(0, 'ticker', row['ticker'])
-            df.rename(columns = {'datetime': 'date'}, inplace = True)
-            try:
-                df = df[['ticker','date', 'open','high','low','close','volume']]
-                # Update the master-data object
-                self.df_mstr.loc[self.df_mstr['ticker'] == row['ticker'], 'last_update'] = max(df['date'])
-                
-                df.to_csv(self.proc_path.joinpath('%s.tsv.gz' % sector),
-                        compression = 'gzip',
-                        mode = 'a',
-                        sep='\t',
-                        index = False,
-                        encoding='utf-8',
-                        line_terminator = '\n')
-                self.logger.info("%s: Stock History Downloaded" % row['ticker'])
-            except:
-                self.logger.info("%s: Stock History Failed for Ticker" % row['ticker'])
-                pass
-
-        # Write the master file to an output
-        self.df_mstr.to_csv(self.mstr_path.joinpath('company_info1.tsv.gz'),
-                        compression = 'gzip',
-                        mode = 'w',
-                        sep='\t',
-                        index = False,
-                        encoding='utf-8',
-                        line_terminator = '\n')
+        self.failed = []
+        if self.workers > 1:
+            frames = asyncio.run(self._fetchAll(tickers, start, end))
+        else:
+            frames = [self._candles(ticker, self._history(ticker, start, end)) for ticker in tickers]
+        frames = [df for df in frames if df is not None and len(df)]
+        if not frames:
+            return SCHEMA.empty_table()
+        return PriceStore.toTable(pd.concat(frames, ignore_index = True))
 
+    def setConcurrency(self, workers, rate = None):
+        """ 
+        Set the number of requests in flight and the requests per second allowed to the api host
+        """
+        self.workers = workers
+        get_client().setHostLimits(urlsplit(self.base).hostname, concurrency = workers, rate = rate)
 
     def refreshAPIKey(self):
         """ 
@@ -155,7 +150,7 @@ class TDClient(object):
             self.logger.info('refreshAPIKey')
             api_new_key = {val: api_key[val] for val in ['refresh_token', 'redirect_uri', 'client_id'] }
             api_new_key['grant_type'] = 'refresh_token'
-            api_call = requests.post(AUTH, data= api_new_key)
+            api_call = get_client().post(self.base + AUTH, data= api_new_key)
             api_call_json = api_call.json()
             api_key['access_token'] = api_call_json['access_token']
             with open(self.api_token, "w") as file:
@@ -165,56 +160,308 @@ class TDClient(object):
         self._oath_user_id = api_key['client_id']
         self.get_new_key = False
 
-    def _headers(self):
+    def _headers(self, token = None):
         """ 
         Setting the heading for the API call.  Need the token for a succesful call as well as a User Agent
         """
-        return {'Authorization': 'Bearer ' + self._token, 'User-agent': 'Dylan' ,'Accept': 'application/json',}
+        return {'Authorization': 'Bearer ' + (token or self._token), 'User-agent': 'Dylan' ,'Accept': 'application/json',}
 
     def api_call(self, url):
         ''' 
-        The function that calls the api for both the history and fundamental information
+        The function that calls the api for both the history and fundamental information.  Rate limits and timeouts are retried by the
+        shared http client, an expired token is refreshed here
             ::param url: The url to be called for the api
             return: an api call
         '''
-        api_call = requests.get(url, headers= self._headers())
+        api_call = get_client().get(url, headers= self._headers(), use_cache = False)
 
-        while api_call.status_code != 200:
-            if api_call.status_code == 401:
-                self.get_new_key = True
-                self.refreshAPIKey()
-            elif api_call.status_code == 400:
-                return 'Bad Call'
-            elif api_call.status_code == 429:
-                print('RateLimit')
-                time.sleep(20)
-            #recall the api request
-            time.sleep(1)
-            print(api_call.status_code)
-            api_call = requests.get(url, headers= self._headers())
-        
+        for _ in range(3):
+            if api_call.status_code != 401:
+                break
+            self.get_new_key = True
+            self.refreshAPIKey()
+            api_call = get_client().get(url, headers= self._headers(), use_cache = False)
+        return self._response(url, api_call)
+
+    def _response(self, url, api_call):
+        """ 
+        The json of a response, 'Bad Call' for a bad request and None for the other failures
+        """
+        if api_call.status_code == 400:
+            return 'Bad Call'
+        elif api_call.status_code != 200:
+            self.logger.info("%s: Failed with status %i" % (url, api_call.status_code))
+            return None
         return api_call.json()
 
-    def dropDuplicatesFromEquities(self):
-        '''
-        
-        '''
-        # Get the name of all sectors in the dataset
-        out_files = [x for x in self.proc_data.glob('**/*') if x.is_file()]
-
-        for file in out_files:
-            # Read the file
-            df = pd.read_csv(file,
-                            compression = 'gzip',
-                            sep = '\t',
-                            index_col = False,
-                            encoding = 'utf-8',
-                            lineterminator = '\n')
-
-            # Drop duplicates from the dataset
-            print(len(df['ticker']))
-            df.drop_duplicates(subset=['date','ticker'], inplace = True )
-            print(len(df['ticker']))
-            break
-
-            
\ No newline at end of file
+    def _history(self, ticker, start, end):
+        """ 
+        The price history response of a ticker, None if the call failed
+        """
+        try:
+            return self.api_call(self._historyUrl(ticker, start, end))
+        except Exception as e:
+            self.logger.info("%s: %s" % (ticker, type(e).__name__))
+            return None
+
+    def _historyUrl(self, ticker, start, end):
+        strt_dt = int(datetime.strptime(start, '%Y-%m-%d').timestamp() * 1000)
+        end_dt = int(min(datetime.today(), datetime.strptime(end, '%Y-%m-%d') + timedelta(days = 1, microseconds = -1)).timestamp() * 1000)
+        return self.base + HISTORY % (ticker, strt_dt, end_dt)
+
+    def _candles(self, ticker, x):
+        """ 
+        The candles of a price history response as a dataframe (ticker, date, open, high, low, close, volume), None (and the ticker
+        is added to the failed list) if the response has no candles
+        """
+        try:
+            df = pd.DataFrame(x['candles'])
+        except:
+            self.failed.append(ticker)
+            return None
+        if len(df) == 0:
+            return None
+        df['datetime'] = pd.to_datetime(df['datetime'], unit= 'ms')
+        df['datetime'] = df['datetime'].dt.date
+
+        # Reformat the dataframe
+        df.insert(0, 'ticker', ticker)
+        df.rename(columns = {'datetime': 'date'}, inplace = True)
+        return df[COLUMNS]
+
+    async def _fetchAll(self, tickers, start, end):
+        """ 
+        Download the tickers on a number of tasks sharing one thread pool
+        """
+        loop = asyncio.get_running_loop()
+        self._refresh_lock = asyncio.Lock()
+        frames = {}
+        remaining = iter(tickers)
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+
+            async def download():
+                # the tasks share the iterator, every ticker is taken by one task
+                for ticker in remaining:
+                    try:
+                        x = await self._fetch(loop, pool, self._historyUrl(ticker, start, end))
+                    except Exception as e:
+                        self.logger.info("%s: %s" % (ticker, type(e).__name__))
+                        x = None
+                    frames[ticker] = self._candles(ticker, x)
+            await asyncio.gather(*[download() for _ in range(self.workers)])
+        return [frames[ticker] for ticker in tickers]
+
+    async def _fetch(self, loop, pool, url):
+        """ 
+        Call the api on the thread pool.  A 401 refreshes the token (once for all the requests that sent the same token) and retries
+        """
+        for _ in range(4):
+            token = self._token
+            api_call = await loop.run_in_executor(pool, lambda: get_client().get(url, headers = self._headers(token), use_cache = False))
+            if api_call.status_code != 401:
+                break
+            await self._refreshOnce(loop, pool, token)
+        return self._response(url, api_call)
+
+    async def _refreshOnce(self, loop, pool, token):
+        """ 
+        Refresh the token unless another request already replaced the token that expired
+        """
+        async with self._refresh_lock:
+            if self._token == token:
+                self.get_new_key = True
+                await loop.run_in_executor(pool, self.refreshAPIKey)
+
+class ReplayPriceProvider(PriceProvider):
+    def __init__(self, source_dir, fail = None):
+        """ 
+        Daily prices read from a saved price store (a copy of the equities price store, or one built for a test), so the stocks job
+        can run at full universe size without a network
+        ... 
+        Parameters
+        ----------
+        source_dir: The directory of the saved price store
+        fail: A list of tickers to report as failed, as the api would for a bad symbol
+        """
+        self.logger = logging.getLogger('stocks.ReplayPriceProvider')
+        self.source = PriceStore(source_dir)
+        self.fail = set(fail or [])
+        self.failed = []
+
+    def fetchHistory(self, tickers, start, end):
+        """ 
+        The saved candles of a list of tickers between two dates, read with the ticker and date filters pushed into the scan
+        """
+        self.failed = [ticker for ticker in tickers if ticker in self.fail]
+        df = self.source.read([ticker for ticker in tickers if ticker not in self.fail], start = start, end = end)
+        return PriceStore.toTable(df)
+
+class TDClient(object):
+    def __init__(self, key, proc_path, mstr_path, base = BASE, provider = None):
+        """ 
+        The stocks job: downloads the new daily prices of every listed company into the price store
+        ... 
+        Parameters
+        ----------
+        key: The path to the api token file with the current refresh token
+        proc_path: The directory with the processeed data (the price store is kept in proc_path/prices)
+        mstr_path: The directory with the master data
+        base: The base url of the api (a local stub server in tests)
+        provider: The PriceProvider to get the prices from, defaults to the TD Ameritrade api
+        """
+        self.logger = logging.getLogger('stocks.TDClient')
+        self.proc_path = proc_path
+        self.mstr_path = mstr_path
+        self.master = MasterTable(mstr_path.joinpath(MASTER_FILE))
+        self.store = PriceStore(proc_path.joinpath(PRICES_DIR))
+        self.watermarks = PriceWatermarks(proc_path.joinpath(WATERMARKS_DB))
+        if self.watermarks.empty():
+            self.rebuildWatermarks()
+        self.provider = provider if provider is not None else TDPriceProvider(key, base)
+
+    def updateStockHistory(self):
+        """ 
+        This function downloads stock data into the analysis database. If the symbol returns an error, update the table with Bad Symbol
+        """
+        # Iterate through the stocks, a batch of tickers with the same start date at a time
+        try:
+            for start, batch in self._batches(self._pending()):
+                self._updated(self._write(self._fetch(start, batch)))
+        finally:
+            # Write the master file to an output, an interrupted run keeps what it downloaded
+            self.master.checkpoint()
+
+    def updateStockHistoryAsync(self, workers = WORKERS, rate = None):
+        """ 
+        Download the stock data with a number of requests in flight at once, and write each batch of candles to the price store on a
+        writer thread while the next batch downloads
+        ...
+        Parameters
+        ----------
+        workers: The number of requests in flight
+        rate: The number of requests per second allowed to the api, None keeps the host's limit
+        """
+        self.provider.setConcurrency(workers, rate)
+        writing = None
+        try:
+            with ThreadPoolExecutor(max_workers = 1) as write_pool:
+                for start, batch in self._batches(self._pending()):
+                    frames = self._fetch(start, batch)
+                    # the master table is only changed on this thread
+                    if writing is not None:
+                        self._updated(writing.result())
+                    writing = write_pool.submit(self._write, frames)
+                if writing is not None:
+                    self._updated(writing.result())
+        finally:
+            self.master.checkpoint()
+
+    def rebuildWatermarks(self):
+        """ 
+        Rebuild the last stored date of every ticker from the price store, reading the ticker and date columns one partition at a time
+        """
+        self.logger.info('Rebuilding the price watermarks')
+        return self.watermarks.rebuild(df for partition, df in self.store.readPartitions(columns = ['ticker','date']))
+
+    def _pending(self):
+        """ 
+        The tickers to download with their sector and the date their stored history ends
+        ...
+        Returns
+        ----------
+         > A list of (ticker, sector, start date) tuples
+        """
+        pending = []
+        stocks_DF = self.master.frame()[['ticker','last_update','sector']].fillna({'sector': 'no-sector'})
+        recent = [(datetime.today() - timedelta(days = days)).strftime('%Y-%m-%d') for days in [3, 1, 0]]
+        for ticker, startDate, sector in stocks_DF.itertuples(index = False):
+            # Replace the start date
+            if ticker in ['A','AA','AAC','AACG','AACI','AACIU','AACIW','AADI','AAIC']:
+                continue
+            sector = sector.lower().replace(' ','-')
+
+            # Get the start date
+            if startDate in recent:
+                self.logger.info("%s: Stock History Passed" % ticker)
+                continue
+            elif pd.isna(startDate):
+                # The last date stored for the ticker, none if there are no dates
+                startDate = self.watermarks.get(ticker)
+
+            # if there are no dates, set a long term initial date
+            if startDate is None:
+                startDate = '2009-06-30'
+            pending.append((ticker, sector, startDate))
+        return pending
+
+    def _batches(self, pending):
+        """ 
+        Group the pending tickers by the day after their history ends, in batches of at most BATCH tickers
+        ...
+        Returns
+        ----------
+         > A generator of (first date to download, [(ticker, sector)]) tuples
+        """
+        groups = {}
+        for ticker, sector, startDate in pending:
+            start = (datetime.strptime(startDate, '%Y-%m-%d') + timedelta(days = 1)).strftime('%Y-%m-%d')
+            groups.setdefault(start, []).append((ticker, sector))
+        for start, group in groups.items():
+            for i in range(0, len(group), BATCH):
+                yield start, group[i:i + BATCH]
+
+    def _fetch(self, start, batch):
+        """ 
+        Get the candles of a batch of tickers from the provider, marking the tickers it could not get
+        ...
+        Returns
+        ----------
+         > A list of (ticker, sector, candles) tuples
+        """
+        df = self.provider.fetchHistory([ticker for ticker, sector in batch], start, datetime.today().strftime('%Y-%m-%d'))
+        df = df.to_pandas(date_as_object = False)
+        for ticker in self.provider.failed:
+            self._failed(ticker)
+        groups = {ticker: df_tick for ticker, df_tick in df.groupby('ticker', sort = False)}
+        return [(ticker, sector, groups[ticker].reset_index(drop = True)) if ticker in groups else (ticker, sector, df.iloc[:0])
+                for ticker, sector in batch if ticker not in self.provider.failed]
+
+    def _failed(self, ticker):
+        self.master.set(ticker, 'ipoyear', ticker)
+        self.logger.info("%s: Stock History Failed" % ticker)
+
+    def _write(self, batch):
+        """ 
+        Append the candles of a batch of tickers to the price store in one write, moving their watermarks in the same transaction
+        ...
+        Parameters
+        ----------
+        batch: A list of (ticker, sector, candles) tuples
+        ...
+        Returns
+        ----------
+         > A list of the (ticker, last date) written
+        """
+        for ticker, sector, df in batch:
+            if len(df) == 0:
+                self.logger.info("%s: No New Stock History" % ticker)
+        batch = [(ticker, sector, df) for ticker, sector, df in batch if len(df)]
+        if not batch:
+            return []
+        last = [pd.Timestamp(max(df['date'])).strftime('%Y-%m-%d') for ticker, sector, df in batch]
+        try:
+            with self.watermarks.appendingMany([(ticker, last_date, sector) for (ticker, sector, df), last_date in zip(batch, last)]):
+                self.store.append(pd.concat([df for ticker, sector, df in batch], ignore_index = True))
+        except:
+            self.logger.info("%s: Stock History Failed for Ticker" % ', '.join(ticker for ticker, sector, df in batch))
+            return []
+        for ticker, sector, df in batch:
+            self.logger.info("%s: Stock History Downloaded" % ticker)
+        return [(ticker, last_date) for (ticker, sector, df), last_date in zip(batch, last)]
+
+    def _updated(self, written):
+        """ 
+        Update the master table with the last date written for each ticker
+        """
+        for ticker, last_date in written:
+            self.master.set(ticker, 'last_update', last_date)
@@ -29,10 +29,10 @@ import pandas as pd
 import time
 import logging
 from .api_call import api_call
+from .http_client import get_client
 from datetime import datetime, timedelta, date
 from os.path import exists
 import os
-import requests
 
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
@@ -335,7 +335,7 @@ class WikipediaScraper(object):
             ::param searc: The term being searched on Wikipedia
         """
         try:
-            query = requests.get(r'https://en.wikipedia.org/w/api.php?action=query&titles={}&&redirects&format=json'.format(search))
+            query = get_client().get(r'https://en.wikipedia.org/w/api.php?action=query&titles={}&&redirects&format=json'.format(search))
         except:
             return 'None'
         if query is None:
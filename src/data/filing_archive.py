@@ -0,0 +1,217 @@
+##!/usr/bin/env python
+"""
+Quarter Archive: Writes the downloaded xbrl instances into the quarter's zip file.  The zip is kept open for the whole download and its
+central directory is written once per batch instead of once per filing.  Every batch is journaled by accession number, and the end of
+the zip is saved before a batch starts so a crash in the middle of a batch rolls the zip back to the last journaled batch.
+
+object QuarterArchive:
+    def open() -> None: Recovers an interrupted batch, reads the journal and opens the zip
+    def isComplete() -> bool: Whether a filing was written by a previous batch
+    def hasFiling() -> bool: Whether the zip already has a member for a filing (zips written before the journal existed)
+    def write() -> None: Adds a filing to the zip, flushing the batch when it is full
+    def flush() -> None: Writes the zip's central directory and journals the batch
+    def pendingFiles() -> list: Zip members from an interrupted run that have not been handed to the formatter
+    def markRunComplete() -> None: Records that every filing journaled so far has been handed to the formatter
+    def close() -> None: Flushes the last batch and closes the zip
+"""
+
+#Imports
+import zipfile
+import logging
+import os
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+RUN_COMPLETE = '#complete'
+
+class QuarterArchive(object):
+
+    def __init__(self, zip_path, batch_size = 100):
+        """
+        Archive writer for one quarter's zip file
+        ...
+        Parameters
+        ----------
+        zip_path: The path of the quarter's zip file
+        batch_size: The number of filings written between flushes
+        """
+        self.logger = logging.getLogger('sec.QuarterArchive')
+        self.zip_path = zip_path
+        self.journal_path = zip_path.with_name(zip_path.name + '.journal')
+        self.rollback_path = zip_path.with_name(zip_path.name + '.rollback')
+        self.batch_size = batch_size
+        self.completed = set()
+        self.pending = []
+        self.interrupted = []
+        self.members = set()
+        self.zip = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Roll back a batch that was interrupted, load the journal of completed filings and open the zip for appending
+        """
+        if not self.zip_path.exists():
+            zipfile.ZipFile(self.zip_path, 'w').close()
+        self._recover()
+
+        self.completed, self.interrupted = set(), []
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r') as journal:
+                for line in journal:
+                    line = line.rstrip('\n')
+                    if line == RUN_COMPLETE:
+                        self.interrupted = []
+                    elif '\t' in line:
+                        accession, file_name = line.split('\t')
+                        self.completed.add(accession)
+                        self.interrupted.append(file_name)
+        # the members of a zip written before the journal existed (<cik>-<ticker>_<type>_<date>.xml) are matched by cik, type and date
+        with zipfile.ZipFile(self.zip_path, 'r') as z:
+            self.members = {self._filingKey(name) for name in z.namelist()}
+        self._openZip()
+        self.logger.info("%s: %i filings already downloaded" % (self.zip_path.name, len(self.members)))
+
+    def isComplete(self, accession):
+        """
+        Whether the filing was written and journaled by an earlier batch
+        """
+        return accession in self.completed
+
+    def hasFiling(self, cik, form, date):
+        """
+        Whether the zip has a member for the filing of a company, form type and submission date
+        """
+        return (str(int(cik)), str(form), str(date)[:10]) in self.members
+
+    def write(self, accession, file_name, data):
+        """
+        Add a filing to the zip
+        ...
+        Parameters
+        ----------
+        accession: The accession number of the filing
+        file_name: The name of the member in the zip
+        data: The text of the xbrl document
+        """
+        self.zip.writestr(file_name, data)
+        self.pending.append((accession, file_name))
+        self.members.add(self._filingKey(file_name))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the central directory of the zip, then journal the batch and drop the rollback copy.  Nothing is journaled until the zip is
+        on disk, so a crash at any point leaves the journal consistent with the zip (after the rollback)
+        """
+        if not self.pending:
+            return
+        self.zip.close()
+        with open(self.zip_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        with open(self.journal_path, 'a') as journal:
+            journal.write(''.join('%s\t%s\n' % (accession, file_name) for accession, file_name in self.pending))
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.completed.update(accession for accession, file_name in self.pending)
+        self.interrupted.extend(file_name for accession, file_name in self.pending)
+        self.pending = []
+        os.remove(self.rollback_path)
+        self._openZip()
+
+    def pendingFiles(self):
+        """
+        The zip members journaled since the last completed run, so a resumed run can still hand them to the formatter
+        """
+        return list(self.interrupted)
+
+    def markRunComplete(self):
+        """
+        Flush and record in the journal that every filing so far has been handed to the formatter
+        """
+        self.flush()
+        with open(self.journal_path, 'a') as journal:
+            journal.write(RUN_COMPLETE + '\n')
+        self.interrupted = []
+        # the journal grew, so the rollback copy has to be retaken or a crash in the next batch would look journaled
+        self.zip.close()
+        self._openZip()
+
+    def close(self):
+        """
+        Flush the last batch and close the zip
+        """
+        if self.zip is None:
+            return
+        self.flush()
+        self.zip.close()
+        self.zip = None
+        if self.rollback_path.exists():
+            os.remove(self.rollback_path)
+
+    def _filingKey(self, name):
+        """
+        The (cik, type, date) of a member name, None for a name that does not follow <cik>-<ticker>_<type>_<date>.xml
+        """
+        parts = name.rsplit('.', 1)[0].split('_')
+        if len(parts) != 3 or not parts[0].split('-')[0].isdigit():
+            return None
+        return (str(int(parts[0].split('-')[0])), parts[1], parts[2][:10])
+
+    def _openZip(self):
+        """
+        Save the end of the zip (the central directory that appending overwrites) to the rollback file and open the zip for appending
+        """
+        with zipfile.ZipFile(self.zip_path, 'r') as z:
+            start_dir = z.start_dir
+        with open(self.zip_path, 'rb') as f:
+            f.seek(start_dir)
+            tail = f.read()
+        journal_size = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+
+        tmp = self.rollback_path.with_name(self.rollback_path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(b'%i %i\n' % (start_dir, journal_size))
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.rollback_path)
+        self.zip = zipfile.ZipFile(self.zip_path, 'a', zipfile.ZIP_DEFLATED)
+
+    def _recover(self):
+        """
+        If a batch was interrupted before it was journaled, cut the zip back to where the batch started and restore the central directory
+        that was saved.  If the journal grew after the rollback was saved, the batch finished and only the rollback file is left over
+        """
+        if not self.rollback_path.exists():
+            return
+        with open(self.rollback_path, 'rb') as f:
+            start_dir, journal_size = [int(val) for val in f.readline().split()]
+            tail = f.read()
+        if self.journal_path.exists() and self.journal_path.stat().st_size > journal_size:
+            os.remove(self.rollback_path)
+            return
+        with open(self.zip_path, 'rb+') as f:
+            f.truncate(start_dir)
+            f.seek(start_dir)
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.remove(self.rollback_path)
+        self.logger.info("%s: Rolled back an interrupted batch" % self.zip_path.name)
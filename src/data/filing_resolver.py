@@ -0,0 +1,175 @@
+##!/usr/bin/env python
+"""
+Filing Resolver: Finds the primary html document and the xbrl instance of a filing from its accession number.  The filing folder's json
+directory listing (edgar/data/<cik>/<accession>/index.json) is small and is read without an html parser, but it has no document types, so
+the primary document is only taken from it by a form-aware rule: the html document an inline xbrl instance was extracted from
+(<doc>.htm for <doc>_htm.xml), or the html document named after the form (d10k.htm, msft-10q_20200930.htm).  When the listing does not
+identify both documents, the -index.html page is read with lxml and the documents are picked by the type column of its document table.
+Only when neither identifies the primary document is the largest html document that is not an exhibit used.
+
+object FilingResolver:
+    def resolve() -> tuple: Returns the (xbrl url, html url) of a filing
+    def fromDirectory() -> tuple: Picks the documents from the folder's json listing
+    def fromIndexPage() -> tuple: Picks the documents from the -index.html page
+"""
+
+#Imports
+from urllib.parse import urljoin
+import lxml.html
+import logging
+import re
+from .api_call import api_call
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+SEC_URL = "https://www.sec.gov"
+INSTANCE_RE = re.compile(r'\d(_htm)?\.xml$')
+LINKBASE_RE = re.compile(r'_(cal|def|lab|pre|ref)\.xml$')
+REPORT_RE = re.compile(r'^R\d+\.(htm|xml)$')
+EXHIBIT_RE = re.compile(r'ex-?\d|exhibit', re.IGNORECASE)
+
+class FilingResolver(object):
+
+    def __init__(self, headers):
+        """
+        Resolves the document links of a filing
+        ...
+        Parameters
+        ----------
+        headers: The headers sent to the SEC website
+        """
+        self.logger = logging.getLogger('sec.FilingResolver')
+        self.headers = headers
+
+    def resolve(self, cik, accession, form):
+        """
+        Find the xbrl instance and the primary html document of a filing, from the json listing first and the index page if needed
+        ...
+        Parameters
+        ----------
+        cik: The company's cik
+        accession: The accession number of the filing (0000320193-22-000007)
+        form: The form type of the filing (10-Q, 10-K)
+        ...
+        Returns
+        ----------
+         > A tuple of the full urls (xml link, html link), None for a document that could not be found
+        """
+        folder = "/Archives/edgar/data/%s/%s/" % (int(cik), accession.replace('-', ''))
+        items = self._listing(folder)
+        xbrl_link, html_link = self.fromDirectory(folder, form, items)
+        if xbrl_link is None or html_link is None:
+            self.logger.info("%s: Listing incomplete, reading the index page" % accession)
+            page_xbrl, page_html = self.fromIndexPage(folder + accession + '-index.html', form)
+            xbrl_link, html_link = xbrl_link or page_xbrl, html_link or page_html
+        if html_link is None:
+            html_link = self._largest(folder, items)
+            if html_link is not None:
+                self.logger.info("%s: No %s document found, using the largest html document" % (accession, form))
+        return (None if xbrl_link is None else urljoin(SEC_URL, xbrl_link),
+                None if html_link is None else urljoin(SEC_URL, html_link))
+
+    def fromDirectory(self, folder, form, items = None):
+        """
+        Pick the documents out of the filing folder's json listing.  The instance is the extracted inline xbrl instance (<doc>_htm.xml)
+        or the dated .xml file that is not a linkbase.  The primary document is the html document of the inline instance, or else the
+        largest html document named after the form, that is not an exhibit or a rendered report page
+        ...
+        Parameters
+        ----------
+        folder: The path of the filing folder (/Archives/edgar/data/<cik>/<accession without dashes>/)
+        form: The form type of the filing (10-Q, 10-K)
+        items: The items of the listing if it was already read
+        ...
+        Returns
+        ----------
+         > A tuple of the paths (xml link, html link), None for a document that could not be found
+        """
+        items = self._listing(folder) if items is None else items
+        xbrl_name = None
+        for item in items:
+            name = item.get('name', '')
+            if not REPORT_RE.match(name) and name.endswith('.xml') and INSTANCE_RE.search(name) and not LINKBASE_RE.search(name):
+                # the inline xbrl instance wins over any other dated .xml file
+                if xbrl_name is None or name.endswith('_htm.xml'):
+                    xbrl_name = name
+
+        html = self._htmlDocuments(items)
+        html_name = None
+        if xbrl_name is not None and xbrl_name.endswith('_htm.xml') and xbrl_name[:-len('_htm.xml')] + '.htm' in html:
+            html_name = xbrl_name[:-len('_htm.xml')] + '.htm'
+        else:
+            form_re = re.compile(re.escape(form.split('/')[0]).replace(r'\-', '-?'), re.IGNORECASE)
+            named = [name for name in html if form_re.search(name)]
+            if named:
+                html_name = max(named, key = lambda name: html[name])
+        return (None if xbrl_name is None else folder + xbrl_name), (None if html_name is None else folder + html_name)
+
+    def fromIndexPage(self, index_path, form):
+        """
+        Pick the documents out of the filing's -index.html page, using the type column of the document table
+        ...
+        Parameters
+        ----------
+        index_path: The path of the -index.html page
+        form: The form type of the filing, the type of the primary document
+        ...
+        Returns
+        ----------
+         > A tuple of the paths (xml link, html link), None for a document that could not be found
+        """
+        response = api_call(SEC_URL + index_path, self.headers, 'text')
+        if not response or response == 'Bad Call':
+            return None, None
+
+        docs = {}
+        for tr in lxml.html.fromstring(response).xpath('//table[@class="tableFile"]//tr[td]'):
+            tds = tr.xpath('./td')
+            hrefs = tr.xpath('./td/a/@href')
+            if len(tds) < 4 or not hrefs:
+                continue
+            link = hrefs[0]
+            # inline xbrl documents link through the viewer (/ix?doc=/Archives/...)
+            if not link.startswith('/Archives/') and '/Archives/' in link:
+                link = '/Archives/' + link.split('/Archives/')[1]
+            docs.setdefault(tds[3].text_content().strip(), []).append(link)
+
+        html_links = [link for link in docs.get(form, []) if link.endswith('.htm')]
+        xml_links = [link for link in docs.get('EX-101.INS', docs.get('XML', [])) if link.endswith('.xml')]
+        return (xml_links[0] if xml_links else None), (html_links[0] if html_links else None)
+
+    def _listing(self, folder):
+        """
+        The items of the filing folder's json listing, an empty list if it could not be read
+        """
+        listing = api_call(SEC_URL + folder + 'index.json', self.headers, 'json')
+        if not isinstance(listing, dict):
+            return []
+        return listing.get('directory', {}).get('item', [])
+
+    def _htmlDocuments(self, items):
+        """
+        The html documents of a listing that are not exhibits or rendered report pages, with their size
+        """
+        html = {}
+        for item in items:
+            name = item.get('name', '')
+            if name.endswith('.htm') and not REPORT_RE.match(name) and not EXHIBIT_RE.search(name):
+                html[name] = int(item['size']) if str(item.get('size', '')).isdigit() else 0
+        return html
+
+    def _largest(self, folder, items):
+        """
+        The path of the largest html document of a listing that is not an exhibit, the last resort for the primary document
+        """
+        html = self._htmlDocuments(items)
+        return folder + max(html, key = lambda name: html[name]) if html else None
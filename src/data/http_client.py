@@ -0,0 +1,213 @@
+##!/usr/bin/env python
+"""
+Shared HTTP client used by every downloader.  Keeps a pool of keep-alive connections for each host so that the TCP and TLS handshakes are
+only paid once, retries failed calls with an exponential backoff and honors the Retry-After header that is sent with rate limited responses.
+
+object HTTPClient:
+    def setHostLimits() -> None: Sets the number of concurrent requests and requests per second allowed for a host
+    def setCache() -> None: Sets the response cache that GET requests are served from
+    def get() -> Response: GET request through the host's connection pool (and the response cache if one is set)
+    def post() -> Response: POST request through the host's connection pool
+    def request() -> Response: Sends a request, retrying timeouts, connection errors and retryable status codes
+
+    def get_client() -> HTTPClient: Returns the client that is shared by the whole process
+"""
+
+#Imports
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import threading
+import logging
+import random
+import time
+from .rate_limit import RateLimiter
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+RETRY_STATUS = (429, 500, 502, 503, 504)
+TIMEOUT = (10, 30)
+# SEC fair access policy is 10 requests per second for the whole process
+HOST_LIMITS = {
+    'www.sec.gov': {'concurrency': 8, 'rate': 9},
+    'api.tdameritrade.com': {'concurrency': 8, 'rate': 2},
+}
+
+class HTTPClient(object):
+
+    def __init__(self, pool_size = 10, max_retries = 8, backoff = 1.0, max_backoff = 60.0, timeout = TIMEOUT):
+        """
+        A client that holds a requests session (and connection pool) for each host that is called
+        ...
+        Parameters
+        ----------
+        pool_size: The number of keep-alive connections kept open for each host
+        max_retries: The number of times a failed call is retried before giving up
+        backoff: The base number of seconds to wait between retries, doubled on every attempt
+        max_backoff: The longest time to wait between retries (also caps the Retry-After header)
+        timeout: A tuple of the connect and read timeout for each request
+        """
+        self.logger = logging.getLogger('http.HTTPClient')
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sessions = {}
+        self.semaphores = {}
+        self.limiters = {}
+        self.cache = None
+        self.lock = threading.Lock()
+        for host, limits in HOST_LIMITS.items():
+            self.setHostLimits(host, **limits)
+
+    def setHostLimits(self, host, concurrency = None, rate = None):
+        """
+        Limit the calls that are made to a host
+        ...
+        Parameters
+        ----------
+        host: The host name (www.sec.gov)
+        concurrency: The maximum number of requests in flight to the host at once
+        rate: The maximum number of requests per second to the host
+        """
+        with self.lock:
+            if concurrency is not None:
+                self.semaphores[host] = threading.BoundedSemaphore(concurrency)
+            if rate is not None:
+                self.limiters[host] = RateLimiter(rate = rate)
+
+    def setCache(self, cache):
+        """
+        Serve GET requests from a response cache
+        ...
+        Parameters
+        ----------
+        cache: A ResponseCache, None turns caching off
+        """
+        self.cache = cache
+
+    def get(self, url, headers = None, use_cache = True, **kwargs):
+        """
+        GET a url, see request().  Goes through the response cache when one is set, unless use_cache is False
+        """
+        if self.cache is not None and use_cache:
+            return self.cache.get(url, headers, lambda req_headers: self.request('GET', url, headers = req_headers, **kwargs))
+        return self.request('GET', url, headers = headers, **kwargs)
+
+    def post(self, url, data = None, headers = None, **kwargs):
+        """
+        POST to a url, see request()
+        """
+        return self.request('POST', url, headers = headers, data = data, **kwargs)
+
+    def request(self, method, url, headers = None, **kwargs):
+        """
+        Send a request through the host's session.  Timeouts, connection errors and retryable status codes (429, 5xx) are retried with
+        an exponential backoff with jitter, or by the time asked for in the Retry-After header
+        ...
+        Parameters
+        ----------
+        method: The http method (GET, POST)
+        url: The url to call
+        headers: The headers to send with the request
+        ...
+        Returns
+        -----------
+          > The response.  A retryable status is returned if the retries run out, connection errors are raised
+        """
+        host = urlsplit(url).hostname
+        session = self._session(host)
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self._send(host, session, method, url, headers, kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.logger.info("%s: %s, retrying" % (url, type(e).__name__))
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                return response
+            self.logger.info("%s: status %i, retrying" % (url, response.status_code))
+            time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+            attempt += 1
+
+    def _send(self, host, session, method, url, headers, kwargs):
+        """
+        Send a single request while holding the host's concurrency slot and rate limit token
+        """
+        limiter, semaphore = self.limiters.get(host), self.semaphores.get(host)
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            return session.request(method, url, headers = headers, **kwargs)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def _session(self, host):
+        """
+        Returns the session for a host, creating one with its own connection pool if it does not exist
+        """
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def _backoff(self, attempt, retry_after = None):
+        """
+        The number of seconds to wait before the next attempt
+        ...
+        Parameters
+        ----------
+        attempt: The number of attempts that have already failed
+        retry_after: The Retry-After header from the response (seconds or an http date)
+        """
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                try:
+                    wait = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    wait = None
+            if wait is not None:
+                return min(max(wait, 0), self.max_backoff)
+        # full jitter, so workers that fail together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_client():
+    """
+    The HTTPClient shared by the process, so every downloader reuses the same connection pools and host limits
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HTTPClient()
+        return _CLIENT
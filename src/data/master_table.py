@@ -0,0 +1,139 @@
+##!/usr/bin/env python
+"""
+Master Table: The company master data (company_info1.tsv.gz) held in memory with its rows indexed by ticker, so the stock download
+updates a ticker in constant time instead of scanning the ticker column for every ticker.  Updates are kept in a dictionary and applied to
+the frame in one assignment per column when the table is checkpointed.  A checkpoint is written every few hundred updates (or seconds) to
+a temporary file that replaces the master file in one rename, so an interrupted job keeps the progress of its last checkpoint and a
+reader never sees a half written file.
+
+object MasterTable:
+    def get() -> object: Returns the value of a column for a ticker
+    def set() -> None: Sets the value of a column for a ticker, checkpointing when enough updates are pending
+    def frame() -> DataFrame: Returns the master data with every pending update applied
+    def checkpoint() -> bool: Writes the master data to its file atomically if anything changed
+"""
+
+#Imports
+from datetime import datetime
+import pandas as pd
+import logging
+import os
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+MASTER_FILE = 'company_info1.tsv.gz'
+CHECKPOINT_EVERY = 500
+CHECKPOINT_SECS = 60
+
+class MasterTable(object):
+
+    def __init__(self, path, every = CHECKPOINT_EVERY, secs = CHECKPOINT_SECS):
+        """
+        Reads the master data and indexes its rows by ticker
+        ...
+        Parameters
+        ----------
+        path: The path of the master data file (a gzipped tsv)
+        every: The number of updates after which the table is checkpointed
+        secs: The number of seconds after which pending updates are checkpointed
+        """
+        self.logger = logging.getLogger('stocks.MasterTable')
+        self.path = path
+        self.every, self.secs = every, secs
+        self.df = pd.read_csv(path, compression = 'gzip', sep = '\t')
+        self.rows = {}
+        for pos, ticker in enumerate(self.df['ticker']):
+            if not pd.isna(ticker):
+                self.rows.setdefault(ticker, []).append(pos)
+        self.pending = {}
+        self.updates = 0
+        self.saved = datetime.now()
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def get(self, ticker, column):
+        """
+        The value of a column for a ticker (of its first row), None if the ticker is not in the master data
+        """
+        if ticker not in self.rows:
+            return None
+        if ticker in self.pending.get(column, {}):
+            return self.pending[column][ticker]
+        return self.df[column].iat[self.rows[ticker][0]]
+
+    def set(self, ticker, column, value):
+        """
+        Set the value of a column for every row of a ticker.  The update is applied at the next checkpoint, which is written once enough
+        updates are pending or enough time has passed since the last one
+        ...
+        Parameters
+        ----------
+        ticker: The ticker to update, a ticker not in the master data is ignored
+        column: The column to set
+        value: The new value
+        """
+        if ticker not in self.rows:
+            return
+        self.pending.setdefault(column, {})[ticker] = value
+        self.updates += 1
+        if self.updates >= self.every or (datetime.now() - self.saved).total_seconds() >= self.secs:
+            self.checkpoint()
+
+    def frame(self):
+        """
+        Returns the master data with every pending update applied
+        """
+        self._apply()
+        return self.df
+
+    def checkpoint(self):
+        """
+        Write the master data to a temporary file next to the master file and rename it over the master file, so the file on disk is
+        always a complete checkpoint
+        ...
+        Returns
+        ----------
+         > True if the file was written, false if nothing changed since the last checkpoint
+        """
+        if not self.updates:
+            return False
+        self._apply()
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            self.df.to_csv(f,
+                        compression = 'gzip',
+                        sep='\t',
+                        index = False,
+                        encoding='utf-8',
+                        line_terminator = '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.logger.info("Checkpointed %i master data updates" % self.updates)
+        self.updates = 0
+        self.saved = datetime.now()
+        return True
+
+    def _apply(self):
+        """
+        Assign the pending updates to the frame, one positional assignment per column
+        """
+        for column, values in self.pending.items():
+            if column not in self.df.columns:
+                self.df[column] = None
+            positions = [pos for ticker in values for pos in self.rows[ticker]]
+            updates = [value for ticker, value in values.items() for pos in self.rows[ticker]]
+            if self.df[column].dtype != object:
+                self.df[column] = self.df[column].astype(object)
+            self.df.iloc[positions, self.df.columns.get_loc(column)] = updates
+        self.pending = {}
@@ -0,0 +1,339 @@
+##!/usr/bin/env python
+"""
+Price Store: The daily candles of every ticker as parquet files partitioned by ticker bucket and year
+(ticker_bucket=NN/year=YYYY/<file>.parquet).  Prices are stored as float32, the ticker as a dictionary encoded string and the date as a
+date column.  Writes go through a delta log (an sqlite table of the files in the store): an append writes small delta files and
+commits them to the log in one transaction, so a reader only sees files that were fully written.  Compaction merges the files of a
+partition into one, keeping the last written row of each (ticker, date), and retires the old files in the log.  A read only opens the
+partitions of the tickers' buckets and years and pushes the ticker and date filters into the parquet scan.
+
+object PriceStore:
+    def append() -> int: Writes new candles as delta files committed to the log
+    def toTable() -> Table: Converts candles to an arrow table with the store's schema
+    def read() -> DataFrame: Reads the candles of some (or all) tickers between two dates
+    def readPartitions() -> generator: Reads the store one partition at a time
+    def compact() -> int: Merges the delta files of each partition and drops the duplicate (ticker, date) rows
+    def migrateFromTsv() -> int: Loads the old <sector>.tsv.gz files into the store
+"""
+
+#Imports
+from contextlib import contextmanager
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import sqlite3
+import logging
+import uuid
+import zlib
+import os
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+BUCKETS = 32
+LOG_DB = '_delta_log.db'
+MIGRATE_ROWS = 2000000
+KEY = ['ticker', 'date']
+COLUMNS = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
+SCHEMA = pa.schema([('ticker', pa.string()),
+                    ('date', pa.date32()),
+                    ('open', pa.float32()),
+                    ('high', pa.float32()),
+                    ('low', pa.float32()),
+                    ('close', pa.float32()),
+                    ('volume', pa.int64())])
+
+class PriceStore(object):
+
+    def __init__(self, store_dir, buckets = BUCKETS):
+        """
+        The price dataset
+        ...
+        Parameters
+        ----------
+        store_dir: The directory of the dataset and its delta log
+        buckets: The number of ticker buckets (a hash of the ticker modulo buckets)
+        """
+        self.logger = logging.getLogger('stocks.PriceStore')
+        self.store_dir = store_dir
+        self.store_dir.mkdir(parents = True, exist_ok = True)
+        self.buckets = buckets
+        with self._connect() as conn:
+            # version orders the files, a compacted file takes the version of the newest file it replaced
+            conn.execute("""CREATE TABLE IF NOT EXISTS files (seq INTEGER PRIMARY KEY AUTOINCREMENT, partition TEXT NOT NULL,
+                            path TEXT NOT NULL, rows INTEGER, version INTEGER, active INTEGER NOT NULL DEFAULT 1, added TEXT)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_partition ON files (partition, active)")
+
+    def bucket(self, ticker):
+        """
+        Returns the bucket of a ticker (stable between processes, unlike hash())
+        """
+        return zlib.crc32(str(ticker).encode('utf-8')) % self.buckets
+
+    def append(self, df):
+        """
+        Write candles.  Each partition the rows fall in gets a new delta file, and the files are committed to the log together
+        ...
+        Parameters
+        ----------
+        df: The candles (ticker, date, open, high, low, close, volume) as a dataframe or an arrow table, the date as a date, a
+            datetime or a YYYY-MM-DD string
+        ...
+        Returns
+        ----------
+         > The number of rows written
+        """
+        if isinstance(df, pa.Table):
+            df = df.to_pandas(date_as_object = False)
+        if len(df) == 0:
+            return 0
+        df = self._format(df)
+        buckets = df['ticker'].map(self.bucket)
+        years = df['date'].dt.year
+        written = []
+        for (bucket, year), df_part in df.groupby([buckets, years], sort = True):
+            partition = self._partition(bucket, year)
+            written.append((partition, self._writeFile(partition, 'delta', df_part), len(df_part)))
+        self._commit(written)
+        return len(df)
+
+    def read(self, tickers = None, start = None, end = None, columns = None, categorical = False):
+        """
+        Read candles.  Only the partitions of the tickers' buckets and the years between the dates are opened, and the ticker and date
+        filters are pushed into the parquet scan
+        ...
+        Parameters
+        ----------
+        tickers: A list of tickers to read, None reads every ticker
+        start: The first date to read (YYYY-MM-DD or a date), None reads from the first date
+        end: The last date to read (YYYY-MM-DD or a date), None reads to the last date
+        columns: The columns to return, None returns every column
+        categorical: A boolean, if true the ticker is returned as a categorical
+        ...
+        Returns
+        ----------
+         > A dataframe sorted by ticker and date, one row for each (ticker, date)
+        """
+        start = None if start is None else pd.Timestamp(start).date()
+        end = None if end is None else pd.Timestamp(end).date()
+        expr = None
+        for cond in [None if tickers is None else ds.field('ticker').isin([str(tick) for tick in tickers]),
+                     None if start is None else ds.field('date') >= pa.scalar(start, type = pa.date32()),
+                     None if end is None else ds.field('date') <= pa.scalar(end, type = pa.date32())]:
+            if cond is not None:
+                expr = cond if expr is None else expr & cond
+        buckets = None if tickers is None else {self.bucket(tick) for tick in tickers}
+
+        def keep(partition):
+            bucket, year = self._parsePartition(partition)
+            return (buckets is None or bucket in buckets) and (start is None or year >= start.year) and (end is None or year <= end.year)
+        return self._scan(keep, expr, columns, categorical)
+
+    def readPartitions(self, columns = None):
+        """
+        Read the store one partition at a time, so the whole store is never in memory at once
+        ...
+        Returns
+        ----------
+         > A generator of (partition, dataframe) pairs
+        """
+        for partition in sorted(self._active()):
+            yield partition, self._scan(lambda part: part == partition, None, columns, False)
+
+    def compact(self, min_files = 2):
+        """
+        Merge the files of every partition that has at least min_files files into one file.  The last written row of each (ticker, date)
+        is kept.  The new file and the retired files are swapped in the log in one transaction, and the retired files are then deleted
+        ...
+        Parameters
+        ----------
+        min_files: The number of files a partition needs before it is compacted
+        ...
+        Returns
+        ----------
+         > The number of partitions compacted
+        """
+        count = 0
+        for partition, files in sorted(self._active().items()):
+            if len(files) < min_files:
+                continue
+            df = self._readFiles(files, None, COLUMNS)
+            df = df.drop_duplicates(KEY, keep = 'last').sort_values(KEY, kind = 'mergesort')
+            path = self._writeFile(partition, 'part', df)
+            seqs = [seq for seq, version, file in files]
+            with self._connect() as conn:
+                conn.execute("INSERT INTO files (partition, path, rows, version, added) VALUES (?, ?, ?, ?, ?)",
+                             (partition, path, len(df), max(version for seq, version, file in files), self._now()))
+                conn.executemany("UPDATE files SET active = 0 WHERE seq = ?", [(seq,) for seq in seqs])
+            for seq, version, file in files:
+                try:
+                    os.remove(self.store_dir.joinpath(file))
+                except FileNotFoundError:
+                    pass
+            self.logger.info("Compacted %s: %i files into %i rows" % (partition, len(files), len(df)))
+            count += 1
+        return count
+
+    def migrateFromTsv(self, proc_dir):
+        """
+        Load the sector files the stock download used to append to (<sector>.tsv.gz), a chunk at a time, and compact the store
+        ...
+        Parameters
+        ----------
+        proc_dir: The directory of the old sector files
+        ...
+        Returns
+        ----------
+         > The number of rows loaded
+        """
+        count = 0
+        for file in sorted(proc_dir.glob('*.tsv.gz')):
+            for df in pd.read_csv(file,
+                                  compression = 'gzip',
+                                  sep = '\t',
+                                  usecols = COLUMNS,
+                                  dtype = str,
+                                  encoding = 'utf-8',
+                                  lineterminator = '\n',
+                                  chunksize = MIGRATE_ROWS):
+                # the header of every appended gzip member is read as a row
+                df = df[df['date'] != 'date'].dropna(subset = KEY)
+                count += self.append(df)
+            self.logger.info("Migrated %s" % file.name)
+        self.compact()
+        return count
+
+    @staticmethod
+    def toTable(df):
+        """
+        Convert candles (ticker, date, open, high, low, close, volume) to an arrow table with the store's schema
+        """
+        arrays = [pa.array(df['ticker'].astype(str).to_numpy(), type = pa.string()),
+                  pa.array(PriceStore._dates(df['date']).to_numpy().astype('datetime64[D]'), type = pa.date32())]
+        arrays += [pa.array(pd.to_numeric(df[col]).to_numpy().astype('float32'), type = pa.float32()) for col in ['open', 'high', 'low', 'close']]
+        arrays += [pa.array(pd.to_numeric(df['volume']).fillna(0).to_numpy().astype('int64'), type = pa.int64())]
+        return pa.Table.from_arrays(arrays, schema = SCHEMA)
+
+    def _format(self, df):
+        df = df[COLUMNS].copy()
+        df['ticker'] = df['ticker'].astype(str)
+        df['date'] = self._dates(df['date'])
+        for col in ['open', 'high', 'low', 'close']:
+            df[col] = pd.to_numeric(df[col]).astype('float32')
+        df['volume'] = pd.to_numeric(df['volume']).fillna(0).astype('int64')
+        return df
+
+    @staticmethod
+    def _dates(dates):
+        """
+        The dates as datetimes, a column that already holds datetimes is not parsed again
+        """
+        return dates if pd.api.types.is_datetime64_any_dtype(dates) else pd.to_datetime(dates)
+
+    def _scan(self, keep, expr, columns, categorical):
+        """
+        Read the active files of the kept partitions in log order and keep the last written row of each (ticker, date)
+        """
+        columns = COLUMNS if columns is None else list(columns)
+        files = [file for partition, part_files in self._active().items() if keep(partition) for file in part_files]
+        df = self._readFiles(sorted(files, key = lambda file: file[1]), expr, list(dict.fromkeys(KEY + columns)))
+        df = df.drop_duplicates(KEY, keep = 'last').sort_values(KEY, kind = 'mergesort').reset_index(drop = True)
+        if categorical:
+            df['ticker'] = df['ticker'].astype('category')
+        return df[columns]
+
+    def _readFiles(self, files, expr, columns):
+        """
+        Read files (seq, version, path) in order, each with the filter pushed into its scan.  A file retired by a compaction while it
+        was being read is skipped, the compacted file is read instead
+        """
+        frames = []
+        for seq, version, file in files:
+            try:
+                table = ds.dataset(str(self.store_dir.joinpath(file)), schema = SCHEMA, format = 'parquet').to_table(columns = columns,
+                                                                                                                filter = expr)
+            except (FileNotFoundError, OSError):
+                if self._isActive(seq):
+                    raise
+                return self._reread(files, expr, columns)
+            frames.append(table.to_pandas(date_as_object = False))
+        if not frames:
+            return pd.DataFrame({col: pd.Series(dtype = SCHEMA.field(col).type.to_pandas_dtype()) for col in columns})
+        return pd.concat(frames, ignore_index = True)
+
+    def _reread(self, files, expr, columns):
+        """
+        Read the current files of the partitions again after a compaction retired one of the files
+        """
+        partitions = {os.path.dirname(file) for seq, version, file in files}
+        current = [file for partition, part_files in self._active().items() if partition in partitions for file in part_files]
+        return self._readFiles(sorted(current, key = lambda file: file[1]), expr, columns)
+
+    def _active(self):
+        """
+        Returns a dictionary of partition: [(seq, version, path)] of the files in the store, in log order
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT partition, seq, version, path FROM files WHERE active = 1 ORDER BY version, seq").fetchall()
+        active = {}
+        for partition, seq, version, path in rows:
+            active.setdefault(partition, []).append((seq, version, path))
+        return active
+
+    def _isActive(self, seq):
+        with self._connect() as conn:
+            return conn.execute("SELECT active FROM files WHERE seq = ?", (seq,)).fetchone()[0] == 1
+
+    def _commit(self, written):
+        """
+        Add written files to the log in one transaction, each file's version is its own sequence number
+        """
+        with self._connect() as conn:
+            for partition, path, rows in written:
+                cur = conn.execute("INSERT INTO files (partition, path, rows, added) VALUES (?, ?, ?, ?)", (partition, path, rows, self._now()))
+                conn.execute("UPDATE files SET version = seq WHERE seq = ?", (cur.lastrowid,))
+
+    def _writeFile(self, partition, prefix, df):
+        """
+        Write the rows of a partition to a new file (a temporary file renamed into place) and return its path in the store
+        """
+        path = '%s/%s-%s.parquet' % (partition, prefix, uuid.uuid4().hex)
+        full = self.store_dir.joinpath(path)
+        full.parent.mkdir(parents = True, exist_ok = True)
+        tmp = full.with_name(full.name + '.tmp')
+        pq.write_table(self.toTable(df), str(tmp), use_dictionary = ['ticker'])
+        os.replace(tmp, full)
+        return path
+
+    def _partition(self, bucket, year):
+        return 'ticker_bucket=%02i/year=%i' % (bucket, year)
+
+    def _parsePartition(self, partition):
+        bucket, year = partition.split('/')
+        return int(bucket.split('=')[1]), int(year.split('=')[1])
+
+    def _now(self):
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @contextmanager
+    def _connect(self):
+        """
+        A connection that commits and closes when the with block exits
+        """
+        conn = sqlite3.connect(str(self.store_dir.joinpath(LOG_DB)), timeout = 60)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
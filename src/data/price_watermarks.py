@@ -0,0 +1,146 @@
+##!/usr/bin/env python
+"""
+Price Watermarks: Keeps the last stored price date of every ticker in an sqlite table, so the stock download reads one row instead of
+scanning the stored prices to find where a ticker's history stops.  A watermark is moved inside the same transaction as the append of the
+candles: the transaction is only committed once the candles are written, so a watermark is never ahead of the stored prices.  If the
+database is lost the watermarks are rebuilt in one streaming pass over the stored prices.
+
+object PriceWatermarks:
+    def get() -> str: Returns the last stored date of a ticker
+    def all() -> Dict: Returns the last stored date of every ticker
+    def appending() -> contextmanager: Moves a ticker's watermark in the transaction of an append
+    def appendingMany() -> contextmanager: Moves the watermarks of several tickers in the transaction of one append
+    def rebuild() -> int: Rebuilds every watermark from chunks of stored prices
+    def empty() -> bool: Whether the table has no watermarks
+"""
+
+#Imports
+from contextlib import contextmanager
+from datetime import datetime
+import sqlite3
+import logging
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+class PriceWatermarks(object):
+
+    def __init__(self, db_path):
+        """
+        Opens (and creates if needed) the watermark database
+        ...
+        Parameters
+        ----------
+        db_path: The path of the sqlite database file
+        """
+        self.logger = logging.getLogger('stocks.PriceWatermarks')
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS watermarks (ticker TEXT PRIMARY KEY, last_date TEXT NOT NULL, sector TEXT,
+                            updated TEXT)""")
+
+    def get(self, ticker):
+        """
+        Returns the last stored date (YYYY-MM-DD) of a ticker, None if it has no prices stored
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT last_date FROM watermarks WHERE ticker = ?", (str(ticker),)).fetchone()
+        return None if row is None else row[0]
+
+    def all(self):
+        """
+        Returns a dictionary of ticker: last stored date
+        """
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT ticker, last_date FROM watermarks"))
+
+    def empty(self):
+        """
+        Returns true when no watermark is stored (a new or lost database)
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM watermarks").fetchone()[0] == 0
+
+    @contextmanager
+    def appending(self, ticker, last_date, sector = None):
+        """
+        Move the watermark of a ticker while its candles are appended.  The update is made when the block starts and committed when it
+        exits, a block that raises rolls the watermark back.  A watermark never moves backwards
+        ...
+        Parameters
+        ----------
+        ticker: The ticker being appended
+        last_date: The last date of the candles being appended (YYYY-MM-DD)
+        sector: The sector of the ticker
+        """
+        with self.appendingMany([(ticker, last_date, sector)]):
+            yield
+
+    @contextmanager
+    def appendingMany(self, marks):
+        """
+        Move the watermarks of several tickers in the transaction of one append, see appending()
+        ...
+        Parameters
+        ----------
+        marks: A list of (ticker, last date, sector) tuples
+        """
+        updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = sqlite3.connect(str(self.db_path), timeout = 60)
+        try:
+            conn.executemany("""INSERT INTO watermarks (ticker, last_date, sector, updated) VALUES (?, ?, ?, ?)
+                                ON CONFLICT(ticker) DO UPDATE SET last_date = MAX(last_date, excluded.last_date), sector = excluded.sector,
+                                updated = excluded.updated""",
+                             [(str(ticker), str(last_date)[:10], sector, updated) for ticker, last_date, sector in marks])
+            yield
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def rebuild(self, chunks):
+        """
+        Replace every watermark with the last date of each ticker in the stored prices, reading them one chunk at a time
+        ...
+        Parameters
+        ----------
+        chunks: An iterable of dataframes with at least the ticker and date columns
+        ...
+        Returns
+        ----------
+         > The number of tickers with a watermark
+        """
+        last = {}
+        for df in chunks:
+            df = df.dropna(subset = ['ticker', 'date'])
+            for ticker, date in df.groupby(df['ticker'].astype(str), sort = False)['date'].max().astype(str).items():
+                last[ticker] = max(last.get(ticker, ''), date[:10])
+        updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._connect() as conn:
+            conn.execute("DELETE FROM watermarks")
+            conn.executemany("INSERT INTO watermarks (ticker, last_date, updated) VALUES (?, ?, ?)",
+                             [(ticker, date, updated) for ticker, date in last.items()])
+        self.logger.info("Rebuilt the watermarks of %i tickers" % len(last))
+        return len(last)
+
+    @contextmanager
+    def _connect(self):
+        """
+        A connection that commits and closes when the with block exits
+        """
+        conn = sqlite3.connect(str(self.db_path), timeout = 60)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,252 @@
+##!/usr/bin/env python
+"""
+Processed Store: The processed filing values as a parquet dataset partitioned by cik bucket and the quarter the filing was submitted
+(cik_bucket=NN/year_sub=YYYY/qtr_sub=N/part.parquet).  The ticker and the concept (acct_typ:attr) are kept as the integer codes of the
+shared CodeDictionary and are only decoded when the values are read.  Rows are keyed by (cik, concept, date, pds): writing a quarter
+again replaces its rows instead of appending duplicates, and when the same key was reported in several quarters the reader keeps the
+earliest one (the value as it was first filed).
+
+object ProcessedStore:
+    def upsert() -> list: Writes filing values, replacing the rows with the same key in the same quarter
+    def read() -> DataFrame: Reads the values of some (or all) companies with column and filter pushdown
+    def readBuckets() -> generator: Reads the store one cik bucket at a time
+    def ciks() -> list: Returns the ciks in the store
+    def replaceQuarters() -> list: Moves the partitions of another store (a staged quarter) into this store
+    def migrateFromTsv() -> int: Loads the old processed-filings/<cik>.tsv.gz files into the store
+"""
+
+#Imports
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import logging
+import os
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+BUCKETS = 64
+MIGRATE_ROWS = 2000000
+KEY = ['cik', 'acct_typ', 'attr', 'date', 'pds']
+CODE_KEY = ['cik', 'concept', 'date', 'pds']
+COLUMNS = ['cik', 'ticker', 'year_sub', 'qtr_sub', 'acct_typ', 'attr', 'date', 'pds', 'value']
+SCHEMA = pa.schema([('cik', pa.int64()),
+                    ('ticker', pa.int32()),
+                    ('concept', pa.int32()),
+                    ('date', pa.string()),
+                    ('pds', pa.int64()),
+                    ('value', pa.float64())])
+PARTITIONS = pa.schema([('cik_bucket', pa.int32()), ('year_sub', pa.int32()), ('qtr_sub', pa.int32())])
+
+class ProcessedStore(object):
+
+    def __init__(self, store_dir, codes, buckets = BUCKETS):
+        """
+        The processed filing dataset
+        ...
+        Parameters
+        ----------
+        store_dir: The directory of the dataset
+        codes: The CodeDictionary of the concept and ticker codes
+        buckets: The number of cik buckets (cik modulo buckets)
+        """
+        self.logger = logging.getLogger('sec.ProcessedStore')
+        self.store_dir = store_dir
+        self.store_dir.mkdir(parents = True, exist_ok = True)
+        self.codes = codes
+        self.buckets = buckets
+
+    def upsert(self, df):
+        """
+        Write filing values.  Each (cik bucket, quarter) partition the values fall in is read, merged with the new rows (a new row
+        replaces an old row with the same key) and rewritten in one rename.  Inside the batch the first filing of a key wins, as it did
+        when the filings were appended in order
+        ...
+        Parameters
+        ----------
+        df: The filing values (cik, ticker, year_sub, qtr_sub, acct_typ, attr, date, pds, value)
+        ...
+        Returns
+        ----------
+         > The ciks that were written
+        """
+        if len(df) == 0:
+            return []
+        df = df[COLUMNS].copy()
+        df['concept'] = self.codes.encodeConcepts(df['acct_typ'], df['attr'])
+        df['ticker'] = self.codes.encodeTickers(df['ticker'])
+        df['cik'] = df['cik'].astype('int64')
+        df['pds'] = df['pds'].astype('int64')
+        df['value'] = df['value'].astype(float)
+        df['date'] = df['date'].astype(str)
+        df['cik_bucket'] = df['cik'] % self.buckets
+        df = df.drop_duplicates(['year_sub', 'qtr_sub'] + CODE_KEY, keep = 'first')
+        for (bucket, year, qtr), df_part in df.groupby(['cik_bucket', 'year_sub', 'qtr_sub'], sort = True):
+            path = self._partPath(bucket, year, qtr)
+            if path.exists():
+                df_part = pd.concat([self._readPart(path), df_part], ignore_index = True)
+            df_part = df_part.drop_duplicates(CODE_KEY, keep = 'last').sort_values(CODE_KEY, kind = 'mergesort')
+            self._writePart(path, df_part)
+        return sorted(df['cik'].unique().tolist())
+
+    def read(self, ciks = None, columns = None, filter = None, categorical = False):
+        """
+        Read filing values.  Only the partitions of the ciks' buckets are opened, the filter is pushed into the parquet scan, and a key
+        filed in several quarters keeps its earliest quarter
+        ...
+        Parameters
+        ----------
+        ciks: A list of ciks to read, None reads every company
+        columns: The columns to return, None returns every column
+        filter: An extra pyarrow dataset expression on the stored columns (ds.field('pds') == 1)
+        categorical: A boolean, if true the ticker, acct_typ and attr are decoded to categoricals instead of strings
+        ...
+        Returns
+        ----------
+         > A dataframe sorted by cik, acct_typ, attr and date
+        """
+        expr = filter
+        if ciks is not None:
+            ciks = [int(cik) for cik in ciks]
+            cik_expr = ds.field('cik_bucket').isin(sorted({cik % self.buckets for cik in ciks})) & ds.field('cik').isin(ciks)
+            expr = cik_expr if expr is None else expr & cik_expr
+        return self._scan(expr, columns, categorical)
+
+    def readBuckets(self, columns = None, categorical = False):
+        """
+        Read the store one cik bucket at a time, so the whole store is never in memory at once
+        ...
+        Returns
+        ----------
+         > A generator of dataframes (one per bucket, sorted by cik, acct_typ, attr and date)
+        """
+        for bucket in range(self.buckets):
+            if self.store_dir.joinpath('cik_bucket=%i' % bucket).exists():
+                yield self._scan(ds.field('cik_bucket') == bucket, columns, categorical)
+
+    def ciks(self):
+        """
+        Returns the sorted list of ciks in the store
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return []
+        return sorted(pd.unique(dataset.to_table(columns = ['cik']).column('cik').to_pandas()).tolist())
+
+    def replaceQuarters(self, other):
+        """
+        Move every partition of another store into this one, replacing the partitions of the same bucket and quarter.  Used to merge a
+        quarter that was formatted into a staging store
+        ...
+        Parameters
+        ----------
+        other: The ProcessedStore with the staged partitions
+        ...
+        Returns
+        ----------
+         > The ciks that were moved
+        """
+        ciks = other.ciks()
+        for path in sorted(other.store_dir.glob('cik_bucket=*/year_sub=*/qtr_sub=*/part.parquet')):
+            target = self.store_dir.joinpath(path.relative_to(other.store_dir))
+            target.parent.mkdir(parents = True, exist_ok = True)
+            os.replace(path, target)
+        return ciks
+
+    def migrateFromTsv(self, proc_dir):
+        """
+        Load the per cik files the formatter used to append to (processed-filings/<cik>.tsv.gz)
+        ...
+        Parameters
+        ----------
+        proc_dir: The directory of the old processed files
+        ...
+        Returns
+        ----------
+         > The number of companies loaded
+        """
+        count, frames, rows = 0, [], 0
+        for comp_file in sorted(proc_dir.glob('*.tsv.gz')):
+            try:
+                df = pd.read_csv(comp_file,
+                                compression = 'gzip',
+                                sep = '\t',
+                                index_col = False,
+                                encoding = 'utf-8',
+                                lineterminator = '\n',
+                                dtype = {'date': str})
+            except Exception:
+                self.logger.info("%s: Could not be read, skipping" % comp_file.name)
+                continue
+            # the old files were appended in filing order, so the first copy of a key is the one that was filed first
+            frames.append(df.dropna(subset = KEY).drop_duplicates(['year_sub', 'qtr_sub'] + KEY, keep = 'first'))
+            rows += len(frames[-1])
+            count += 1
+            # companies are written in batches so each partition is rewritten a few times instead of once per company
+            if rows >= MIGRATE_ROWS:
+                self.upsert(pd.concat(frames, ignore_index = True))
+                frames, rows = [], 0
+        if frames:
+            self.upsert(pd.concat(frames, ignore_index = True))
+        self.logger.info("Migrated %i companies from %s" % (count, proc_dir))
+        return count
+
+    def _scan(self, expr, columns, categorical):
+        """
+        Scan the dataset with a filter, keep the earliest quarter of every key, decode the codes and project the columns
+        """
+        columns = COLUMNS if columns is None else list(columns)
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns = columns)
+        stored = [{'acct_typ': 'concept', 'attr': 'concept'}.get(col, col) for col in columns]
+        scan_cols = list(dict.fromkeys(CODE_KEY + ['year_sub', 'qtr_sub'] + stored))
+        df = dataset.to_table(columns = scan_cols, filter = expr).to_pandas()
+        df = df.sort_values(['year_sub', 'qtr_sub'], kind = 'mergesort').drop_duplicates(CODE_KEY, keep = 'first')
+
+        # the codes are decoded to categoricals with sorted categories, so the rows sort by name
+        df['acct_typ'], df['attr'] = self.codes.decodeConcepts(df['concept'].to_numpy(), categorical = True)
+        if 'ticker' in df.columns:
+            df['ticker'] = self.codes.decodeTickers(df['ticker'].to_numpy(), categorical = True)
+        df = df.sort_values(['cik', 'acct_typ', 'attr', 'date'], kind = 'mergesort').reset_index(drop = True)
+        if not categorical:
+            for col in ['ticker', 'acct_typ', 'attr']:
+                if col in columns:
+                    df[col] = df[col].astype(str)
+        return df[columns]
+
+    def _dataset(self):
+        """
+        The dataset of the partition files.  It is built from the file list rather than the directory, because the directory still
+        holds the old <cik>.tsv.gz files (which are not parquet) after a migration
+        """
+        files = sorted(str(path) for path in self.store_dir.glob('cik_bucket=*/year_sub=*/qtr_sub=*/part.parquet'))
+        if not files:
+            return None
+        return ds.dataset(files, format = 'parquet', schema = pa.schema(list(SCHEMA) + list(PARTITIONS)),
+                          partitioning = ds.partitioning(PARTITIONS, flavor = 'hive'), partition_base_dir = str(self.store_dir))
+
+    def _partPath(self, bucket, year, qtr):
+        return self.store_dir.joinpath('cik_bucket=%i' % bucket, 'year_sub=%i' % year, 'qtr_sub=%i' % qtr, 'part.parquet')
+
+    def _readPart(self, path):
+        return pq.read_table(str(path)).to_pandas()
+
+    def _writePart(self, path, df):
+        """
+        Write one partition (without the partition columns) to a temporary file and rename it over the old partition
+        """
+        path.parent.mkdir(parents = True, exist_ok = True)
+        table = pa.Table.from_arrays([pa.array(df[field.name].to_numpy(), type = field.type) for field in SCHEMA], schema = SCHEMA)
+        tmp = path.with_name(path.name + '.tmp')
+        pq.write_table(table, str(tmp))
+        os.replace(tmp, path)
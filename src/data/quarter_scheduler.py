@@ -0,0 +1,152 @@
+##!/usr/bin/env python
+"""
+Quarter Scheduler: Formats many quarters of SEC filings at once on a pool of processes.  Every quarter is formatted into its own staging
+store (so no two processes write the same partition) and a completion marker is written when the quarter finishes, so a rerun only
+formats the quarters that did not finish.  The staged partitions are then moved into the processed filing store.
+
+object QuarterScheduler:
+    def run() -> list: Formats the quarters that are not complete and merges every staged quarter into the processed filings
+    def formatQuarters() -> list: Formats the quarters that are not complete on the process pool
+    def merge() -> list: Moves the partitions of the staged quarters into the processed filing store
+    def isComplete() -> bool: Whether a quarter has been formatted into the staging directory
+"""
+
+#Imports
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import shutil
+import os
+from .sec_formatter import SECFilingFormatter, MANIFEST_DB, CODES_DB
+from .code_dictionary import CodeDictionary
+from .aggregate_manifest import AggregateManifest
+from .processed_store import ProcessedStore
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+COMPLETE = '.complete'
+
+# The formatter of a worker process, created once by _initWorker
+_formatter = None
+
+def _initWorker(sec_data, master_data, concepts):
+    """
+    Create the formatter of a worker process
+    """
+    global _formatter
+    _formatter = SECFilingFormatter(sec_data = sec_data, master_data = master_data, concepts = concepts)
+
+def _formatQuarter(year, qtr, stage_dir):
+    """
+    Format one quarter into its staging directory and mark it complete.  Anything left in the directory by an interrupted run is removed
+    first
+    """
+    if stage_dir.exists():
+        shutil.rmtree(stage_dir)
+    stage_dir.mkdir(parents = True)
+    _formatter.formatFilings(yr_qtr = (year, qtr), files_to_format = None, out_dir = stage_dir)
+    stage_dir.joinpath(COMPLETE).touch()
+    return year, qtr
+
+class QuarterScheduler(object):
+
+    def __init__(self, sec_data, master_data, workers = None, concepts = None):
+        """
+        Scheduler for formatting many quarters of filings
+        ...
+        Parameters
+        ----------
+        sec_data: The directory that holds the sec data
+        master_data: The directory that holds the master ticker list
+        workers: The number of processes, defaults to the number of cpus
+        concepts: A ConceptFilter of the attributes the formatters keep, None keeps every numeric fact
+        """
+        self.logger = logging.getLogger('sec.QuarterScheduler')
+        self.sec_data = sec_data
+        self.master_data = master_data
+        self.raw_data = sec_data.joinpath('raw-filings')
+        self.proc_data = sec_data.joinpath('processed-filings')
+        self.stage_data = sec_data.joinpath('staged-filings')
+        self.workers = workers or os.cpu_count()
+        self.concepts = concepts
+
+    def run(self, quarters):
+        """
+        Format the quarters that have not been completed, then merge every staged quarter into the processed filings
+        ...
+        Parameters
+        ----------
+        quarters: A list of (year, qtr) tuples
+        ...
+        Returns
+        ----------
+         > The ciks that were merged
+        """
+        self.formatQuarters(quarters)
+        return self.merge(quarters)
+
+    def formatQuarters(self, quarters):
+        """
+        Format the quarters that are not complete on the process pool.  The largest quarters are started first so one big quarter does
+        not finish long after the others
+        ...
+        Returns
+        ----------
+         > The (year, qtr) tuples that were formatted
+        """
+        to_run = []
+        for (year, qtr) in quarters:
+            zip_path = self.raw_data.joinpath("%sQTR%s.zip" % (year, qtr))
+            if self.isComplete(year, qtr):
+                self.logger.info("%i QTR %i: Already formatted, skipping" % (year, qtr))
+            elif not zip_path.exists():
+                self.logger.info("%i QTR %i: No filings downloaded, skipping" % (year, qtr))
+            else:
+                to_run.append((zip_path.stat().st_size, year, qtr))
+        to_run.sort(reverse = True)
+
+        done = []
+        with ProcessPoolExecutor(max_workers = self.workers, initializer = _initWorker,
+                                 initargs = (self.sec_data, self.master_data, self.concepts)) as pool:
+            futures = [pool.submit(_formatQuarter, year, qtr, self._stageDir(year, qtr)) for (size, year, qtr) in to_run]
+            for future in futures:
+                year, qtr = future.result()
+                self.logger.info("%i QTR %i: Formatting Succesful" % (year, qtr))
+                done.append((year, qtr))
+        return done
+
+    def merge(self, quarters):
+        """
+        Move the partitions of every completed staged quarter into the processed filing store, replacing the partitions the quarter had
+        before, and mark the moved ciks dirty in the aggregate manifest.  A quarter only ever writes its own partitions, so the move is
+        a rename per partition and can be rerun after an interruption
+        ...
+        Returns
+        ----------
+         > The ciks that were merged
+        """
+        codes = CodeDictionary(self.sec_data.joinpath(CODES_DB))
+        store, ciks = ProcessedStore(self.proc_data, codes), set()
+        for (year, qtr) in sorted(quarters):
+            if self.isComplete(year, qtr):
+                ciks.update(store.replaceQuarters(ProcessedStore(self._stageDir(year, qtr), codes)))
+        AggregateManifest(self.sec_data.joinpath(MANIFEST_DB)).markDirty(sorted(ciks))
+        self.logger.info("Merged %i quarters, %i companies" % (len(quarters), len(ciks)))
+        return sorted(ciks)
+
+    def isComplete(self, year, qtr):
+        """
+        Whether the quarter has a completion marker in its staging directory
+        """
+        return self._stageDir(year, qtr).joinpath(COMPLETE).exists()
+
+    def _stageDir(self, year, qtr):
+        return self.stage_data.joinpath("%sQTR%s" % (year, qtr))
@@ -0,0 +1,152 @@
+##!/usr/bin/env python
+"""
+Quarterly Aggregator: Turns the processed filing values of many companies into quarterly values with their quarter and year percent
+change in one pass.  The values of every company are held in one frame sorted by cik, acct_typ, attr and date and the year to date
+values are de-cumulated with shifted arrays.  A shifted value is only used when the rows between it and the current row have the same
+cik and attribute (their date difference is only set inside a group), so no company or attribute reads the values of its neighbour.
+The result is the same as SECFilingFormatter computed one company at a time.
+
+object QuarterlyAggregator:
+    def aggregate() -> DataFrame: Returns the quarterly values and percent changes of every listed company in a frame of filing values
+"""
+
+#Imports
+import numpy as np
+import pandas as pd
+import logging
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+IN_COLS = ['cik', 'acct_typ', 'attr', 'date', 'pds', 'value']
+OUT_COLS = ['cik', 'ticker', 'date', 'acct_typ', 'attr', 'value', 'qtr_diff_pct', 'yr_diff_pct']
+
+class QuarterlyAggregator(object):
+
+    def __init__(self, tickers):
+        """
+        Aggregator of the processed filing values
+        ...
+        Parameters
+        ----------
+        tickers: A dictionary of cik: ticker for the listed companies, the other companies are skipped
+        """
+        self.logger = logging.getLogger('sec.QuarterlyAggregator')
+        self.tickers = tickers
+
+    def aggregate(self, df):
+        """
+        Calculate the quarterly value of every attribute and its quarter over quarter and year over year percent change
+        ...
+        Parameters
+        ----------
+        df: The processed filing values of any number of companies (cik, acct_typ, attr, date, pds, value), the names as strings or as
+            categoricals with sorted categories
+        ...
+        Returns
+        ----------
+         > A dataframe of cik, ticker, date, acct_typ, attr, value, qtr_diff_pct and yr_diff_pct sorted by cik, acct_typ, attr and date
+        """
+        df = self._prepare(df)
+        n = len(df)
+        cik = df['cik'].to_numpy()
+        attr = pd.factorize(df['attr'])[0]
+        value = df['value'].to_numpy(dtype = float).copy()
+        pds = df['pds'].to_numpy(dtype = float).copy()
+
+        # the row follows a row of the same company and attribute
+        match = np.zeros(n, dtype = bool)
+        match[1:] = (cik[1:] == cik[:-1]) & (attr[1:] == attr[:-1])
+        # attributes that are only reported yearly are compared year over year without being divided
+        yearly = (df.groupby(['cik', 'attr'], sort = False, observed = True)['pds'].transform('min') == 4).to_numpy()
+
+        days = df['days'].to_numpy()
+        dt = np.full(n, np.nan)
+        dt[1:] = np.abs(np.round((days[:-1] - days[1:]) * 4 / 365.25))
+        dt[~match] = np.nan
+        dt_1, dt_2, dt_3 = self._shift(dt, 1), self._shift(dt, 2), self._shift(dt, 3)
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            #divide values where there is no way to subtract previous periods
+            cond = (pds > 1) & (~match | (dt >= pds)) & ~yearly
+            value[cond], pds[cond] = value[cond] / pds[cond], 1
+
+            #For all values that have one quarter difference, subtract previous values
+            prev, pds_1 = self._shift(value, 1), np.where(match, self._shift(pds, 1), np.nan)
+            cond = (pds - pds_1 == 1) & (dt == 1) & match
+            value[cond], pds[cond] = value[cond] - prev[cond], pds[cond] - pds_1[cond]
+
+            #set 3 qtr values to their closest average
+            prev, prev_1, prev_2 = self._shift(value, 1), self._shift(value, 2), self._shift(value, 3)
+            cond = (pds == 3) & (dt == 1) & (dt_1 == 1) & match
+            value[cond], pds[cond] = value[cond] - prev[cond] - prev_1[cond], 1
+            cond = (((pds == 4) & (dt == 3)) | ((pds == 3) & ((dt == 1) | (dt == 2)))) & match
+            value[cond], pds[cond] = (value[cond] - prev[cond]) / (pds[cond] - 1), 1
+
+            #Pds == 4 value subtraction
+            cond = (pds == 4) & (dt == 1) & (dt_1 == 1) & (dt_2 == 1) & match
+            value[cond], pds[cond] = value[cond] - prev[cond] - prev_1[cond] - prev_2[cond], 1
+            cond = (pds == 4) & (dt + dt_1 <= 3) & match
+            value[cond], pds[cond] = (value[cond] - prev[cond] - prev_1[cond]) / 2, 1
+
+            #qtd compare
+            qtr_pct = np.full(n, np.nan)
+            cond = (pds == 1) & (dt == 1) & match
+            qtr_pct[cond] = ((value[cond] - prev[cond]) / np.abs(prev[cond])) * 100
+
+            #ytd compare, a later condition overwrites an earlier one
+            yr_pct = np.full(n, np.nan)
+            prevs = [self._shift(value, k) for k in range(1, 5)]
+            for cond, prev in [((dt == 4) & match, prevs[0]),
+                               ((dt + dt_1 == 4) & match, prevs[1]),
+                               ((dt + dt_1 + dt_2 == 4) & match, prevs[2]),
+                               ((dt + dt_1 + dt_2 + dt_3 == 4) & match, prevs[3]),
+                               (yearly & (dt == 4) & match, prevs[0])]:
+                yr_pct[cond] = ((value[cond] - prev[cond]) / np.abs(prev[cond])) * 100
+
+        df['value'], df['qtr_diff_pct'], df['yr_diff_pct'] = value, qtr_pct, yr_pct
+        df['ticker'] = df['cik'].map(self.tickers)
+        return df[OUT_COLS]
+
+    def _prepare(self, df):
+        """
+        Keep the value with the fewest periods for each company, attribute and date, drop the companies that are not listed or have a
+        date that cannot be read and sort the rows by cik, acct_typ, attr and date
+        """
+        df = df[IN_COLS].copy()
+        df['pds'] = df['pds'].fillna(0)
+        df = df.sort_values(['cik', 'acct_typ', 'attr', 'date', 'pds'], kind = 'mergesort')
+        df = df.drop_duplicates(['cik', 'acct_typ', 'attr', 'date'], keep = 'first')
+
+        #if the company doesn't have a associated stock, skip (in order to reduce values)
+        listed = df['cik'].isin(list(self.tickers))
+        for cik in sorted(df.loc[~listed, 'cik'].unique()):
+            self.logger.info('Skipping cik %i due to no listed stock price' % cik)
+        df = df[listed & (((df['acct_typ'] == 'dei') & (df['attr'] == 'entitycommonstocksharesoutstanding')) | (df['acct_typ'] != 'dei'))]
+
+        # each distinct date is parsed once
+        codes, uniques = pd.factorize(df['date'].astype(str))
+        parsed = pd.to_datetime(pd.Series(uniques, dtype = object), errors = 'coerce')
+        days = (parsed.to_numpy(dtype = 'datetime64[D]').astype('int64'))[codes]
+        bad = np.isnat(parsed.to_numpy())[codes]
+        for cik in sorted(df.loc[bad, 'cik'].unique()):
+            self.logger.info('Skipping agg for cik %i' % cik)
+        df['days'] = days
+        df = df[~df['cik'].isin(df.loc[bad, 'cik'].unique())]
+        return df.reset_index(drop = True)
+
+    def _shift(self, arr, k):
+        """
+        The array shifted down k rows, the first k rows are nan
+        """
+        out = np.full(len(arr), np.nan)
+        out[k:] = arr[:len(arr) - k]
+        return out
@@ -0,0 +1,53 @@
+##!/usr/bin/env python
+"""
+Rate limiter shared by the downloaders so that concurrent workers stay under a website's request budget (SEC allows 10 requests per second).
+
+object RateLimiter:
+    def acquire() -> None: Blocks until a request token is available
+"""
+
+#Imports
+import threading
+import time
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+class RateLimiter(object):
+
+    def __init__(self, rate, burst = None):
+        """
+        Thread safe token bucket.  Tokens refill at a constant rate and every request takes one token
+        ...
+        Parameters
+        ----------
+        rate: The number of requests allowed per second
+        burst: The maximum number of tokens that can be saved up (defaults to 1 so requests are evenly spaced)
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token from the bucket, sleeping until one is available
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
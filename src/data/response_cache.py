@@ -0,0 +1,226 @@
+##!/usr/bin/env python
+"""
+On disk cache for http responses.  Bodies are stored once per content hash and an sqlite index maps each (url, request headers) key to
+its body, validators (ETag / Last-Modified) and access times.  Stale entries are revalidated with a conditional request and the cache
+is trimmed back to its size limit by evicting the least recently used entries.  In replay mode the network is never called, so jobs
+can be re-run against the traffic that was captured by a previous run.
+
+object ResponseCache:
+    def get() -> Response: Returns the cached response for a url or calls the website and caches the result
+    def lookup() -> Response: Returns the cached response for a url and headers (None if it is not cached)
+    def store() -> None: Stores a response in the cache and evicts old entries if the cache is over its size limit
+"""
+
+#Imports
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.exceptions import ConnectionError
+from pathlib import Path
+import threading
+import hashlib
+import sqlite3
+import logging
+import json
+import time
+import os
+import re
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+KEEP_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+MAX_BYTES = 20 * 1024 ** 3
+
+class CacheMiss(ConnectionError):
+    """
+    Raised in replay mode when a url was never captured.  Subclasses ConnectionError so callers handle it like a failed download
+    """
+    pass
+
+class ResponseCache(object):
+
+    def __init__(self, cache_dir, ttl = 86400, rules = None, max_bytes = MAX_BYTES, replay = False):
+        """
+        A cache of http responses kept in a directory
+        ...
+        Parameters
+        ----------
+        cache_dir: The directory the bodies and the index are saved to
+        ttl: The number of seconds a response is used before being revalidated (None never expires, 0 always revalidates)
+        rules: A list of (regex, ttl) tuples that override the ttl for matching urls, the first match is used
+        max_bytes: The size of the bodies that are kept before the least recently used entries are evicted
+        replay: If true, only cached responses are returned and a missing url raises CacheMiss
+        """
+        self.logger = logging.getLogger('http.ResponseCache')
+        self.cache_dir = Path(cache_dir)
+        self.obj_dir = self.cache_dir.joinpath('objects')
+        self.obj_dir.mkdir(parents = True, exist_ok = True)
+        self.ttl = ttl
+        self.rules = [(re.compile(pattern), rule_ttl) for pattern, rule_ttl in (rules or [])]
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.cache_dir.joinpath('index.db')), check_same_thread = False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, body TEXT, size INTEGER, encoding TEXT,
+                                headers TEXT, stored_at REAL, accessed_at REAL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url, headers, send):
+        """
+        Return the response for a url, from the cache if it is fresh and from the website if not.  Stale entries are revalidated
+        with If-None-Match / If-Modified-Since, and a 304 reuses the cached body
+        ...
+        Parameters
+        ----------
+        url: The url being requested
+        headers: The request headers (part of the cache key)
+        send: A function that takes the request headers and calls the website
+        ...
+        Returns
+        ----------
+         > The response
+        """
+        key = self._key(url, headers)
+        cached = self.lookup(url, headers)
+        if cached is not None and (self.replay or self._isFresh(url, cached.stored_at)):
+            return cached
+        if self.replay:
+            raise CacheMiss("%s was not captured in the cache" % url)
+
+        req_headers = dict(headers or {})
+        if cached is not None:
+            if cached.headers.get('ETag'):
+                req_headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                req_headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        response = send(req_headers)
+        if response.status_code == 304 and cached is not None:
+            with self.lock:
+                self.conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+            return cached
+        if response.status_code == 200:
+            self.store(url, headers, response)
+        return response
+
+    def lookup(self, url, headers):
+        """
+        Returns the cached response for a url and headers, None if it is not in the cache
+        """
+        key = self._key(url, headers)
+        with self.lock:
+            row = self.conn.execute("SELECT body, encoding, headers, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, encoding, resp_headers, stored_at = row
+            try:
+                with open(self._path(body), 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        response._content = content
+        response.encoding = encoding
+        response.headers = CaseInsensitiveDict(json.loads(resp_headers))
+        response.stored_at = stored_at
+        return response
+
+    def store(self, url, headers, response):
+        """
+        Store a response body under its content hash and point the url's key at it
+        ...
+        Parameters
+        ----------
+        url: The url that was requested
+        headers: The request headers
+        response: The response from the website
+        """
+        content = response.content
+        body = hashlib.sha256(content).hexdigest()
+        path = self._path(body)
+        if not path.exists():
+            path.parent.mkdir(exist_ok = True)
+            tmp = path.with_suffix('.tmp%i' % threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+        resp_headers = json.dumps({h: response.headers[h] for h in KEEP_HEADERS if h in response.headers})
+        key, now = self._key(url, headers), time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT body, size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, url, body, len(content), response.encoding, resp_headers, now, now))
+            self.conn.commit()
+            self.size += len(content) - (old[1] if old else 0)
+            if old and old[0] != body:
+                self._removeBody(old[0])
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache is under 90% of its size limit (the lock must be held)
+        """
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, body, size FROM responses ORDER BY accessed_at").fetchall()
+        for key, body, size in rows:
+            if self.size <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.size -= size
+            self._removeBody(body)
+        self.conn.commit()
+        self.logger.info("Evicted cache entries, %i bytes cached" % self.size)
+
+    def _removeBody(self, body):
+        """
+        Delete a body file once no key points to it anymore (the lock must be held)
+        """
+        if self.conn.execute("SELECT 1 FROM responses WHERE body = ? LIMIT 1", (body,)).fetchone() is None:
+            try:
+                os.remove(self._path(body))
+            except FileNotFoundError:
+                pass
+
+    def _isFresh(self, url, stored_at):
+        """
+        Whether a response stored at a time can be used without revalidating it
+        """
+        ttl = self.ttl
+        for pattern, rule_ttl in self.rules:
+            if pattern.search(url):
+                ttl = rule_ttl
+                break
+        return ttl is None or time.time() - stored_at < ttl
+
+    def _key(self, url, headers):
+        """
+        The cache key for a url and its request headers
+        """
+        return hashlib.sha256(json.dumps([url, sorted((headers or {}).items())]).encode('utf-8')).hexdigest()
+
+    def _path(self, body):
+        """
+        The file that a body hash is stored in
+        """
+        return self.obj_dir.joinpath(body[:2], body)
@@ -0,0 +1,212 @@
+##!/usr/bin/env python
+"""
+Risk Factor Extractor: Finds the Item 1A (Risk Factors) section of a 10-K or 10-Q html document.  The document is broken into text chunks
+and every chunk is normalized once (upper case, no periods or whitespace).  The header flags for each chunk are computed in the same pass,
+so the table of contents scan and the section scan only walk the precomputed arrays.
+
+object RiskFactorExtractor:
+    def extract() -> str: Returns the risk factor text of an html document
+    def getChunks() -> list: Breaks the text of an html document into the chunks that are searched
+    def findSection() -> str: Finds the risk factor section in a list of chunks
+"""
+
+#Imports
+from bs4 import BeautifulSoup
+import re
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+SKIP_CHUNKS = ['INDEX','TABLE OF CONTENTS','X','.']
+PAGE_RE = re.compile('I-[0-9]*')
+START_HEADERS = ['RISKFACTORS', 'ITEM1A', 'ITEM1ARISKFACTORS','RISKFACTOR','ARISKFACTORS']
+
+class RiskFactorExtractor(object):
+
+    def extract(self, html):
+        """
+        Get the risk factor text from an html filing document
+        ...
+        Parameters
+        ----------
+        html: The text of the html document
+        ...
+        Returns
+        ----------
+         > The risk factor text, None if it could not be found
+        """
+        return self.findSection(self.getChunks(html))
+
+    def getChunks(self, html):
+        """
+        Break the visible text of a document into stripped chunks, dropping page numbers and table of contents links
+        """
+        soup = BeautifulSoup(html, "lxml")
+        for script in soup(["script", "style"]):
+            script.extract()
+
+        #break into lines and remove leading and trailing space on each
+        text = soup.get_text('\n', strip = True)
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip().encode('ascii','ignore').decode('utf-8') for line in lines for phrase in line.split("  "))
+        return [chunk for chunk in chunks if (chunk and chunk.upper() not in SKIP_CHUNKS and not chunk.isdigit() and not PAGE_RE.match(chunk))]
+
+    def findSection(self, chunks):
+        """
+        Find the risk factor section.  The first scan reads the table of contents to find the headers that follow Item 1A and how many
+        times the Item 1A header is repeated before the section starts, the second scan collects the text between the headers
+        ...
+        Parameters
+        ----------
+        chunks: The list of text chunks from getChunks()
+        ...
+        Returns
+        ----------
+         > The risk factor text, None if it could not be found
+        """
+        norm, toc_hdr, sec_hdr = self._normalize(chunks)
+
+        #setup constants to be used in the table of contents scan
+        search_a, search_b, search_c, search_d, splt_txt_spec = '', '', '', '', ''
+        ix_a, ix_b, ix_prev, countA = 0, 0, 0, 0
+        idx_found = -1
+        brk_found = False
+
+        for idx in range(len(toc_hdr)):
+            splt_txt = norm[idx]
+            if (search_a != '' and search_b != '') and idx not in [ix_a, ix_b] and countA > 1 and ((search_a in splt_txt and len(splt_txt) < 25 and 'BUSINESS' not in splt_txt)
+                    or (search_b in splt_txt and len(splt_txt) < 25 and 'BUSINESS' not in splt_txt) or (search_a + search_b == splt_txt
+                    or search_a.strip('ITEM') + search_b == splt_txt or 'ITEM' + search_a + search_b == splt_txt)):
+                break
+
+            if search_a == '' and splt_txt in START_HEADERS:
+                if 'RISKFACTOR' in norm[idx + 1]:
+                    search_a, ix_a = norm[idx + 2], idx + 2
+                    search_b, ix_b = norm[idx + 3], idx + 3
+                    search_c, search_d = norm[idx + 4], norm[idx + 5]
+                    idx_found = idx + 1
+                else:
+                    search_a, ix_a = norm[idx + 1], idx + 1
+                    search_b, ix_b = norm[idx + 2], idx + 2
+                    search_c, search_d = norm[idx + 3], norm[idx + 4]
+                    idx_found = idx
+
+                #for weird formatting with the break statement
+                if search_a == 'ITEM' and search_b in ['1B', '2','3','4','6']:
+                    search_a = search_a + search_b
+                    search_b = search_c
+
+            if toc_hdr[idx]:
+                if idx != ix_prev + 1:
+                    countA +=1
+                ix_prev = idx
+
+            if idx == idx_found and countA == 0:
+                splt_txt_spec = splt_txt
+                countA = 2
+        ######################################################################################
+        #Reformat for files that have weird formatting for values that have a header
+        if countA > 5:
+            countA = 2
+        #if the items are on the same line, break apart
+        if 'ITEM' in search_a and 'ITEM' in search_b and search_a != 'ITEM' and search_b != 'ITEM':
+            if 'ITEM1B' in search_a and search_a != 'ITEM1B' :
+                search_b = search_a[6:]
+                search_a = search_a[:6]
+            else:
+                search_b = search_a[5:]
+                search_a = search_a[:5]
+
+        #if the break is not found, bad txt
+        if not brk_found:
+            search_b = search_b[:20]
+
+        #if the table of contents has weird formatting, ensure break points are set
+        if countA == 1:
+            brk_found = False
+            search_a = 'ITEM2'
+            search_b = 'UNREGISTEREDSALESOF'
+            search_c = 'ITEM1B'
+            search_d = 'UNRESOLVEDSTAFF'
+        elif countA == 0:
+            return None
+        ######################################################################################
+        # Nothing is kept until the Item 1A header has been seen countA times, so skip straight to the chunk after that header
+        t1, ix_prev, start = 0, 0, None
+        for idx in range(len(sec_hdr)):
+            if sec_hdr[idx] or (splt_txt_spec != '' and splt_txt_spec == norm[idx]):
+                if idx != ix_prev + 1:
+                    t1 +=1
+                    ix_prev = idx
+                if t1 >= countA:
+                    start = idx + 1
+                    break
+        if start is None:
+            return None
+
+        search_ab, search_cd = search_a + search_b, search_c + search_d
+        alt_ab, item_ab = search_a.strip('ITEM') + search_b, 'ITEM' + search_a + search_b
+        out_txt = []
+        for idx in range(start, len(sec_hdr)):
+            splt_txt = norm[idx]
+            short = len(splt_txt) < 30 and 'BUSINESS' not in splt_txt
+            if ((search_a in splt_txt and short) or (search_b in splt_txt and short) or search_ab == splt_txt or alt_ab == splt_txt
+                    or item_ab == splt_txt or search_a == splt_txt or search_b == splt_txt or search_ab in splt_txt):
+                break
+
+            if not brk_found and ((search_c in splt_txt and short) or (search_d in splt_txt and short) or search_cd == splt_txt
+                    or search_c == splt_txt or search_d == splt_txt or search_cd in splt_txt):
+                break
+
+            if sec_hdr[idx] or (splt_txt_spec == splt_txt and splt_txt_spec != ''):
+                if idx != ix_prev + 1:
+                    t1 +=1
+                    ix_prev = idx
+                continue
+
+            out_txt.append(chunks[idx])
+
+        if len(out_txt) == 0:
+            return None
+        return ' ' + ' '.join(out_txt)
+
+    def _normalize(self, chunks):
+        """
+        Normalize every chunk once and flag the chunks that look like an Item 1A header (on their own or joined with the next one or two
+        chunks).  The scans stop two chunks before the end of the file, so the flags do as well
+        ...
+        Returns
+        ----------
+         > A tuple of (normalized chunks, table of contents header flags, section header flags)
+        """
+        norm = ["".join(txt.upper().replace('.','').split()) for txt in chunks]
+        lens = [len(txt) for txt in norm]
+        len_file = len(norm)
+        toc_hdr, sec_hdr = [], []
+        for idx in range(len_file):
+            if idx == len_file - 2:
+                break
+            splt_txt, len_txt = norm[idx], lens[idx]
+            len_combo = len_txt + lens[idx + 1]
+            toc, sec = False, False
+            if len_txt < 19 and '1A' in splt_txt and 'RISKFACTOR' in splt_txt:
+                toc, sec = True, 'RISKFACTORS' in splt_txt
+            if not sec and len_combo < 19:
+                combo_txt = splt_txt + norm[idx + 1]
+                if 'RISKFACTOR' in combo_txt and '1A' in combo_txt:
+                    toc, sec = True, sec or 'RISKFACTORS' in combo_txt
+            if not sec and len_combo + lens[idx + 2] < 19:
+                combo_txt_2 = splt_txt + norm[idx + 1] + norm[idx + 2]
+                if 'RISKFACTOR' in combo_txt_2 and '1A' in combo_txt_2:
+                    toc, sec = True, True
+            toc_hdr.append(toc)
+            sec_hdr.append(sec)
+        return norm, toc_hdr, sec_hdr
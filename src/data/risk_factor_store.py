@@ -0,0 +1,121 @@
+##!/usr/bin/env python
+"""
+Risk Factor Store: Keeps the risk factor text of every filing in an sqlite table (write ahead log mode) keyed by cik and filing date.
+Storing a filing is a single row insert instead of rewriting the company's whole compressed csv.
+
+object RiskFactorStore:
+    def append() -> None: Insert (or replace) the risk factor text of one filing
+    def get() -> str: Returns the risk factor text of one filing
+    def read() -> DataFrame: Returns the risk factors of a company (or all companies) as a dataframe (cik, date, risktext)
+    def ciks() -> list: Returns the ciks that have risk factors stored
+    def migrateFromGzip() -> int: Loads the old risk-factors/<cik>.csv.gz files into the store
+"""
+
+#Imports
+import pandas as pd
+import threading
+import sqlite3
+import logging
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+class RiskFactorStore(object):
+
+    def __init__(self, db_path):
+        """
+        Opens (and creates if needed) the risk factor database
+        ...
+        Parameters
+        ----------
+        db_path: The path of the sqlite database file
+        """
+        self.logger = logging.getLogger('sec.RiskFactorStore')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread = False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS risk_factors (cik INTEGER NOT NULL, date TEXT NOT NULL, risktext TEXT,
+                                PRIMARY KEY (cik, date))""")
+        self.conn.commit()
+
+    def append(self, cik, date, risktext):
+        """
+        Store the risk factor text of a filing, replacing the text if the filing was already stored
+        ...
+        Parameters
+        ----------
+        cik: The company's cik
+        date: The date the filing was submitted (YYYY-MM-DD)
+        risktext: The risk factor text
+        """
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO risk_factors VALUES (?, ?, ?)", (int(cik), str(date), risktext))
+            self.conn.commit()
+
+    def get(self, cik, date):
+        """
+        Returns the risk factor text of a filing, None if it is not stored
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT risktext FROM risk_factors WHERE cik = ? AND date = ?", (int(cik), str(date))).fetchone()
+        return None if row is None else row[0]
+
+    def read(self, cik = None):
+        """
+        Returns the stored risk factors as a dataframe
+        ...
+        Parameters
+        ----------
+        cik: The cik of the company to read, None reads every company
+        """
+        with self.lock:
+            if cik is None:
+                return pd.read_sql("SELECT cik, date, risktext FROM risk_factors ORDER BY cik, date", self.conn)
+            return pd.read_sql("SELECT cik, date, risktext FROM risk_factors WHERE cik = ? ORDER BY date", self.conn, params = (int(cik),))
+
+    def ciks(self):
+        """
+        Returns the ciks that have stored risk factors
+        """
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT cik FROM risk_factors ORDER BY cik")]
+
+    def migrateFromGzip(self, risk_dir):
+        """
+        Load the risk factor files that were written by the old downloader (risk-factors/<cik>.csv.gz, indexed by the filing date)
+        ...
+        Parameters
+        ----------
+        risk_dir: The directory of the old risk factor files
+        ...
+        Returns
+        ----------
+         > The number of filings loaded
+        """
+        count = 0
+        for file in sorted(risk_dir.glob('*.csv.gz')):
+            cik = file.name.split('.')[0]
+            try:
+                df = pd.read_csv(file,
+                                compression = 'gzip',
+                                index_col = 0,
+                                sep = '\t',
+                                encoding = 'utf-8')
+            except Exception:
+                self.logger.info("%s: Could not be read, skipping" % file.name)
+                continue
+            rows = [(int(cik), str(dt), txt) for dt, txt in zip(df.index, df['risktext']) if isinstance(txt, str)]
+            with self.lock:
+                self.conn.executemany("INSERT OR REPLACE INTO risk_factors VALUES (?, ?, ?)", rows)
+                self.conn.commit()
+            count += len(rows)
+        self.logger.info("Migrated %i risk factors from %s" % (count, risk_dir))
+        return count
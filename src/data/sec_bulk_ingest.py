@@ -0,0 +1,230 @@
+##!/usr/bin/env python
+"""
+SEC Bulk Ingest: Loads a quarter of filing values from the EDGAR Financial Statement Data Sets (one zip per quarter with sub.txt, the
+submissions, and num.txt, every value of every submission).  num.txt is read in chunks and mapped straight into the processed filing
+schema (cik, ticker, year_sub, qtr_sub, acct_typ, attr, date, pds, value) that SECFilingFormatter.formatFilings writes, so a historical
+backfill does not have to download and parse every xbrl instance.  num.txt is grouped by submission, and each submission is handed to the
+formatter as soon as its last row is read, so a quarter is never held in memory.
+
+The data sets round every date to the nearest month end, while a parsed instance keeps the exact end of its contexts (2020-09-26, not
+2020-09-30).  Only the values of a submission's own period are loaded and they are dated with the exact period end in the instance name
+(aapl-20200926.xml), so the bulk rows have the same store key (cik, concept, date, pds) as the rows parsed from the same filing.  The
+values of earlier periods are loaded from the filings that reported them, as the exact end of an earlier period is not in the data set.
+
+object SECBulkIngest:
+    def ingestQuarter() -> int: Downloads (if needed) a quarter's data set and writes it to the processed filings
+    def downloadQuarter() -> Path: Downloads the quarter's data set zip
+    def readQuarter() -> generator: Yields the processed filing rows of each submission in a data set zip
+    def readSubmissions() -> DataFrame: The 10-Q and 10-K submissions in sub.txt with their cik and ticker
+"""
+
+#Imports
+import pandas as pd
+import zipfile
+import logging
+import csv
+from .api_call import api_call
+from .sec_formatter import WRITE_ROWS
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+HEADERS = {
+    'User-Agent': 'dylans-app/0.0.1'
+}
+FSDS_URL = "https://www.sec.gov/files/dera/data/financial-statement-data-sets/%sq%s.zip"
+FORMS = ['10-Q', '10-K']
+NUM_COLS = ['adsh', 'tag', 'version', 'coreg', 'ddate', 'qtrs', 'value']
+CHUNK_SIZE = 500000
+OUT_COLS = ['cik', 'ticker', 'year_sub', 'qtr_sub', 'acct_typ', 'attr', 'date', 'pds', 'value']
+# an instance date further than this from the rounded period is not the period end
+MAX_ROUNDING = pd.Timedelta(days = 16)
+
+class SECBulkIngest(object):
+
+    def __init__(self, sec_data, formatter):
+        """
+        Bulk loader for the financial statement data sets
+        ...
+        Parameters
+        ----------
+        sec_data: The directory that holds the sec data, the zips are saved in sec_data/financial-statements
+        formatter: The SECFilingFormatter that writes the processed filings and knows the ticker of each cik
+        """
+        self.logger = logging.getLogger('sec.SECBulkIngest')
+        self.fsds_dir = sec_data.joinpath('financial-statements')
+        self.fsds_dir.mkdir(parents = True, exist_ok = True)
+        self.formatter = formatter
+        self.tickers = formatter.index.tickers()
+
+    def ingestQuarter(self, year, qtr):
+        """
+        Load a quarter's data set into the processed filings
+        ...
+        Parameters
+        ----------
+        year: The year the filings were submitted
+        qtr: The quarter the filings were submitted (1-4)
+        ...
+        Returns
+        ----------
+         > The number of companies written
+        """
+        zip_path = self.downloadQuarter(year, qtr)
+        if zip_path is None:
+            return 0
+        # submissions are upserted in batches, each batch rewrites the store partitions it touches once
+        frames, rows, written = [], 0, set()
+        for cik, df_qtr in self.readQuarter(zip_path, year, qtr):
+            frames.append(df_qtr)
+            rows += len(df_qtr)
+            if rows >= WRITE_ROWS:
+                written.update(self.formatter.writeFilings(frames))
+                frames, rows = [], 0
+        written.update(self.formatter.writeFilings(frames))
+        count = len(written)
+        self.logger.info("%i QTR %i: %i companies loaded from the financial statement data set" % (year, qtr, count))
+        return count
+
+    def downloadQuarter(self, year, qtr):
+        """
+        Download the quarter's data set zip unless it was already downloaded
+        ...
+        Returns
+        ----------
+         > The path of the zip, None if the data set is not published
+        """
+        zip_path = self.fsds_dir.joinpath('%sq%s.zip' % (year, qtr))
+        if zip_path.exists():
+            return zip_path
+        content = api_call(FSDS_URL % (year, qtr), HEADERS, 'content')
+        if not isinstance(content, bytes):
+            self.logger.info("%i QTR %i: No financial statement data set" % (year, qtr))
+            return None
+        tmp = zip_path.with_name(zip_path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        tmp.replace(zip_path)
+        return zip_path
+
+    def readQuarter(self, zip_path, year, qtr):
+        """
+        Read the values of every 10-Q and 10-K in a data set zip, one submission at a time.  Like getValuesFromFile, only the values
+        without dimensions (and in the formatter's concept allow-list) are kept and each attribute and date keeps the value with the
+        fewest quarters (quarter to date over year to date).  Only the values at the end of the submission's period are kept
+        ...
+        Parameters
+        ----------
+        zip_path: The path of the quarter's data set zip
+        year: The year the filings were submitted
+        qtr: The quarter the filings were submitted (1-4)
+        ...
+        Returns
+        ----------
+         > A generator of (cik, dataframe in the processed filing schema), one per submission
+        """
+        with zipfile.ZipFile(zip_path, 'r') as z:
+            with z.open('sub.txt') as f:
+                df_sub = self.readSubmissions(f)
+            held, done = None, set()
+            with z.open('num.txt') as f:
+                for chunk in pd.read_csv(f,
+                                         sep = '\t',
+                                         usecols = NUM_COLS,
+                                         dtype = {'adsh': str, 'tag': str, 'version': str, 'coreg': str, 'ddate': str, 'qtrs': int, 'value': float},
+                                         quoting = csv.QUOTE_NONE,
+                                         encoding = 'utf-8',
+                                         encoding_errors = 'ignore',
+                                         chunksize = CHUNK_SIZE):
+                    # the last submission of the chunk may continue in the next chunk, it is held back until it ends
+                    last = chunk['adsh'].iat[-1]
+                    chunk = self._filter(chunk, df_sub)
+                    if held is not None:
+                        chunk = pd.concat([held, chunk], ignore_index = True)
+                    is_last = chunk['adsh'] == last
+                    held = chunk[is_last]
+                    yield from self._submissions(chunk[~is_last], df_sub, year, qtr, done)
+            if held is not None:
+                yield from self._submissions(held, df_sub, year, qtr, done)
+
+    def readSubmissions(self, f):
+        """
+        Read the 10-Q and 10-K submissions from sub.txt.  The ticker is the prefix of the instance name (as in the downloaded file
+        names), and the master ticker list is used when the prefix does not look like a ticker.  The exact period end is the date in the
+        instance name when it rounds to the period, the rounded period otherwise
+        ...
+        Returns
+        ----------
+         > A dataframe of cik, ticker, prefix, period (YYYYMMDD as in num.txt) and date (the exact period end) indexed by the accession
+           number
+        """
+        df_sub = pd.read_csv(f,
+                             sep = '\t',
+                             usecols = ['adsh', 'cik', 'form', 'period', 'instance'],
+                             dtype = {'adsh': str, 'cik': int, 'form': str, 'period': str, 'instance': str},
+                             quoting = csv.QUOTE_NONE,
+                             encoding = 'utf-8',
+                             encoding_errors = 'ignore')
+        df_sub = df_sub[df_sub['form'].isin(FORMS)]
+        df_sub['prefix'] = df_sub['instance'].fillna('').str.split('-').str[0].str.lower()
+        df_sub['ticker'] = df_sub['prefix'].str.upper()
+        master = df_sub['cik'].map(self.tickers)
+        lookup = (df_sub['ticker'].str.len() > 5) | (df_sub['ticker'] == '')
+        df_sub.loc[lookup, 'ticker'] = master[lookup].str.upper()
+        # the formatter skips filings that have no ticker
+        df_sub = df_sub[df_sub['ticker'].notna()]
+
+        period = pd.to_datetime(df_sub['period'], format = '%Y%m%d', errors = 'coerce')
+        end = pd.to_datetime(df_sub['instance'].fillna('').str.extract(r'(?<!\d)(\d{8})(?!\d)', expand = False), format = '%Y%m%d', errors = 'coerce')
+        exact = (end - period).abs() <= MAX_ROUNDING
+        for adsh in df_sub.loc[~exact, 'adsh']:
+            self.logger.info("%s: No exact period end in the instance name, using the rounded period" % adsh)
+        df_sub['date'] = end.where(exact, period).dt.strftime('%Y-%m-%d')
+        df_sub = df_sub[df_sub['date'].notna()]
+        return df_sub.set_index('adsh')[['cik', 'ticker', 'prefix', 'period', 'date']]
+
+    def _filter(self, chunk, df_sub):
+        """
+        Keep the values of the submissions' own period that have no co-registrant (dimension), a value and an allowed concept
+        """
+        chunk = chunk[chunk['coreg'].isna() & chunk['value'].notna() & (chunk['ddate'] == chunk['adsh'].map(df_sub['period']))]
+        if self.formatter.concepts is not None:
+            chunk = chunk[chunk['tag'].str.lower().isin(self.formatter.concepts.attrs)]
+        return chunk.drop(columns = ['coreg'])
+
+    def _submissions(self, chunk, df_sub, year, qtr, done):
+        """
+        Map the complete submissions of a chunk into the processed filing schema, one dataframe per submission
+        """
+        if len(chunk) == 0:
+            return
+        df = self._reduce(chunk).join(df_sub, on = 'adsh')
+
+        # custom tags are versioned by the accession number, their prefix is the company's prefix in the instance name
+        custom = df['version'] == df['adsh']
+        df['acct_typ'] = df['version'].str.split('/').str[0].str.lower()
+        df.loc[custom, 'acct_typ'] = df.loc[custom, 'prefix']
+        df['attr'] = df['tag'].str.lower()
+        df['pds'] = df['qtrs'].clip(lower = 1).astype(int)
+        df['year_sub'], df['qtr_sub'] = year, qtr
+
+        for adsh, df_adsh in df.groupby('adsh', sort = False):
+            if adsh in done:
+                self.logger.info("%s: Submission is not contiguous in num.txt, its values are loaded in parts" % adsh)
+            done.add(adsh)
+            yield int(df_adsh['cik'].iat[0]), df_adsh[OUT_COLS].reset_index(drop = True)
+
+    def _reduce(self, df):
+        """
+        Keep the value with the fewest quarters for each submission, tag and date (the first unit if a value is reported in several)
+        """
+        df = df.sort_values(['adsh', 'tag', 'version', 'ddate', 'qtrs'], kind = 'mergesort')
+        return df.drop_duplicates(['adsh', 'tag', 'version', 'ddate'], keep = 'first')
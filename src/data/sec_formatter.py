@@ -3,9 +3,12 @@
 Financial Analysis Project:  This file downloads the data from SEC 10-Q and 10-K filings and builds a table that allows for the specific attribute to be analyzed in isolation from the other attributes.
 
     def formatFilings() -> None: Driver function that iterates through all the filings and inserts the data into the correct output
+    def readFiling() -> DataFrame: Reads the values of one instance with the streaming engine or BeautifulSoup
+    def writeFilings() -> list: Upserts the values of a batch of filings into the processed filing store
+    def readProcessed() -> generator: Reads the processed filing values one company at a time
     def getDatesAndPeriods() -> Dict: returns a dictionary of date tags as well as the period length and end date
     def getValuesFromFile() -> Dict: A dictionary of all the tags in an sec filing
-    def buildFilingDataset() -> None: Function that outputs a file to a table and calculates qtr and yr pct change
+    def buildAggregatedDataset() -> list: Function that outputs a file to a table and calculates qtr and yr pct change (only the changed ciks)
 
     Version 2 Updates:
         - Final function writes only companies that are listed on the stock market into the table
@@ -17,12 +20,26 @@ Financial Analysis Project:  This file downloads the data from SEC 10-Q and 10-K
 """
 
 from bs4 import BeautifulSoup
-from datetime import datetime
 import pandas as pd
 import zipfile
 import logging
+import os
+from .xbrl_stream import XBRLStream
+from .context_index import ContextIndex
+from .processed_store import ProcessedStore
+from .code_dictionary import CodeDictionary
+from .ticker_index import TickerIndex
+from .quarterly_aggregator import QuarterlyAggregator, IN_COLS
+from .aggregate_manifest import AggregateManifest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 pd.options.mode.chained_assignment = None
 
+# Constants
+WRITE_ROWS = 1000000
+MANIFEST_DB = 'aggregate-manifest.db'
+CODES_DB = 'code-dictionary.db'
+
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
 __credits__ = ["Dylan Smith"]
@@ -33,10 +50,26 @@ __maintainer__ = "Dylan Smith"
 __email__ = "-"
 __status__ = "Development"
 
+# The formatter and open zip of a reader process, set once by _initReader
+_reader, _reader_zip = None, None
+
+def _initReader(formatter, filing_dir):
+    """
+    Keep a copy of the formatter and open the quarter's zip once in a reader process
+    """
+    global _reader, _reader_zip
+    _reader, _reader_zip = formatter, zipfile.ZipFile(filing_dir, 'r')
+
+def _readMember(file):
+    """
+    Read the values of one instance in a reader process
+    """
+    return file, _reader.readFiling(_reader_zip, file)
+
 class SECFilingFormatter(object):
 
 
-    def __init__(self, sec_data, master_data):
+    def __init__(self, sec_data, master_data, engine = 'stream', concepts = None):
         """ 
         Object that downloads SEC Filings and archives them into the correct data directory
         ...
@@ -44,17 +77,24 @@ class SECFilingFormatter(object):
         ----------
         raw_data: directory where the raw data has been saved
         proc_data: directory that the cleansed SEC output is saved
+        engine: How the xbrl instances are read, 'stream' (one lxml iterparse pass) or 'soup' (BeautifulSoup tag lists)
+        concepts: A ConceptFilter of the attributes to keep, None keeps every numeric fact
         """
         self.logger = logging.getLogger('filings.SECFilingFormatter')
         self.raw_data = sec_data.joinpath('raw-filings')
         self.proc_data = sec_data.joinpath('processed-filings')
         self.agg_data = sec_data.joinpath('aggregated-filings')
-        self.cik_df = pd.read_csv(master_data.joinpath('ticker_cik.csv.gz'),
-                                  compression='gzip')
-        self.ciks = self.cik_df['cik'].tolist()
+        self.index = TickerIndex.load(master_data)
+        self.codes = CodeDictionary(sec_data.joinpath(CODES_DB))
+        self.store = ProcessedStore(self.proc_data, self.codes)
+        self.manifest = AggregateManifest(sec_data.joinpath(MANIFEST_DB))
+        self.aggregator = QuarterlyAggregator(self.index.tickers())
+        self.engine = engine
+        self.concepts = concepts
+        self.stream = XBRLStream()
         self.logger.info(" Object Instantiated Succesfully")
 
-    def formatFilings(self, yr_qtr, files_to_format = None):
+    def formatFilings(self, yr_qtr, files_to_format = None, out_dir = None, workers = 1):
         """ 
         Cleanses and formats the filing data in the final reporting table as well as a processed file for each cik
         ...
@@ -62,6 +102,12 @@ class SECFilingFormatter(object):
         ----------
         yr_qtr: A tuple with the year and qtr that the data was submitted (year, quarter)
         files_to_format: a list of files to format for delta loads
+        out_dir: The directory the company files are written to, defaults to the processed filings
+        workers: The number of processes reading the instances (1 reads them here).  Only this process writes to the store
+        ...
+        Returns
+        ----------
+         > The ciks that were written
         """
         # Get the year and qtr values out of the variable name and define the zip name
         year = yr_qtr[0]
@@ -76,249 +122,214 @@ class SECFilingFormatter(object):
         else:
             self.files = files_to_format
 
+        #get the cik and symbol from the file name
+        members = {}
         for file in self.files:
-            #self.logger.info("%s: Formatting and compiling" % file)
-            with zipfile.ZipFile(filing_dir, 'r') as zip:
-                soup = BeautifulSoup(zip.read(file).decode("utf-8", "ignore"), 'lxml')
-
-            #get the taglist from the objects, derive dates
-            tries, self.dates = 0, {}
-            while not bool(self.dates) and tries < 5:
-                tag_list = soup.find_all()
-                self.dates = self.getDatesAndPeriods(tag_list, 'xbrli:')
-                if not bool(self.dates):
-                    self.dates = self.getDatesAndPeriods(tag_list, '')
-                tries +=1
-
-            #if dates are None, move onto next file or get the filings from the documents and format the symbol as well as the file name
-            if not bool(self.dates):
-                continue
-
-            #get the cik and symbol from the file name
             try:
                 cik, symbol = file.split('_')[0].split('-')
             except:
                 cik, symbol = file.split('_')[0], 'MISSING'
 
+            #the ticker the company had when it filed (<cik>-<ticker>_<type>_<date>.xml)
             if len(symbol) > 5:
                 try:
-                    symbol = self.cik_df[self.cik['cik'] == int(cik)]['ticker'][0]
+                    symbol = self.index.ticker(int(cik), on = file.split('_')[2][:10])
                 except:
                     continue
-            
-            #Create the proper dataframe and append the values together (Work through formatting)
-            df_qtr = self.getValuesFromFile(tag_list)
-            df_qtr.insert(0, 'qtr_sub', qtr)
-            df_qtr.insert(0, 'year_sub', year)
-            df_qtr.insert(0, 'ticker', symbol.upper())
-            df_qtr.insert(0, 'cik', cik)
-            df_qtr['pds'] = df_qtr['pds'].astype(int)
-            df_qtr['cik'] = df_qtr['cik'].astype(int)
-
-            # name the file to pull, and if it exists, read the data in from the prior writing
-            comp_file = self.proc_data.joinpath('%s.tsv.gz' % cik)
-            
-            # Write the new data to an output file so that we can use this to calculate values moving forward
-            if comp_file.exists():
-                mode = 'a'
-                header = False 
+                if symbol is None:
+                    continue
+            members[file] = (cik, symbol)
+
+        # the zip is opened once for the quarter (in each reader process when there are several)
+        frames, rows, written = [], 0, set()
+        with zipfile.ZipFile(filing_dir, 'r') as zip:
+            if workers > 1:
+                results = self._readConcurrently(filing_dir, list(members), workers)
             else:
-                mode = 'w'
-                header = True
-            
-            # Write to the file
-            df_qtr.to_csv(comp_file,
-                        compression = 'gzip',
-                        mode = mode,
-                        header= header,
-                        sep='\t',
-                        index = False,
-                        encoding='utf-8',
-                        line_terminator = '\n')
-
-    def buildAggregatedDataset(self, files_to_format = None):
+                results = ((file, self.readFiling(zip, file)) for file in members)
+
+            for file, df_qtr in results:
+                #if dates are None, move onto next file
+                if df_qtr is None:
+                    continue
+
+                #Create the proper dataframe and append the values together (Work through formatting)
+                cik, symbol = members[file]
+                df_qtr.insert(0, 'qtr_sub', qtr)
+                df_qtr.insert(0, 'year_sub', year)
+                df_qtr.insert(0, 'ticker', symbol.upper())
+                df_qtr.insert(0, 'cik', cik)
+                df_qtr['pds'] = df_qtr['pds'].astype(int)
+                df_qtr['cik'] = df_qtr['cik'].astype(int)
+
+                # filings are upserted in batches, each batch rewrites the store partitions it touches once
+                frames.append(df_qtr)
+                rows += len(df_qtr)
+                if rows >= WRITE_ROWS:
+                    written.update(self.writeFilings(frames, out_dir))
+                    frames, rows = [], 0
+
+        written.update(self.writeFilings(frames, out_dir))
+        return sorted(written)
+
+    def _readConcurrently(self, filing_dir, files, workers):
         """ 
-        Output the filing data to a table to be used by the models.  Also, calculate the qtr and yr pct change
+        Read the instances on a pool of processes that each open the zip once, yielding the values in the same order as the files.  Only
+        a bounded window of instances is in flight so finished dataframes do not pile up in memory
         ...
         Parameters
         ----------
-        inpt: input file to analyze (file name)
-        df: The aggregated dataframe to use for the output
+        filing_dir: The path of the quarter's zip
+        files: The zip members to read
+        workers: The number of processes
         """
-        if files_to_format is None:
-            out_files = [x for x in self.proc_data.glob('**/*') if x.is_file()]
-        else:
-            out_files = []
-            for file in out_files:
-                # Get the CIK and ticker from the file 
-                cik, symbol = str(file).split('_')[0].split('-')
-                comp_file = self.proc_data.joinpath('%s.tsv.gz' % cik)
-                out_files.append(comp_file)
-        
-        print(len(out_files))
-        for comp_file in out_files:
-            df = pd.read_csv(comp_file,
-                            compression = 'gzip',
-                            sep = '\t',
-                            index_col = False,
-                            encoding = 'utf-8',
-                            lineterminator = '\n',
-                            dtype = {'pds': 'int'})
-
-            # Drop all duplicates
-            df = df.drop_duplicates(keep = "first").reset_index(drop= True)
-
-            #get the minimum periods per acct_typ, attribute and date
-            df['pds'].fillna(0, inplace = True)
-            df = df.loc[df.groupby(['acct_typ', 'attr', 'date'])['pds'].idxmin(), :]
-
-            cik = int(str(comp_file.name).split('.')[0])
-            #if the company doesn't have a associated stock, skip (in order to reduce values)
-            if cik not in self.ciks:
-                print('Skipping cik %i due to no listed stock price' % cik)
-                continue
+        with ProcessPoolExecutor(max_workers = workers, initializer = _initReader, initargs = (self, filing_dir)) as pool:
+            pending = deque()
+            for file in files:
+                pending.append(pool.submit(_readMember, file))
+                if len(pending) >= workers * 4:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def readFiling(self, zip, file):
+        """ 
+        Read the values of one xbrl instance from the quarter's zip with the formatter's engine
+        ...
+        Parameters
+        ----------
+        zip: The open zip file of the quarter
+        file: The name of the instance in the zip
+        ...
+        Returns
+        ----------
+         > The dataframe from getValuesFromFile (acct_typ, attr, date, pds, value), None if the dates could not be found
+        """
+        if self.engine == 'stream':
+            with zip.open(file) as f:
+                return self.stream.parse(f, self.concepts)
 
-            try:
-                curr_ticker = self.cik_df.loc[self.cik_df['cik'] == cik]['ticker'].values[0]
-            except:
-                curr_ticker = ''
-                pass
+        soup = BeautifulSoup(zip.read(file).decode("utf-8", "ignore"), 'lxml')
 
-            df['ticker'] = curr_ticker
-            df = df[((df['acct_typ'] == 'dei') & (df['attr'] == 'entitycommonstocksharesoutstanding')) | (df['acct_typ'] != 'dei')]
-            df.sort_values(by = ['acct_typ', 'attr', 'date'], inplace = True)
-            df.reset_index(inplace = True, drop = True)
+        #get the taglist from the objects, derive dates
+        tag_list = soup.find_all()
+        self.dates = self.getDatesAndPeriods(tag_list)
 
-            df_unique = df.groupby(['attr'])['pds'].min().reset_index(level=0)
-            attrs = list(df_unique[df_unique['pds'] == 4]['attr'])
+        if not bool(self.dates):
+            return None
+        return self.getValuesFromFile(tag_list)
 
-            df.loc[:,'nxt_attr'] = df['attr'].shift(1)
-            cond_match = (df['attr'] == df['nxt_attr'])
-            try:
-                df.loc[cond_match,'dt_diff'] = abs(round((((df['date'].apply(pd.to_datetime)).shift(1)) - df['date'].apply(pd.to_datetime)).dt.days * 4 / 365.25 )).fillna(0).astype(int)
-            except:
-                print('Skipping agg for cik %i' % cik)
-                continue
-
-            #divide values where there is no way to subtract previous periods
-            df.loc[:,'prev_val'] = df['value'].shift(1)
-            cond_init = (df['pds'] > 1) & ((df['attr'] != df['nxt_attr']) | (df['dt_diff'] >= df['pds'])) & (~df['attr'].isin(attrs))
-            df.loc[cond_init, ['value', 'pds']] = df.loc[cond_init,'value'] / df.loc[cond_init,'pds'], 1
-
-            #For all values that have one quarter difference, subtract previous values
-            df.loc[cond_match,'prev_val'] = df['value'].shift(1)
-            df.loc[cond_match,'pd_diff_1'] = df['pds'].shift(1)
-            cond_sub = (df['pds'] - df['pd_diff_1'] == 1) & (df['dt_diff'] == 1) & cond_match
-            df.loc[cond_sub, ['value', 'pds']] = pd.DataFrame({"value": df.loc[cond_sub,'value'] - df.loc[cond_sub,'prev_val'],
-                                                            "pds": df.loc[cond_sub,'pds'] - df.loc[cond_sub,'pd_diff_1']})
-
-            #set 3 qtr values to their closest average
-            df.loc[:,'prev_val'] = df['value'].shift(1)
-            df.loc[:,'prev_val_1'] = df['prev_val'].shift(1)
-            df.loc[:,'dt_diff_1'] = df['dt_diff'].shift(1)
-            cond_3a = (df['pds'] == 3) & (df['dt_diff'] == 1) & (df['dt_diff_1'] == 1) & cond_match
-            df.loc[cond_3a, ['value', 'pds']] = df.loc[cond_3a,'value'] - df.loc[cond_3a,'prev_val'] - df.loc[cond_3a,'prev_val_1'], 1
-
-            cond_3b = (((df['pds'] == 4) & (df['dt_diff'] == 3)) |
-                        ((df['pds'] == 3) & (df['dt_diff'].isin([1,2])))) & cond_match
-            df.loc[cond_3b, ['value', 'pds']] = (df.loc[cond_3b,'value'] - df.loc[cond_3b,'prev_val']) / (df.loc[cond_3b,'pds'] - 1), 1
-
-            #Pds == 4 value subtraction
-            df.loc[:,'prev_val_2'] = df['prev_val_1'].shift(1)
-            df.loc[:,'dt_diff_2'] = df['dt_diff_1'].shift(1)
-            cond_4a = (df['pds'] == 4) & (df['dt_diff'] == 1) & (df['dt_diff_1'] == 1) & (df['dt_diff_2'] == 1) & cond_match
-            df.loc[cond_4a, ['value', 'pds']] = df.loc[cond_4a,'value'] - df.loc[cond_4a,'prev_val'] - df.loc[cond_4a,'prev_val_1'] -  df.loc[cond_4a,'prev_val_2'], 1
-            cond_4b = (df['pds'] == 4) & (df['dt_diff'] + df['dt_diff_1'] <= 3) & cond_match
-            df.loc[cond_4b, ['value', 'pds']] = (df.loc[cond_4b,'value'] - df.loc[cond_4b,'prev_val'] - df.loc[cond_4b,'prev_val_1']) / 2 , 1
-
-            #qtd compare
-            cond_qtr = (df['pds'] == 1) & (df['dt_diff'] == 1) & cond_match
-            df.loc[cond_qtr, 'qtr_diff_pct'] = ((df.loc[cond_qtr,'value'] - df.loc[cond_qtr,'prev_val'] ) / abs(df.loc[cond_qtr,'prev_val'])) * 100
-
-            #ytd compare
-            df.loc[:,'prev_val'] = df['value'].shift(1)
-            df.loc[:,'prev_val_1'] = df['prev_val'].shift(1)
-            df.loc[:,'prev_val_2'] = df['prev_val_1'].shift(1)
-            df.loc[:,'prev_val_3'] = df['prev_val_2'].shift(1)
-            df.loc[:,'dt_diff_3'] = df['dt_diff_2'].shift(1)
-
-            c_yr1 = (df['dt_diff'] == 4) & cond_match
-            c_yr2 = (df['dt_diff'] + df['dt_diff_1'] == 4) & cond_match
-            c_yr3 = (df['dt_diff'] + df['dt_diff_1'] + df['dt_diff_2']== 4) & cond_match
-            c_yr4 = (df['dt_diff'] + df['dt_diff_1'] + df['dt_diff_2'] + df['dt_diff_3'] == 4) & cond_match
-            c_yr5 = (df['attr'].isin(attrs)) & (df['dt_diff'] == 4) & (df['attr'] == df['nxt_attr'])
-
-            for cond, val in [(c_yr1, 'prev_val'),(c_yr2, 'prev_val_1'),(c_yr3, 'prev_val_2'),(c_yr4, 'prev_val_3'),(c_yr5, 'prev_val')]:
-                df.loc[cond, 'yr_diff_pct'] = ((df.loc[cond, 'value'] - df.loc[cond, val]) / abs(df.loc[cond, val])) * 100
-
-            out_attr = ['cik','ticker','date','acct_typ','attr','value','qtr_diff_pct','yr_diff_pct']
-            
-            # Try to delete the directory, if it doesnt exist, pass
-            df[out_attr].to_csv(self.agg_data.joinpath(comp_file.name),
-                                compression = 'gzip',
-                                mode = 'w',
-                                sep='\t',
-                                index = False,
-                                encoding='utf-8',
-                                line_terminator = '\n')
-
-    def getDatesAndPeriods(self, tag_list, prefix):
+    def writeFilings(self, frames, out_dir = None):
+        """ 
+        Upsert the values of a batch of filings into the processed filing store and mark their ciks dirty in the aggregate manifest (a
+        staging store is merged, and marked, by QuarterScheduler)
+        ...
+        Parameters
+        ----------
+        frames: A list of filing values (cik, ticker, year_sub, qtr_sub, acct_typ, attr, date, pds, value)
+        out_dir: The directory of the store to write to, defaults to the processed filings
+        ...
+        Returns
+        ----------
+         > The ciks that were written
+        """
+        if not frames:
+            return []
+        if out_dir is not None:
+            return ProcessedStore(out_dir, self.codes).upsert(pd.concat(frames, ignore_index = True))
+        ciks = self.store.upsert(pd.concat(frames, ignore_index = True))
+        self.manifest.markDirty(ciks)
+        return ciks
+
+    def readProcessed(self, ciks = None):
+        """ 
+        Read the processed filing values one company at a time
+        ...
+        Parameters
+        ----------
+        ciks: A list of ciks to read, None reads every company (one cik bucket at a time)
+        ...
+        Returns
+        ----------
+         > A generator of (cik, dataframe)
+        """
+        buckets = self.store.readBuckets() if ciks is None else [self.store.read(ciks = ciks)]
+        for df_bucket in buckets:
+            for cik, df in df_bucket.groupby('cik', sort = True):
+                yield int(cik), df.reset_index(drop = True)
+
+    def buildAggregatedDataset(self, files_to_format = None, ciks = None):
+        """ 
+        Output the filing data to a table to be used by the models.  Also, calculate the qtr and yr pct change.  A delta run aggregates
+        the companies it is given and the companies the manifest has marked dirty, a full run reads every company but skips the ones
+        whose processed values have not changed since their file was written.  Each file is written to a temporary name and renamed
+        ...
+        Parameters
+        ----------
+        files_to_format: The filings formatted by a delta load (only their companies are aggregated)
+        ciks: The ciks written by a delta load (formatFilings), None with no files_to_format aggregates every company
+        ...
+        Returns
+        ----------
+         > The ciks that were aggregated
+        """
+        if files_to_format is None and ciks is None:
+            targets = None
+        else:
+            # Get the CIK from the file names (<cik>-<ticker>_<type>_<date>.xml)
+            targets = set(int(cik) for cik in (ciks or []))
+            targets.update(int(str(file).split('_')[0].split('-')[0]) for file in (files_to_format or []))
+            targets = sorted(targets.union(self.manifest.dirty()))
+
+        # the companies are aggregated one cik bucket (or one delta) at a time, every company in the frame in one pass
+        cols = IN_COLS + ['year_sub', 'qtr_sub']
+        frames = self.store.readBuckets(columns = cols, categorical = True) if targets is None else \
+                 [self.store.read(ciks = targets, columns = cols, categorical = True)]
+        known, aggregated = self.manifest.hashes(), []
+        self.agg_data.mkdir(parents = True, exist_ok = True)
+        for df_frame in frames:
+            df_hash = self.manifest.contentHashes(df_frame)
+            # a listed company without a file (newly listed, or its file was removed) is aggregated even if its values did not change
+            changed = [known.get(cik) != content_hash or
+                       (cik in self.aggregator.tickers and not self.agg_data.joinpath('%s.tsv.gz' % cik).exists())
+                       for cik, content_hash in zip(df_hash['cik'], df_hash['content_hash'])]
+            df_hash = df_hash[changed]
+            df_agg = self.aggregator.aggregate(df_frame[df_frame['cik'].isin(df_hash['cik'])])
+            for cik, df in df_agg.groupby('cik', sort = True):
+                out_file = self.agg_data.joinpath('%s.tsv.gz' % cik)
+                tmp_file = out_file.with_name(out_file.name + '.tmp')
+                df.to_csv(tmp_file,
+                          compression = 'gzip',
+                          mode = 'w',
+                          sep='\t',
+                          index = False,
+                          encoding='utf-8',
+                          line_terminator = '\n')
+                os.replace(tmp_file, out_file)
+            # the hashes are recorded once the bucket's files are in place
+            self.manifest.record(df_hash)
+            aggregated += df_hash['cik'].tolist()
+
+        if targets is not None:
+            # a dirty cik can have no values left (nothing to write)
+            self.manifest.clear(sorted(set(targets) - set(aggregated)))
+        self.logger.info("Aggregated %i companies" % len(aggregated))
+        return sorted(aggregated)
+
+    def getDatesAndPeriods(self, tag_list):
         """ 
-        Goes through the tag list to find the period/range of the file and extract the appropriate date tags and end date
+        Goes through the tag list once to index every context (whatever its prefix) and keep the date tags and end date of the contexts
+        without dimensions
         ...
         Parameters
         ----------
         tag_list: a list of the the tags in the document
-        prefix: formats for the different possible HTML tags
         ...
         Returns
         ----------
          > a dictionary of the dates and contexts
         """
-        contexts, final_dts = {'instant': {}, 'period':{}}, {}
-        max_inst_len, max_pd_len = 100, 100
-
-        for tag in tag_list:
-            if tag.name == prefix + 'context':
-                #find the start date of context
-                start_date_tag = tag.find(name= prefix + 'startdate')
-                if start_date_tag != None:
-                    try:
-                        strt_dt = datetime.strptime(start_date_tag.text.replace('\n',''),"%Y-%m-%d")
-                    except:
-                        strt_dt = datetime.strptime(start_date_tag.text.replace('\n','').split('T')[0],"%Y-%m-%d")
-                #get the end date as well as the quarter length factor
-                end_date_tag = tag.find(name = prefix + 'enddate')
-                if end_date_tag != None:
-                    end_date = end_date_tag.text.replace('\n','')
-                    try:
-                        end_dt = datetime.strptime(end_date,"%Y-%m-%d")
-                    except:
-                        end_dt = datetime.strptime(end_date.split('T')[0],"%Y-%m-%d")
-
-                    qtrs = int(round(((end_dt - strt_dt).days / 365.25) * 4))
-                    contexts['period'][tag['id']] = (qtrs, end_date)
-                    if len(tag['id']) < max_pd_len:
-                        max_pd_len = len(tag['id'])
-                
-                #if the tag is an instant, archive the end date
-                instant_date_tag = tag.find(name= prefix + 'instant')
-                if instant_date_tag != None:
-                    end_date = instant_date_tag.text
-                    contexts['instant'][tag['id']] = (1, end_date)
-                    if len(tag['id']) < max_inst_len:
-                        max_inst_len = len(tag['id'])
-
-        for type, max_val in [('instant',max_inst_len), ('period', max_pd_len)]:
-            if max_val*1.5 < 12:
-                limit = 12
-            else:
-                limit = max_val*1.5
-
-            tmp_dict = {k:v for k ,v in contexts[type].items() if len(k) < limit and v[0] != 0}
-            final_dts = {**tmp_dict, **final_dts}
-
-        return final_dts
+        return ContextIndex.fromTags(tag_list).dates
 
     def getValuesFromFile(self, tag_list):
         """ 
@@ -340,6 +351,10 @@ class SECFilingFormatter(object):
                 except:
                     continue
 
+                #drop the attributes that are not in the allow-list before reading the value
+                if self.concepts is not None and tag.name.split(':')[-1] not in self.concepts:
+                    continue
+
                 if tag_dt in self.dates.keys():
                     try:
                         tag_val = float(tag.text)
@@ -0,0 +1,177 @@
+##!/usr/bin/env python
+"""
+Ticker Index: Resolves a cik to its ticker and a ticker to its cik with dictionaries instead of scanning the master list.  Every row of
+the index is a (cik, ticker) pair with the date it took effect and the date it ended (blank while the pair is current), so a ticker
+change keeps the old ticker for the filings made before it.  UpdateMaster writes the index (master/ticker_index.csv.gz) when it
+refreshes the cik list, and the index is read once per process and shared by every stage that resolves tickers.
+
+object TickerIndex:
+    def ticker() -> str: Returns the ticker of a cik (on a date, or today)
+    def cik() -> int: Returns the cik of a ticker (on a date, or today)
+    def tickers() -> Dict: Returns the current cik: ticker of every listed company
+    def load() -> TickerIndex: Reads the index of a master data directory once per process
+    def fromFrame() -> TickerIndex: Builds the index from a dataframe of cik, ticker (and start_date, end_date)
+    def update() -> DataFrame: Applies a new cik list to the index rows, ending the pairs that changed
+"""
+
+#Imports
+from datetime import date
+import pandas as pd
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+INDEX_FILE = 'ticker_index.csv.gz'
+CIK_FILE = 'ticker_cik.csv.gz'
+COLUMNS = ['cik', 'ticker', 'start_date', 'end_date']
+
+# The indexes read by this process, by path and modification time
+_loaded = {}
+
+class TickerIndex(object):
+
+    def __init__(self, rows):
+        """
+        Index of the (cik, ticker) pairs
+        ...
+        Parameters
+        ----------
+        rows: A list of (cik, ticker, start date, end date) tuples in priority order (the first current ticker of a cik is its ticker),
+              a blank date is open ended
+        """
+        self.by_cik, self.by_ticker, self.current = {}, {}, {}
+        for cik, ticker, start, end in rows:
+            cik, ticker, start, end = int(cik), str(ticker), start or '', end or ''
+            self.by_cik.setdefault(cik, []).append((start, end, ticker))
+            self.by_ticker.setdefault(ticker.upper(), []).append((start, end, cik))
+            if end == '':
+                self.current.setdefault(cik, ticker)
+        self.current_ciks = {}
+        for cik, pairs in self.by_cik.items():
+            for start, end, ticker in pairs:
+                if end == '':
+                    self.current_ciks.setdefault(ticker.upper(), cik)
+
+    def __contains__(self, cik):
+        return int(cik) in self.current
+
+    def __len__(self):
+        return len(self.current)
+
+    def ticker(self, cik, on = None):
+        """
+        The ticker of a cik
+        ...
+        Parameters
+        ----------
+        cik: The company's cik
+        on: A date (YYYY-MM-DD), None for the current ticker
+        ...
+        Returns
+        ----------
+         > The ticker, None if the cik had no ticker on the date
+        """
+        if on is None:
+            return self.current.get(int(cik))
+        return self._find(self.by_cik.get(int(cik), []), str(on)[:10])
+
+    def cik(self, ticker, on = None):
+        """
+        The cik of a ticker
+        ...
+        Parameters
+        ----------
+        ticker: The ticker
+        on: A date (YYYY-MM-DD), None for the company that has the ticker today
+        ...
+        Returns
+        ----------
+         > The cik, None if no company had the ticker on the date
+        """
+        if on is None:
+            return self.current_ciks.get(str(ticker).upper())
+        return self._find(self.by_ticker.get(str(ticker).upper(), []), str(on)[:10])
+
+    def tickers(self):
+        """
+        Returns a dictionary of cik: current ticker for every listed company
+        """
+        return dict(self.current)
+
+    @classmethod
+    def load(cls, master_data):
+        """
+        Read the index of a master data directory.  The index is read once per process (again only if the file changed), and the old
+        ticker_cik.csv.gz list is used as an index without dates when the index has not been built
+        ...
+        Parameters
+        ----------
+        master_data: The directory of the master data
+        """
+        path = master_data.joinpath(INDEX_FILE)
+        if not path.exists():
+            path = master_data.joinpath(CIK_FILE)
+        key = (str(path), path.stat().st_mtime)
+        if key not in _loaded:
+            _loaded[key] = cls.fromFrame(pd.read_csv(path, compression = 'gzip', dtype = {'ticker': str}))
+        return _loaded[key]
+
+    @classmethod
+    def fromFrame(cls, df):
+        """
+        Build the index from a dataframe of cik and ticker, with start_date and end_date when the pairs are dated
+        """
+        df = df.dropna(subset = ['cik', 'ticker'])
+        starts = df['start_date'].fillna('') if 'start_date' in df.columns else [''] * len(df)
+        ends = df['end_date'].fillna('') if 'end_date' in df.columns else [''] * len(df)
+        return cls(list(zip(df['cik'], df['ticker'], starts, ends)))
+
+    @staticmethod
+    def update(df_index, df_cik, on = None):
+        """
+        Apply a new cik list to the index.  Current pairs that are not in the list are ended and a new pair of a cik that is already in
+        the index (a ticker change) starts on the date.  A cik seen for the first time has no start date, so its earlier filings still
+        resolve to its ticker
+        ...
+        Parameters
+        ----------
+        df_index: The index rows (cik, ticker, start_date, end_date), None or empty when the index has not been built
+        df_cik: The new cik list (cik, ticker) in priority order
+        on: The date of the change (YYYY-MM-DD), defaults to today
+        ...
+        Returns
+        ----------
+         > The index rows, the current pairs in the order of the cik list followed by the ended pairs
+        """
+        on = on or date.today().strftime('%Y-%m-%d')
+        df_cik = df_cik.dropna(subset = ['cik', 'ticker'])
+        pairs = list(dict.fromkeys(zip(df_cik['cik'].astype(int), df_cik['ticker'].astype(str))))
+        if df_index is None or len(df_index) == 0:
+            return pd.DataFrame([(cik, ticker, '', '') for cik, ticker in pairs], columns = COLUMNS)
+
+        df_index = df_index[COLUMNS].fillna('')
+        is_open = df_index['end_date'] == ''
+        open_rows = {(int(cik), str(ticker)): start for cik, ticker, start in df_index[is_open][['cik', 'ticker', 'start_date']].values}
+        known = set(df_index['cik'].astype(int))
+        current = [(cik, ticker, open_rows.get((cik, ticker), on if cik in known else ''), '') for cik, ticker in pairs]
+        listed = set(pairs)
+        ended = [(cik, ticker, start, on) for (cik, ticker), start in open_rows.items() if (cik, ticker) not in listed]
+        history = [tuple(row) for row in df_index[~is_open][COLUMNS].values]
+        return pd.DataFrame(current + ended + history, columns = COLUMNS)
+
+    def _find(self, pairs, on):
+        """
+        The first value whose dates cover the day (start <= day < end)
+        """
+        for start, end, value in pairs:
+            if start <= on and (end == '' or on < end):
+                return value
+        return None
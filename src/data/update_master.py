@@ -5,7 +5,11 @@ Update Stock Master Data:
 This class should be utilized once every month to help account for new companies and companies that have ticker's that have changed. This will also update the sectors that are being used the adequate cik numbers that are to be used
 
     def getActiveStocks() -> None : Run once the nasdaq and nyse files have been updated, this updates the stock master table
-    def getCIKFromSEC() -> None : updating the correct cik values from the sec's website
+    def getCIKFromSEC() -> DataFrame : updating the correct cik values from the sec's ticker mapping, looking up the tickers it does not have
+    def getTickerMapping() -> Dict : the SEC's ticker to cik mapping (company_tickers.json) in one request
+    def lookupCIK() -> int : the cik of one ticker from the sec's website
+    def diffMapping() -> DataFrame : the tickers that were added, removed or changed cik between two cik lists
+    def buildTickerIndex() -> DataFrame : updates the effective dated cik / ticker index from the cik list
 
 Need to ensure that we have all listed companies' full history. Go through each companies' listed page and see whether there is a previously listed company.  Extract that value and look through the index values to find the previous cik
 
@@ -16,11 +20,13 @@ Need to ensure that we have all listed companies' full history. Go through each
 """
 
 #Imports
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import time
-from requests import get
 import logging
+import json
 import re
+from .api_call import api_call
+from .ticker_index import TickerIndex, INDEX_FILE, CIK_FILE
 
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
@@ -36,6 +42,9 @@ __status__ = "Development"
 HEADERS = {
     'User-Agent': 'dylans-app/0.0.1'
 }
+TICKERS_URL = 'https://www.sec.gov/files/company_tickers.json'
+CIK_RE = re.compile(r'.*CIK=(\d{10}).*')
+LOOKUP_WORKERS = 8
 
 class UpdateMaster(object):
     def __init__(self, proc_path):
@@ -90,40 +99,145 @@ class UpdateMaster(object):
                                   index = False,
                                   compression='gzip')
 
-    def getCIKFromSEC(self):
+    def getCIKFromSEC(self, mapping_file = None, fallback = True, workers = LOOKUP_WORKERS):
         """ 
-        Update the tickers with the correct cik value so that attributes with multiple CIK's can remove duplicate Companies or erroneously attributed values.  This scans the SEC website for the proper attribute
+        Update the tickers with the correct cik value so that attributes with multiple CIK's can remove duplicate Companies or erroneously attributed values.  The SEC's ticker mapping (company_tickers.json) is read in one request and diffed against the current list, and only the tickers it does not have are looked up on the SEC website, concurrently
+        ...
+        Parameters
+        ----------
+        mapping_file: A saved company_tickers.json to read instead of downloading the mapping (offline runs and tests)
+        fallback: A boolean, if false the tickers that are not in the mapping are not looked up one at a time
+        workers: The number of threads looking up the tickers that are not in the mapping
+        ...
+        Returns
+        ----------
+         > The diff of the new and old lists (ticker, cik, old_cik, status)
         """
         # Read the tickers 
         df_tickers = pd.read_csv(self.proc_path.joinpath('stocks_master.csv.gz'),
                                 compression='gzip')
         
         # Get all tyhe unique tickers to output
-        tickers = df_tickers['ticker'].tolist()
-        tickers.sort()
-        CIK_RE = re.compile(r'.*CIK=(\d{10}).*')
-        count, len_t = 1, len(tickers)
-        # instantiate the lists for the object
-        ticker_out, cik_out = [], []
-        for tick in tickers:
-            url = 'http://www.sec.gov/cgi-bin/browse-edgar?CIK=%s&Find=Search&owner=exclude&action=getcompany' % tick
-            try:
-                cik = CIK_RE.findall(get(url, headers = HEADERS).text)[0]
-
-                # Add the ticker and cik to the arrays
-                ticker_out.append(tick)
-                cik_out.append(cik)
-
-                self.logger.info("CIK for %s Downloaded: %.2f" % (tick, (count / len_t)* 100))
-            except:
-                self.logger.info("CIK Failed for %s Downloaded: %.2f" % (tick, (count / len_t)* 100))
-                pass
-
-            count+=1
-            time.sleep(0.14)
+        tickers = sorted(set(df_tickers['ticker'].dropna().astype(str)))
+        mapping = self.getTickerMapping(mapping_file)
+        found = {tick: mapping[self._normalize(tick)] for tick in tickers if self._normalize(tick) in mapping}
+        missing = [tick for tick in tickers if tick not in found]
+        self.logger.info("%i of %i tickers found in the SEC ticker mapping, %i to look up" % (len(found), len(tickers), len(missing)))
+
+        # the lookups share the http client, which keeps the SEC host under its request rate
+        if fallback and missing:
+            with ThreadPoolExecutor(max_workers = workers) as pool:
+                for tick, cik in zip(missing, pool.map(self.lookupCIK, missing)):
+                    if cik is not None:
+                        found[tick] = cik
         
         # Write these values to an output csv
-        df_out = pd.DataFrame({'cik': cik_out, 'ticker': ticker_out})
-        df_out.to_csv(self.proc_path.joinpath('ticker_cik.csv.gz'),
+        df_out = pd.DataFrame({'cik': ['%010d' % found[tick] for tick in tickers if tick in found],
+                               'ticker': [tick for tick in tickers if tick in found]})
+        cik_path = self.proc_path.joinpath(CIK_FILE)
+        df_old = pd.read_csv(cik_path, compression = 'gzip', dtype = {'ticker': str}) if cik_path.exists() else None
+        df_diff = self.diffMapping(df_old, df_out)
+        self.logger.info("CIK list: %s" % ', '.join('%i %s' % (count, status) for status, count in df_diff['status'].value_counts().items()))
+        df_out.to_csv(cik_path,
                       index = False,
-                      compression='gzip')
\ No newline at end of file
+                      compression='gzip')
+        self.buildTickerIndex()
+        return df_diff
+
+    def getTickerMapping(self, mapping_file = None):
+        """ 
+        Read the SEC's ticker to cik mapping ({"0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."}, ...})
+        ...
+        Parameters
+        ----------
+        mapping_file: A saved copy of the mapping, None downloads it
+        ...
+        Returns
+        ----------
+         > A dictionary of normalized ticker: cik
+        """
+        if mapping_file is not None:
+            with open(mapping_file, 'r') as f:
+                data = json.load(f)
+        else:
+            data = api_call(TICKERS_URL, HEADERS, 'json')
+        if not isinstance(data, dict):
+            self.logger.info("The SEC ticker mapping could not be downloaded")
+            return {}
+        rows = data.values() if 'fields' not in data else [dict(zip(data['fields'], row)) for row in data['data']]
+        mapping = {}
+        for row in rows:
+            # the first cik listed for a ticker is kept
+            mapping.setdefault(self._normalize(row['ticker']), int(row.get('cik_str', row.get('cik'))))
+        return mapping
+
+    def lookupCIK(self, tick):
+        """ 
+        Look up the cik of one ticker on the SEC company search page
+        ...
+        Returns
+        ----------
+         > The cik, None if it could not be found
+        """
+        url = 'http://www.sec.gov/cgi-bin/browse-edgar?CIK=%s&Find=Search&owner=exclude&action=getcompany' % tick
+        try:
+            cik = int(CIK_RE.findall(api_call(url, HEADERS, 'text'))[0])
+            self.logger.info("CIK for %s Downloaded" % tick)
+            return cik
+        except:
+            self.logger.info("CIK Failed for %s" % tick)
+            return None
+
+    def diffMapping(self, df_old, df_new):
+        """ 
+        Compare two cik lists
+        ...
+        Parameters
+        ----------
+        df_old: The current list (cik, ticker), None if there is no list
+        df_new: The new list (cik, ticker)
+        ...
+        Returns
+        ----------
+         > A dataframe of ticker, cik, old_cik and status (added, removed, changed or unchanged)
+        """
+        new = df_new.assign(cik = df_new['cik'].astype(int))[['ticker', 'cik']]
+        if df_old is None:
+            old = pd.DataFrame({'ticker': pd.Series(dtype = str), 'old_cik': pd.Series(dtype = float)})
+        else:
+            old = df_old.dropna(subset = ['cik', 'ticker']).assign(old_cik = lambda df: df['cik'].astype(int))[['ticker', 'old_cik']]
+        df = pd.merge(new, old.drop_duplicates('ticker'), how = 'outer', on = 'ticker')
+        df['status'] = 'unchanged'
+        df.loc[df['old_cik'].isna(), 'status'] = 'added'
+        df.loc[df['cik'].isna(), 'status'] = 'removed'
+        df.loc[df['cik'].notna() & df['old_cik'].notna() & (df['cik'] != df['old_cik']), 'status'] = 'changed'
+        return df.sort_values('ticker').reset_index(drop = True)
+
+    def _normalize(self, tick):
+        """ 
+        Tickers are compared in upper case with the share class after a dot (the SEC mapping writes BRK-B, the exchanges BRK.B)
+        """
+        return str(tick).upper().replace('-', '.')
+
+    def buildTickerIndex(self):
+        """ 
+        Update the cik / ticker index from the cik list.  Pairs that are no longer in the list are ended today and a new ticker of a
+        known cik starts today, so the filings made before a ticker change still resolve to the old ticker (a new cik is open ended)
+        ...
+        Returns
+        ----------
+         > The index rows (cik, ticker, start_date, end_date)
+        """
+        index_path = self.proc_path.joinpath(INDEX_FILE)
+        df_index = pd.read_csv(index_path, compression = 'gzip', dtype = str) if index_path.exists() else None
+        df_cik = pd.read_csv(self.proc_path.joinpath(CIK_FILE), compression = 'gzip', dtype = {'ticker': str})
+        df_index = TickerIndex.update(df_index, df_cik)
+
+        # the index is replaced in one rename so a running stage never reads half a file
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        df_index.to_csv(tmp_path,
+                        index = False,
+                        compression='gzip')
+        tmp_path.replace(index_path)
+        self.logger.info("Ticker index updated: %i current pairs, %i ended" % ((df_index['end_date'] == '').sum(), (df_index['end_date'] != '').sum()))
+        return df_index
\ No newline at end of file
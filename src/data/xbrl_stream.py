@@ -0,0 +1,102 @@
+##!/usr/bin/env python
+"""
+XBRL Stream: Reads the contexts and numeric facts of an xbrl instance in a single lxml iterparse pass.  Elements are cleared as soon as
+they have been read, so memory holds the contexts and the numeric facts instead of the whole document tree.  The result is the same
+dataframe as SECFilingFormatter.getValuesFromFile (tag names are matched the way BeautifulSoup names them, prefix:name in lower case),
+and the contexts are resolved by the same ContextIndex.
+
+object XBRLStream:
+    def parse() -> DataFrame: Returns the filing values of an instance (None when it has no usable contexts)
+"""
+
+#Imports
+from lxml import etree
+import pandas as pd
+from .context_index import ContextIndex
+
+__author__ = "Dylan Smith"
+__copyright__ = "Copyright (C) 2019 Dylan Smith"
+__credits__ = ["Dylan Smith"]
+
+__license__ = "Personal Use"
+__version__ = "1.0"
+__maintainer__ = "Dylan Smith"
+__email__ = "-"
+__status__ = "Development"
+
+# Constants
+COLUMNS = ['acct_typ', 'attr', 'date', 'pds', 'value']
+
+class XBRLStream(object):
+
+    def parse(self, source, concepts = None):
+        """
+        Read an xbrl instance and return the quarterly value of every attribute (the fewest quarters for each attribute and end date)
+        ...
+        Parameters
+        ----------
+        source: A file object (or path) of the instance
+        concepts: A ConceptFilter (or set) of the attributes to keep, None keeps every numeric fact.  Other facts are skipped before
+                  their value is read
+        ...
+        Returns
+        ----------
+         > A dataframe of acct_typ, attr, date, pds and value, None if no contexts could be resolved
+        """
+        contexts, facts = [], []
+        for event, el in etree.iterparse(source, events = ('end',), recover = True, huge_tree = True):
+            name = self._name(el)
+            if name is None:
+                continue
+            if name == 'context' or name.endswith(':context'):
+                contexts.append(self._readContext(el, name[:-7]))
+            elif ':' in name and 'xbrl' not in name and 'link:' not in name:
+                context_ref = el.get('contextRef', el.get('contextref'))
+                if context_ref is not None and (concepts is None or name.split(':')[-1] in concepts):
+                    try:
+                        value = float(el.text if len(el) == 0 else ''.join(el.itertext()))
+                    except (TypeError, ValueError):
+                        value = None
+                    if value is not None:
+                        typ, attr = name.split(':')
+                        facts.append((typ, attr, context_ref, value))
+
+            # only children of the root are cleared, so nested elements are read before their parent is dropped
+            parent = el.getparent()
+            if parent is not None and parent.getparent() is None:
+                el.clear()
+                while el.getprevious() is not None:
+                    del parent[0]
+
+        dates = ContextIndex(contexts).dates
+        if not dates:
+            return None
+
+        filing_attrs = {}
+        for typ, attr, context_ref, value in facts:
+            if context_ref not in dates:
+                continue
+            pd_div, pd_end_dt = dates[context_ref]
+            if (typ, attr, pd_end_dt) not in filing_attrs or filing_attrs[(typ, attr, pd_end_dt)][0] > pd_div:
+                filing_attrs[(typ, attr, pd_end_dt)] = (pd_div, value)
+        return pd.DataFrame([list(k) + list(v) for k, v in filing_attrs.items()], columns = COLUMNS)
+
+    def _readContext(self, el, prefix):
+        """
+        The id and the first start date, end date and instant text inside a context element
+        """
+        found = {prefix + 'startdate': None, prefix + 'enddate': None, prefix + 'instant': None}
+        for child in el.iterdescendants():
+            name = self._name(child)
+            if name in found and found[name] is None:
+                found[name] = ''.join(child.itertext())
+        return (el.get('id'), found[prefix + 'startdate'], found[prefix + 'enddate'], found[prefix + 'instant'])
+
+    def _name(self, el):
+        """
+        The element name as BeautifulSoup reports it (prefix:name in lower case), None for comments and processing instructions
+        """
+        if not isinstance(el.tag, str):
+            return None
+        local = el.tag.rsplit('}', 1)[-1]
+        return (el.prefix + ':' + local).lower() if el.prefix else local.lower()
@@ -8,12 +8,16 @@ is run on my raspberry pi to aggregate all of the data
     def updateCompanyList() -> Master data function that downloads all of the currently listed companies from the exchange websites
     def downloadStockHistory() -> Downloads all EOD stock prices from TD Ameritrade's website.
     def downloadAndFormatSECData() -> Download and format the SEC data from EDGAR
+    def ingestSECDataSets() -> Backfill the formatted SEC data from EDGAR's financial statement data sets
+    def compactPrices() -> Merges the delta files of the price store and drops the duplicate prices
 """
 
 #Imports
 from pathlib import Path
 import sys
 from data import SECFilingDownload, TDClient, SECFilingFormatter, UpdateMaster, FredClient, GuardianClient, NYTClient, WikipediaScraper
+from data import ResponseCache, RiskFactorStore, EdgarCatalog, SECBulkIngest, QuarterScheduler, ProcessedStore, ConceptFilter, CodeDictionary, get_client
+from data import PriceStore, PriceWatermarks
 from datetime import datetime, date
 from os.path import exists
 import json
@@ -40,6 +44,12 @@ SEC_DIR = DATA_DIR.joinpath('sec')
 EQUITIES_DIR = DATA_DIR.joinpath('equities')
 MASTER_DIR = DATA_DIR.joinpath('master')
 CURR_DT = datetime.today().strftime('%Y-%m-%d')
+SEC_WORKERS = 4
+# Filing documents never change once they are on EDGAR, the full index is revalidated on every run
+SEC_CACHE_RULES = [(r'/Archives/edgar/data/', None), (r'/full-index/', 0)]
+# The concepts kept when formatting with the allow-list: every attribute in features.json plus the extra attributes
+FEATURES_PATH = PROJ.joinpath('docs', 'features.json')
+EXTRA_CONCEPTS = []
 
 def WikipediaData(run_type):
     """ 
@@ -99,9 +109,14 @@ def updateListedCompanies():
     update_mstr.getCIKFromSEC()
     logging.info("Finished updating tickers-cik, formatting values")
 
-def downloadStockHistory():
+def downloadStockHistory(concurrent = False, workers = 8):
     """ 
     Function that downloads the stock data and updates it in the database
+    ...
+    Parameters
+    ----------
+    concurrent: A boolean, if true the tickers are downloaded with several requests in flight
+    workers: The number of requests in flight when downloading concurrently
     """
     logging.basicConfig(level=logging.INFO, 
                         format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
@@ -112,16 +127,25 @@ def downloadStockHistory():
     logger.info('Initializing Stock Client')
     downloader = TDClient(PROJ.joinpath('keys','tdconfig.json'), proc_path = EQUITIES_DIR, mstr_path = MASTER_DIR)
     logger.info("Downloading Stock Data")
-    downloader.updateStockHistory()
+    if concurrent:
+        downloader.updateStockHistoryAsync(workers = workers)
+    else:
+        downloader.updateStockHistory()
     logger.info("Finished Downloading Stock Data")
 
-def downloadAndFormatSECData(full_load = False, full_aggregate = False):
+def downloadAndFormatSECData(full_load = False, full_aggregate = False, workers = SEC_WORKERS, replay = False, format_workers = None,
+                             concepts_only = False):
     """ 
     Function that downloads the SEC data and then passes the files that are to be formatted
     ...
     Parameters
     ----------
     full_load: A boolean, if a full load, go through all zip files, if not, just get the updated files
+    workers: The number of threads used to download filings from EDGAR
+    replay: A boolean, if true EDGAR is not called and every response comes from the http cache of a previous run
+    format_workers: The number of processes formatting quarters during a full load (defaults to the number of cpus), or reading the
+                    new filings of a quarter during an update (defaults to one)
+    concepts_only: A boolean, if true only the attributes in features.json (and EXTRA_CONCEPTS) are kept from each filing
     """
     logging.basicConfig(level=logging.INFO, 
                         format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
@@ -129,8 +153,10 @@ def downloadAndFormatSECData(full_load = False, full_aggregate = False):
                         filename=PROJ.joinpath('logs',CURR_DT + '_sec_filings.log'), 
                         filemode = 'w')
     logger.info("Instantiating SEC Filing Objects")
+    get_client().setCache(ResponseCache(SEC_DIR.joinpath('http-cache'), rules = SEC_CACHE_RULES, replay = replay))
     sec_downloader = SECFilingDownload(sec_data = SEC_DIR)
-    sec_formatter = SECFilingFormatter(sec_data = SEC_DIR, master_data = MASTER_DIR)
+    concepts = ConceptFilter.fromFeatures(FEATURES_PATH, EXTRA_CONCEPTS) if concepts_only else None
+    sec_formatter = SECFilingFormatter(sec_data = SEC_DIR, master_data = MASTER_DIR, concepts = concepts)
 
     # Get the date and the new zip files
     today = date.today()
@@ -147,22 +173,32 @@ def downloadAndFormatSECData(full_load = False, full_aggregate = False):
         zip_files.append(("%sQTR%s.zip" % (year, qtr), year, qtr))
 
     if full_load:
-        # If we want a full load, iterate over all of the zipped files
-        for year in range(2010, 2023):
-            for qtr in range(1, 5):
-                if year == 2022 and qtr > 2:
-                    break
-                logging.info("Formatting files from %i, QTR %i" %(year, qtr))
-                sec_formatter.formatFilings(yr_qtr = (year, qtr), files_to_format =  None)
-                logging.info("Formatting Succesful for %i QTR %i.  Moving to Aggregate files" % (year, qtr))
+        # If we want a full load, format every quarter in the EDGAR catalog and every quarter zip on disk on a pool of processes
+        quarters = set(sec_downloader.catalog.quarters())
+        for zip_path in SEC_DIR.joinpath('raw-filings').glob('*QTR*.zip'):
+            year, qtr = zip_path.stem.split('QTR')
+            if year.isdigit() and qtr.isdigit():
+                quarters.add((int(year), int(qtr)))
+        quarters = sorted(quarters)
+        if not quarters:
+            quarters = [(year, qtr) for year in range(2010, 2023) for qtr in range(1, 5) if not (year == 2022 and qtr > 2)]
+        scheduler = QuarterScheduler(sec_data = SEC_DIR, master_data = MASTER_DIR, workers = format_workers, concepts = concepts)
+        scheduler.run(quarters)
+        logging.info("Formatting Succesful for %i quarters.  Moving to Aggregate files" % len(quarters))
+        # the merged company files feed the aggregation below
+        full_aggregate = True
     else:
         # Iterate through the zip files that we have found
         for (zip_name, year, qtr) in zip_files:
             logging.info("Downloading SEC Filings for %i, QTR %i" %(year, qtr))
-            new_files = sec_downloader.updateFilings(year = year, qtr = "QTR%s" % qtr)
+            new_files = sec_downloader.updateFilings(year = year, qtr = "QTR%s" % qtr, workers = workers)
+            if new_files is None:
+                logging.info("Download failed for %i, QTR %i" % (year, qtr))
+                continue
             logging.info("Download succesful, formatting files from %i, QTR %i" %(year, qtr))
-            sec_formatter.formatFilings(yr_qtr = (year, qtr), files_to_format =  new_files)
-            sec_formatter.buildAggregatedDataset(files_to_format = new_files)
+            ciks = sec_formatter.formatFilings(yr_qtr = (year, qtr), files_to_format =  new_files, workers = format_workers or 1)
+            # only the companies written in this run (and any left dirty by an earlier run) are aggregated
+            sec_formatter.buildAggregatedDataset(ciks = ciks)
             logging.info("Formatting Succesful for %i QTR %i" % (year, qtr))
     
     if full_aggregate:
@@ -170,6 +206,77 @@ def downloadAndFormatSECData(full_load = False, full_aggregate = False):
         sec_formatter.buildAggregatedDataset(files_to_format = None)
         logging.info("Aggregating the dataset")
 
+def ingestSECDataSets(quarters = None, concepts_only = False):
+    """ 
+    Backfill the processed filings from the EDGAR financial statement data sets instead of parsing every xbrl instance, then rebuild
+    the aggregated dataset
+    ...
+    Parameters
+    ----------
+    quarters: A list of (year, qtr) tuples to load, defaults to the quarters of the full load (2010 QTR1 to 2022 QTR2)
+    concepts_only: A boolean, if true only the attributes in features.json (and EXTRA_CONCEPTS) are loaded
+    """
+    logging.basicConfig(level=logging.INFO, 
+                        format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
+                        datefmt= '%m-%d %H:%M:%S', 
+                        filename=PROJ.joinpath('logs',CURR_DT + '_sec_bulk.log'), 
+                        filemode = 'w')
+    concepts = ConceptFilter.fromFeatures(FEATURES_PATH, EXTRA_CONCEPTS) if concepts_only else None
+    sec_formatter = SECFilingFormatter(sec_data = SEC_DIR, master_data = MASTER_DIR, concepts = concepts)
+    sec_ingest = SECBulkIngest(sec_data = SEC_DIR, formatter = sec_formatter)
+    if quarters is None:
+        quarters = [(year, qtr) for year in range(2010, 2023) for qtr in range(1, 5) if not (year == 2022 and qtr > 2)]
+    for (year, qtr) in quarters:
+        logging.info("Loading the financial statement data set for %i, QTR %i" %(year, qtr))
+        sec_ingest.ingestQuarter(year, qtr)
+    sec_formatter.buildAggregatedDataset(files_to_format = None)
+
+def migrateRiskFactors():
+    """ 
+    One time migration of the old per cik risk factor files (sec/risk-factors/<cik>.csv.gz) into the risk factor store
+    """
+    store = RiskFactorStore(SEC_DIR.joinpath('risk-factors.db'))
+    count = store.migrateFromGzip(SEC_DIR.joinpath('risk-factors'))
+    print("Migrated %i risk factors" % count)
+
+def migrateProcessedFilings():
+    """ 
+    One time migration of the old per cik processed files (sec/processed-filings/<cik>.tsv.gz) into the processed filing store
+    """
+    store = ProcessedStore(SEC_DIR.joinpath('processed-filings'), CodeDictionary(SEC_DIR.joinpath('code-dictionary.db')))
+    count = store.migrateFromTsv(SEC_DIR.joinpath('processed-filings'))
+    print("Migrated %i companies" % count)
+
+def importIndexCatalog():
+    """ 
+    One time import of the old index files (sec/index/<year>-QTR<n>.tsv) into the EDGAR catalog
+    """
+    catalog = EdgarCatalog(SEC_DIR.joinpath('catalog'))
+    count = catalog.importLegacyIndex(SEC_DIR.joinpath('index'))
+    print("Imported %i quarters into the EDGAR catalog" % count)
+
+def migratePrices():
+    """ 
+    One time migration of the old sector price files (equities/<sector>.tsv.gz) into the price store, then rebuild the watermarks
+    """
+    store = PriceStore(EQUITIES_DIR.joinpath('prices'))
+    count = store.migrateFromTsv(EQUITIES_DIR)
+    watermarks = PriceWatermarks(EQUITIES_DIR.joinpath('price-watermarks.db'))
+    watermarks.rebuild(df for partition, df in store.readPartitions(columns = ['ticker','date']))
+    print("Migrated %i prices" % count)
+
+def compactPrices():
+    """ 
+    Merge the delta files the stock download appended to the price store and drop the duplicate (ticker, date) rows
+    """
+    logging.basicConfig(level=logging.INFO, 
+                        format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
+                        datefmt= '%m-%d %H:%M', 
+                        filename=PROJ.joinpath('logs',CURR_DT + '_compact_prices.log'), 
+                        filemode = 'w')
+    count = PriceStore(EQUITIES_DIR.joinpath('prices')).compact()
+    print("Compacted %i partitions" % count)
+
 def downloadQuarterlyFundamentalData():
     '''
     Archived Quarterly SEC download using the Excel data made available through EDGAR
@@ -202,10 +309,28 @@ def main(download_to_run= None):
         downloadExternalData()
     elif download_to_run == 'stocks':
         downloadStockHistory()
+    elif download_to_run == 'stocks_async':
+        downloadStockHistory(concurrent = True)
     elif download_to_run == 'sec':
         downloadAndFormatSECData(full_load = True)
+    elif download_to_run == 'sec_concepts':
+        downloadAndFormatSECData(full_load = True, concepts_only = True)
+    elif download_to_run == 'sec_bulk':
+        ingestSECDataSets()
+    elif download_to_run == 'sec_replay':
+        downloadAndFormatSECData(replay = True)
     elif download_to_run == 'update_master':
         updateListedCompanies()
+    elif download_to_run == 'migrate_risk':
+        migrateRiskFactors()
+    elif download_to_run == 'migrate_processed':
+        migrateProcessedFilings()
+    elif download_to_run == 'import_index':
+        importIndexCatalog()
+    elif download_to_run == 'migrate_prices':
+        migratePrices()
+    elif download_to_run == 'compact_prices':
+        compactPrices()
 
 if __name__ == '__main__':
     #import the process to run
@@ -40,6 +40,7 @@ for handler in logging.root.handlers[:]:
 logger = logging.getLogger(__name__)
 RAW_DATA = PROJ.joinpath('data', 'raw')
 PROC_DATA = PROJ.joinpath('data','processed')
+MASTER_DATA = PROJ.joinpath('data', 'master')
 SQL_MSTR = SQLCommands(db_conn = db.connect(str(PROC_DATA.joinpath('master.db'))))
 SQL_EXT = SQLCommands(db_conn = db.connect(str(PROC_DATA.joinpath('external_data.db'))))
 SQL_SEC = SQLCommands(db_conn = db.connect(str(PROC_DATA.joinpath('sec.db'))))
@@ -148,7 +149,7 @@ def updateMongoAndCleanseText():
     logging.basicConfig(level=logging.INFO, format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
                         datefmt= '%m-%d %H:%M:%S', filename=PROJ.joinpath('logs',CURR_DT + '_text_upload.log'), filemode = 'w')
     logger.info("Instantiating MongoDB Connection")
-    mongo = MongoClient(MONGO, SQL_MSTR)
+    mongo = MongoClient(MONGO, SQL_MSTR, MASTER_DATA)
     logging.info(" Starting Download for Risk Factors ")
     #mongo.insertData(RAW_DATA.joinpath('riskfactors'))
     logging.info(" Finished Download for Risk Factors.  Starting upload of News articles ")
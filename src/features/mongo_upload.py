@@ -2,12 +2,13 @@
 """
 Financial Analysis project.  Client that uploads the text data into a MongoDB NOSQl db
 object MongoClient:
-    def insertData() -> Inserts all of the raw risk factor data into the mongo database (risk_factors collection)
+    def insertData() -> Inserts all of the raw risk factor data into the mongo database (risk_factors collection) from the risk factor store or old files
     def insertNewsData() -> Inserts all of the news articles from the Guardian as well as NYT.
 """
 #Imports
 import pandas as pd
 import os
+from data.ticker_index import TickerIndex
 
 __author__ = "Dylan Smith"
 __copyright__ = "Copyright (C) 2019 Dylan Smith"
@@ -21,40 +22,52 @@ __status__ = "Development"
 
 class MongoClient(object):
 
-    def __init__(self, mongo, sql_mstr):
+    def __init__(self, mongo, sql_mstr, master_data):
         """ Mongo Client used to connect to the MongoDB
+            ::param master_data: The directory of the master data, its ticker index resolves the ticker of each cik
         """
         self.mongo = mongo
         self.sql_mstr = sql_mstr
+        self.master_data = master_data
 
-    def insertData(self, raw_dir):
+    def insertData(self, raw_dir = None, store = None):
         """ Function that inserts data into the Mongodb
+            ::param raw_dir: The directory of the old risk factor files (<cik>.csv.gz)
+            ::param store: A RiskFactorStore to read the risk factors from instead of the directory
         """
-        raw_files = set(os.listdir(raw_dir))
         self.mongo.command( "compact", 'riskfactors')
         db = self.mongo['riskfactors']
         db.remove({})
 
-        for file in raw_files:
-            cik = file.split('.')[0]
-            try:
-                symbol = self.sql_mstr.readSQL("SELECT ticker FROM ticker_cik where cik = %i" % int(cik))['ticker'][0]
-            except:
-                symbol = ''
+        if store is not None:
+            companies = ((cik, lambda cik = cik: store.read(cik)[['date', 'risktext']]) for cik in store.ciks())
+        else:
+            companies = ((int(file.split('.')[0]), lambda file = file: self.readRiskFile(raw_dir.joinpath(file)))
+                         for file in set(os.listdir(raw_dir)) if file.split('.')[0].isdigit())
 
-            df = pd.read_csv(raw_dir.joinpath(file),
-                                compression = 'gzip',
-                                sep = '\t',
-                                index_col = False,
-                                encoding = 'utf-8',
-                                lineterminator = '\n')
+        index = TickerIndex.load(self.master_data)
+        for cik, read in companies:
+            symbol = index.ticker(cik) or ''
+
+            df = read()
             df.drop_duplicates(inplace = True)
-            df.rename(columns = {"Unnamed: 0":"date"}, inplace = True)
             df['ticker'] = symbol
             df['cik'] = cik
             data = df.to_dict(orient='records')
             db.insert_many(data, ordered = False)
 
+    def readRiskFile(self, file):
+        """ Read one of the old risk factor files into a dataframe (date, risktext)
+        """
+        df = pd.read_csv(file,
+                            compression = 'gzip',
+                            sep = '\t',
+                            index_col = False,
+                            encoding = 'utf-8',
+                            lineterminator = '\n')
+        df.rename(columns = {"Unnamed: 0":"date"}, inplace = True)
+        return df
+
     def insertNewsData(self, raw_dir,):
         """ Function that inserts data into the Mongodb
         """
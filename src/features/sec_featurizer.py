@@ -55,8 +55,13 @@ class SECFeaturizer(object):
         f2 = [f for feat in features.values() for f2 in feat if isinstance(f2,list) for f in f2]
         df_raw = self.sql_sec.readSQL("SELECT ticker, attribute, date, value FROM sec_filings where attribute in (\'%s\') and ticker != \'NONE\'" % "\',\'".join(f1 + f2))
 
-        #pivot table and associate all values correctly
-        df = df_raw.pivot_table(index = ['ticker', 'date'], columns = 'attribute', values = 'value').reset_index()
+        #pivot table and associate all values correctly, the names are pivoted as categoricals (one copy of each string)
+        df_raw['ticker'] = df_raw['ticker'].astype('category')
+        df_raw['attribute'] = df_raw['attribute'].astype('category')
+        df = df_raw.pivot_table(index = ['ticker', 'date'], columns = 'attribute', values = 'value', observed = True)
+        df.columns = df.columns.astype(str)
+        df = df.reset_index()
+        df['ticker'] = df['ticker'].astype(str)
 
         #build the features based on the file in ~/docs/features.json
         for key, value in features.items():
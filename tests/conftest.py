@@ -0,0 +1,22 @@
+import pathlib
+import zipfile
+import sys
+import io
+import pytest
+
+# the packages are imported from src, as downloader.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1].joinpath('src')))
+
+@pytest.fixture
+def master_zip():
+    """
+    Builds the bytes of a quarter's master.zip from (cik, company name, form type, date filed, filename) rows
+    """
+    def build(rows):
+        lines = ['Description:           Master Index of EDGAR Dissemination Feed', 'CIK|Company Name|Form Type|Date Filed|Filename',
+                 '-' * 80] + ['|'.join(row) for row in rows]
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as z:
+            z.writestr('master.idx', '\n'.join(lines) + '\n')
+        return buf.getvalue()
+    return build
@@ -0,0 +1,30 @@
+import io
+from data.edgar_catalog import EdgarCatalog
+
+ROWS = [('320193', 'Apple Inc.', '10-K', '2020-10-30', 'edgar/data/320193/0000320193-20-000096.txt'),
+        ('320193', 'Apple Inc.', '8-K', '2020-10-29', 'edgar/data/320193/0000320193-20-000094.txt'),
+        ('789019', 'MICROSOFT CORP', '10-Q', '2020-10-27', 'edgar/data/789019/0001564590-20-047996.txt')]
+
+def test_query_filters_forms_ciks_dates_and_quarters(tmp_path, master_zip):
+    catalog = EdgarCatalog(tmp_path.joinpath('catalog'))
+    catalog.writeQuarter(2020, 3, catalog.readMasterIndex(io.BytesIO(master_zip([
+        ('320193', 'Apple Inc.', '10-Q', '2020-07-31', 'edgar/data/320193/0000320193-20-000062.txt'),
+        ('320193', 'Apple Inc.', '8-K', '2020-07-30', 'edgar/data/320193/0000320193-20-000060.txt')]))))
+    catalog.writeQuarter(2020, 4, catalog.readMasterIndex(io.BytesIO(master_zip([
+        ('320193', 'Apple Inc.', '10-K', '2020-10-30', 'edgar/data/320193/0000320193-20-000096.txt'),
+        ('789019', 'MICROSOFT CORP', '10-Q', '2020-10-27', 'edgar/data/789019/0001564590-20-047996.txt')]))))
+
+    df = catalog.query(forms = ['10-Q', '10-K'], ciks = [320193])
+    assert df[['type', 'dt_submitted']].values.tolist() == [['10-Q', '2020-07-31'], ['10-K', '2020-10-30']]
+    assert df['url'].iat[1] == 'edgar/data/320193/0000320193-20-000096-index.html'
+    assert catalog.query(forms = ['10-Q'], since = '2020-08-01')['cik'].tolist() == [789019]
+    assert len(catalog.query(quarters = [(2020, 3)])) == 2
+    assert list(catalog.query(forms = ['8-K'], columns = ['dt_submitted']).columns) == ['dt_submitted']
+
+def test_select_filters_a_table_that_is_not_saved(tmp_path, master_zip):
+    catalog = EdgarCatalog(tmp_path.joinpath('catalog'))
+    table = catalog.readMasterIndex(io.BytesIO(master_zip(ROWS)))
+    df = catalog.select(table, forms = ['10-Q', '10-K'], since = '2020-10-27', until = '2020-10-30')
+    assert df[['cik', 'type', 'dt_submitted']].values.tolist() == [[320193, '10-K', '2020-10-30']]
+    assert len(catalog.select(table)) == 3
+    assert catalog.select(table, ciks = ['789019'])['url'].tolist() == ['edgar/data/789019/0001564590-20-047996-index.html']
@@ -0,0 +1,56 @@
+import json
+import pandas as pd
+import pytest
+from data import equity_download
+from data.equity_download import TDClient, TDPriceProvider
+
+class _Response(object):
+    def __init__(self, candles):
+        self.status_code = 200
+        self.candles = candles
+
+    def json(self):
+        return {'candles': self.candles, 'empty': not self.candles}
+
+class _Client(object):
+    """
+    An http client whose requests for BAD fail with a connection error, as HTTPClient.get raises once its retries run out
+    """
+    def get(self, url, headers = None, use_cache = True):
+        if '/BAD/' in url:
+            raise ConnectionError('connection reset')
+        return _Response([{'datetime': 1704153600000, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 100}])
+
+    def setHostLimits(self, host, concurrency = None, rate = None):
+        pass
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(equity_download, 'get_client', lambda: _Client())
+    key = tmp_path.joinpath('token.json')
+    key.write_text(json.dumps({'access_token': 'token', 'client_id': 'client'}))
+    return TDPriceProvider(key, workers = 2)
+
+def test_connection_error_marks_the_ticker_failed(provider):
+    table = provider.fetchHistory(['AAPL', 'BAD', 'MSFT'], '2024-01-01', '2024-01-31')
+    assert sorted(set(table.column('ticker').to_pylist())) == ['AAPL', 'MSFT']
+    assert provider.failed == ['BAD']
+
+def test_async_job_survives_a_connection_error(provider, tmp_path):
+    master = tmp_path.joinpath('master')
+    master.mkdir()
+    pd.DataFrame({'ticker': ['AAPL', 'BAD', 'MSFT'], 'last_update': None, 'sector': 'Technology',
+                  'ipoyear': None}).to_csv(master.joinpath('company_info1.tsv.gz'), sep = '\t', index = False, compression = 'gzip')
+    client = TDClient(None, proc_path = tmp_path.joinpath('equities'), mstr_path = master, provider = provider)
+    client.updateStockHistoryAsync(workers = 2)
+
+    df = pd.read_csv(master.joinpath('company_info1.tsv.gz'), sep = '\t').set_index('ticker')
+    assert df.loc[['AAPL', 'MSFT'], 'last_update'].tolist() == ['2024-01-02', '2024-01-02']
+    assert df.loc['BAD', 'ipoyear'] == 'BAD' and pd.isna(df.loc['BAD', 'last_update'])
+    assert sorted(client.store.read(['AAPL', 'BAD', 'MSFT'])['ticker'].unique()) == ['AAPL', 'MSFT']
+
+def test_provider_without_fetch_history_cannot_be_created():
+    class NoHistory(equity_download.PriceProvider):
+        pass
+    with pytest.raises(TypeError):
+        NoHistory()
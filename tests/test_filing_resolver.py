@@ -0,0 +1,43 @@
+import pytest
+from data import filing_resolver
+from data.filing_resolver import FilingResolver, SEC_URL
+
+FOLDER = SEC_URL + '/Archives/edgar/data/320193/000032019320000096/'
+INDEX_PAGE = """<html><body><table class="tableFile" summary="Document Format Files">
+<tr><th>Seq</th><th>Description</th><th>Document</th><th>Type</th><th>Size</th></tr>
+<tr><td>1</td><td>10-K</td><td><a href="/ix?doc=/Archives/edgar/data/320193/000032019320000096/body.htm">body.htm</a></td><td>10-K</td><td>1</td></tr>
+<tr><td>2</td><td>ANNUAL REPORT</td><td><a href="/Archives/edgar/data/320193/000032019320000096/annual.htm">annual.htm</a></td><td>EX-13</td><td>9</td></tr>
+<tr><td>3</td><td>INSTANCE</td><td><a href="/Archives/edgar/data/320193/000032019320000096/aapl-20200926.xml">aapl-20200926.xml</a></td><td>EX-101.INS</td><td>1</td></tr>
+</table></body></html>"""
+
+def _listing(*items):
+    return {'directory': {'item': [{'name': name, 'size': str(size)} for name, size in items]}}
+
+@pytest.fixture
+def responses(monkeypatch):
+    responses = {}
+    monkeypatch.setattr(filing_resolver, 'api_call', lambda url, headers, typ: responses.get(url))
+    return responses
+
+def _resolve(form = '10-K'):
+    return FilingResolver({}).resolve(320193, '0000320193-20-000096', form)
+
+def test_inline_instance_names_the_primary_document(responses):
+    responses[FOLDER + 'index.json'] = _listing(('aapl-20200926.htm', 100), ('aapl-20200926_htm.xml', 10), ('annualreport.htm', 900),
+                                                ('R1.htm', 5000), ('aapl-20200926_cal.xml', 5))
+    assert _resolve() == (FOLDER + 'aapl-20200926_htm.xml', FOLDER + 'aapl-20200926.htm')
+
+def test_document_named_after_the_form(responses):
+    responses[FOLDER + 'index.json'] = _listing(('d10k.htm', 100), ('wrapper.htm', 900), ('aapl-20200926.xml', 10))
+    assert _resolve() == (FOLDER + 'aapl-20200926.xml', FOLDER + 'd10k.htm')
+    responses[FOLDER + 'index.json'] = _listing(('msft-10q_20200930.htm', 100), ('wrapper.htm', 900), ('msft-20200930.xml', 10))
+    assert _resolve('10-Q')[1] == FOLDER + 'msft-10q_20200930.htm'
+
+def test_index_page_type_column_when_the_listing_is_ambiguous(responses):
+    responses[FOLDER + 'index.json'] = _listing(('body.htm', 100), ('annual.htm', 900), ('aapl-20200926.xml', 10))
+    responses[FOLDER + '0000320193-20-000096-index.html'] = INDEX_PAGE
+    assert _resolve() == (FOLDER + 'aapl-20200926.xml', FOLDER + 'body.htm')
+
+def test_largest_document_is_the_last_resort(responses):
+    responses[FOLDER + 'index.json'] = _listing(('body.htm', 100), ('annual.htm', 900), ('ex-21.htm', 5000))
+    assert _resolve() == (None, FOLDER + 'annual.htm')
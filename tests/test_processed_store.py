@@ -0,0 +1,33 @@
+import pandas as pd
+from data.code_dictionary import CodeDictionary
+from data.processed_store import ProcessedStore, COLUMNS
+
+def _store(tmp_path):
+    return ProcessedStore(tmp_path.joinpath('processed-filings'), CodeDictionary(tmp_path.joinpath('codes.db')), buckets = 4)
+
+def _values(rows):
+    return pd.DataFrame(rows, columns = COLUMNS)
+
+def test_upsert_replaces_a_key_in_its_quarter_and_keeps_the_earliest_quarter(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_values([(1, 'AAA', 2020, 1, 'us-gaap', 'Assets', '2019-12-31', 0, 10.0),
+                          (5, 'BBB', 2020, 1, 'us-gaap', 'Assets', '2019-12-31', 0, 50.0)]))
+    store.upsert(_values([(1, 'AAA', 2020, 1, 'us-gaap', 'Assets', '2019-12-31', 0, 11.0),
+                          (1, 'AAA', 2020, 2, 'us-gaap', 'Assets', '2019-12-31', 0, 12.0),
+                          (1, 'AAA', 2020, 2, 'us-gaap', 'Assets', '2020-03-31', 0, 13.0)]))
+    df = store.read(ciks = [1])
+    assert df['value'].tolist() == [11.0, 13.0]
+    assert df['ticker'].tolist() == ['AAA', 'AAA'] and df['qtr_sub'].tolist() == [1, 2]
+    assert store.ciks() == [1, 5]
+    assert [bucket['cik'].unique().tolist() for bucket in store.readBuckets()] == [[1, 5]]
+
+def test_migrate_leaves_the_old_files_readable_beside_the_store(tmp_path):
+    store = _store(tmp_path)
+    for cik, value in [(1, 10.0), (2, 20.0)]:
+        _values([(cik, 'T%i' % cik, 2020, 1, 'us-gaap', 'Assets', '2019-12-31', 0, value),
+                 (cik, 'T%i' % cik, 2020, 2, 'us-gaap', 'Assets', '2019-12-31', 0, value + 1)]).to_csv(
+            store.store_dir.joinpath('%i.tsv.gz' % cik), compression = 'gzip', sep = '\t', index = False)
+    assert store.migrateFromTsv(store.store_dir) == 2
+    assert store.ciks() == [1, 2]
+    assert store.read()['value'].tolist() == [10.0, 20.0]
+    assert sum(len(bucket) for bucket in store.readBuckets()) == 2
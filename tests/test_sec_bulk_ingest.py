@@ -0,0 +1,57 @@
+import pathlib
+import zipfile
+import pandas as pd
+import pytest
+from data import sec_bulk_ingest
+from data.sec_bulk_ingest import SECBulkIngest
+from data.sec_formatter import SECFilingFormatter
+
+FIXTURES = pathlib.Path(__file__).parent.joinpath('fixtures', 'fsds')
+
+@pytest.fixture
+def ingest(tmp_path):
+    master = tmp_path.joinpath('master')
+    master.mkdir()
+    pd.DataFrame({'cik': [320193, 789019, 1018724], 'ticker': ['AAPL', 'MSFT', 'AMZN']}).to_csv(master.joinpath('ticker_cik.csv.gz'),
+                                                                                                 index = False, compression = 'gzip')
+    sec_data = tmp_path.joinpath('sec')
+    sec_data.mkdir()
+    ingest = SECBulkIngest(sec_data, SECFilingFormatter(sec_data = sec_data, master_data = master))
+    with zipfile.ZipFile(ingest.fsds_dir.joinpath('2020q4.zip'), 'w') as z:
+        for name in ['sub.txt', 'num.txt']:
+            z.write(FIXTURES.joinpath(name), name)
+    return ingest
+
+def _rows(frames):
+    df = pd.concat(frames, ignore_index = True)
+    return sorted(map(tuple, df.astype(str).values))
+
+def test_read_quarter_keeps_the_exact_period_end(ingest):
+    frames = dict((cik, df) for cik, df in ingest.readQuarter(ingest.fsds_dir.joinpath('2020q4.zip'), 2020, 4))
+    assert sorted(frames) == [320193, 789019, 1018724]
+
+    aapl = frames[320193].set_index(['acct_typ', 'attr'])
+    # the 10-K's values are dated with the instance's period end, the earlier period and the segment value are not loaded
+    assert set(aapl['date']) == {'2020-09-26'}
+    assert aapl.loc[('us-gaap', 'netincomeloss'), ['pds', 'value']].tolist() == [1, 12673000000]
+    assert aapl.loc[('us-gaap', 'assets'), ['pds', 'value']].tolist() == [1, 323888000000]
+    assert aapl.loc[('aapl', 'servicesgrossmargin'), 'pds'] == 4
+    assert len(aapl) == 4
+
+    assert frames[789019][['ticker', 'date', 'attr', 'value']].values.tolist() == [['MSFT', '2020-09-30', 'revenues', 37154000000]]
+    # no date in the instance name, the rounded period is kept and the ticker comes from the master list
+    assert frames[1018724][['ticker', 'date', 'pds']].values.tolist() == [['AMZN', '2020-09-30', 1]]
+
+def test_read_quarter_streams_submissions_across_chunks(ingest, monkeypatch):
+    zip_path = ingest.fsds_dir.joinpath('2020q4.zip')
+    whole = list(ingest.readQuarter(zip_path, 2020, 4))
+    monkeypatch.setattr(sec_bulk_ingest, 'CHUNK_SIZE', 2)
+    chunked = list(ingest.readQuarter(zip_path, 2020, 4))
+    assert [cik for cik, df in chunked] == [cik for cik, df in whole]
+    assert _rows(df for cik, df in chunked) == _rows(df for cik, df in whole)
+
+def test_ingest_quarter_writes_the_processed_filings(ingest):
+    assert ingest.ingestQuarter(2020, 4) == 3
+    df = ingest.formatter.store.read(ciks = [320193], columns = ['cik', 'attr', 'date', 'pds', 'value'])
+    assert sorted(df['attr']) == ['assets', 'netincomeloss', 'revenues', 'servicesgrossmargin']
+    assert set(df['date'].astype(str)) == {'2020-09-26'}
@@ -0,0 +1,58 @@
+import zipfile
+import pytest
+from data import sec_download
+from data.sec_download import SECFilingDownload
+
+ROWS = [('320193', 'Apple Inc.', '10-K', '2020-10-30', 'edgar/data/320193/0000320193-20-000096.txt'),
+        ('320193', 'Apple Inc.', '8-K', '2020-10-29', 'edgar/data/320193/0000320193-20-000094.txt'),
+        ('789019', 'MICROSOFT CORP', '10-Q', '2020-10-27', 'edgar/data/789019/0001564590-20-047996.txt')]
+
+@pytest.fixture
+def downloader(tmp_path):
+    tmp_path.joinpath('raw-filings', 'filings').mkdir(parents = True)
+    downloader = SECFilingDownload(tmp_path)
+    fetched = []
+    def fetchFiling(row):
+        fetched.append(downloader.getAccession(row))
+        return row, None, '%s-x_%s_%s.xml' % (row['cik'], row['type'], row['dt_submitted']), '<xbrl/>'
+    downloader.fetchFiling = fetchFiling
+    downloader.fetched = fetched
+    return downloader
+
+def test_update_filings_stops_when_the_index_cannot_be_downloaded(downloader, monkeypatch):
+    # api_call returns None once the client's retries of a 429 or 5xx run out
+    monkeypatch.setattr(sec_download, 'api_call', lambda url, headers, typ: None)
+    assert downloader.updateFilings(2020, 'QTR4') is None
+
+def test_update_filings_downloads_the_new_filings_of_the_index(downloader, monkeypatch, master_zip):
+    monkeypatch.setattr(sec_download, 'api_call', lambda url, headers, typ: master_zip(ROWS))
+    files = downloader.updateFilings(2020, 'QTR4')
+    assert sorted(files) == ['320193-x_10-K_2020-10-30.xml', '789019-x_10-Q_2020-10-27.xml']
+    assert downloader.catalog.quarters() == [(2020, 4)]
+
+    # a second run only plans the filings submitted after the catalog's last date
+    assert downloader.updateFilings(2020, 'QTR4') == []
+    assert sorted(downloader.fetched) == ['0000320193-20-000096', '0001564590-20-047996']
+    with zipfile.ZipFile(downloader.out_dir) as z:
+        assert sorted(z.namelist()) == sorted(files)
+
+def _legacyZip(downloader, *members):
+    # a quarter the old downloader fetched: a zip without a journal or a catalog partition
+    with zipfile.ZipFile(downloader.raw_dir.joinpath('filings', '2020QTR4.zip'), 'w') as z:
+        for name in members:
+            z.writestr(name, '<xbrl/>')
+
+def test_legacy_quarter_takes_the_watermark_of_its_old_index_file(downloader, monkeypatch, master_zip):
+    monkeypatch.setattr(sec_download, 'api_call', lambda url, headers, typ: master_zip(ROWS))
+    _legacyZip(downloader, '789019-msft_10-Q_2020-10-27.xml')
+    downloader.ind_dir.mkdir()
+    downloader.ind_dir.joinpath('2020-QTR4.tsv').write_text('|'.join(ROWS[2]) + '|' + ROWS[2][4].replace('.txt', '-index.html') + '\n')
+    assert downloader.updateFilings(2020, 'QTR4') == ['320193-x_10-K_2020-10-30.xml']
+    assert downloader.fetched == ['0000320193-20-000096']
+
+def test_legacy_zip_members_are_not_downloaded_again(downloader, monkeypatch, master_zip):
+    monkeypatch.setattr(sec_download, 'api_call', lambda url, headers, typ: master_zip(ROWS))
+    _legacyZip(downloader, '320193-aapl_10-K_2020-10-30.xml')
+    assert downloader.updateFilings(2020, 'QTR4') == ['789019-x_10-Q_2020-10-27.xml']
+    with zipfile.ZipFile(downloader.out_dir) as z:
+        assert sorted(z.namelist()) == ['320193-aapl_10-K_2020-10-30.xml', '789019-x_10-Q_2020-10-27.xml']
@@ -0,0 +1,21 @@
+import pandas as pd
+from data.ticker_index import TickerIndex
+
+def _cik(pairs):
+    return pd.DataFrame(pairs, columns = ['cik', 'ticker'])
+
+def test_update_dates_ticker_changes_of_known_ciks():
+    rows = TickerIndex.update(None, _cik([(1, 'FB'), (2, 'AAPL')]), on = '2020-01-01')
+    rows = TickerIndex.update(rows, _cik([(1, 'META'), (2, 'AAPL')]), on = '2022-06-09')
+    index = TickerIndex.fromFrame(rows)
+    assert index.ticker(1) == 'META'
+    assert index.ticker(1, on = '2021-03-31') == 'FB'
+    assert index.ticker(1, on = '2022-06-30') == 'META'
+    assert index.cik('FB', on = '2021-03-31') == 1 and index.cik('FB') is None
+
+def test_update_leaves_new_ciks_open_ended():
+    rows = TickerIndex.update(None, _cik([(1, 'FB')]), on = '2020-01-01')
+    rows = TickerIndex.update(rows, _cik([(1, 'FB'), (2, 'AAPL')]), on = '2026-06-01')
+    index = TickerIndex.fromFrame(rows)
+    assert index.ticker(2, on = '2019-03-31') == 'AAPL'
+    assert rows.loc[rows['cik'] == 2, 'start_date'].tolist() == ['']
@@ -0,0 +1,34 @@
+import pathlib
+import pandas as pd
+import pytest
+from data import update_master
+from data.ticker_index import TickerIndex
+from data.update_master import UpdateMaster
+
+MAPPING = pathlib.Path(__file__).parent.joinpath('fixtures', 'company_tickers.json')
+
+@pytest.fixture
+def master(tmp_path, monkeypatch):
+    def offline(*args):
+        raise AssertionError('the refresh made a request')
+    monkeypatch.setattr(update_master, 'api_call', offline)
+    pd.DataFrame({'ticker': ['AAPL', 'BRK.B', 'MSFT', 'NEWCO'], 'name': None}).to_csv(tmp_path.joinpath('stocks_master.csv.gz'),
+                                                                                     index = False, compression = 'gzip')
+    pd.DataFrame({'cik': ['0000320193', '0000000001', '0000000002'], 'ticker': ['AAPL', 'MSFT', 'OLDCO']}).to_csv(
+        tmp_path.joinpath('ticker_cik.csv.gz'), index = False, compression = 'gzip')
+    return UpdateMaster(proc_path = tmp_path)
+
+def test_refresh_from_a_mapping_file_diffs_the_cik_list(master, tmp_path):
+    df_diff = master.getCIKFromSEC(mapping_file = MAPPING, fallback = False)
+    status = {ticker: (status, cik, old_cik) for ticker, status, cik, old_cik in df_diff[['ticker', 'status', 'cik', 'old_cik']].values}
+    assert status['AAPL'][0] == 'unchanged'
+    assert status['BRK.B'][:2] == ('added', 1067983) and pd.isna(status['BRK.B'][2])
+    assert status['MSFT'] == ('changed', 789019, 1)
+    assert status['OLDCO'][0] == 'removed' and pd.isna(status['OLDCO'][1])
+    # tickers that are not in the mapping are left out without a lookup
+    assert sorted(status) == ['AAPL', 'BRK.B', 'MSFT', 'OLDCO']
+
+    df_cik = pd.read_csv(tmp_path.joinpath('ticker_cik.csv.gz'), dtype = str)
+    assert df_cik.values.tolist() == [['0000320193', 'AAPL'], ['0001067983', 'BRK.B'], ['0000789019', 'MSFT']]
+    index = TickerIndex.load(tmp_path)
+    assert index.cik('MSFT') == 789019 and index.ticker(1067983, on = '2015-06-30') == 'BRK.B'